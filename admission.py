@@ -0,0 +1,87 @@
+"""
+Connection admission control for the WebSocket Broadcast System
+
+New connections take a slot before their handshake is accepted. When every
+slot is taken they wait in a bounded queue (or are turned away at once), so a
+connection storm cannot grow the fan-out set, and the memory and latency of
+existing clients with it, past the configured capacity.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from metrics import CONNECTIONS_REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """Counts connection slots; ``max_connections`` of None means unlimited"""
+
+    def __init__(self, max_connections: Optional[int], queue_size: int = 0, queue_timeout: float = 5.0):
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if allowed; False if the connection should be refused"""
+        if self.max_connections is None or self.active < self.max_connections:
+            self.active += 1
+            self.admitted += 1
+            return True
+
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            CONNECTIONS_REJECTED.labels("capacity").inc()
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot straight to the waiter, so active is not touched here
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            cancelled = isinstance(e, asyncio.CancelledError)
+            if waiter.done():
+                # The slot arrived just as the wait ended: keep it, or pass it on if cancelled
+                if cancelled:
+                    self.release()
+                    raise
+                self.admitted += 1
+                return True
+            self._waiters.remove(waiter)
+            waiter.cancel()
+            if cancelled:
+                raise
+            self.timed_out += 1
+            CONNECTIONS_REJECTED.labels("queue_timeout").inc()
+            return False
+        self.admitted += 1
+        return True
+
+    def release(self):
+        """Free a slot, handing it to the longest-waiting connection if there is one"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active = max(0, self.active - 1)
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
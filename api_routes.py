@@ -2,54 +2,141 @@
 API Routes for the WebSocket Broadcast System
 """
 
-import json
 import logging
-from datetime import datetime
-from typing import Dict, Any
+import math
+from typing import Dict, Any, List, Optional
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import ValidationError
 
-from models import BroadcastMessage, ConnectionStats
+from config import settings
+from metrics import REGISTRY
+from models import BroadcastMessage, BroadcastResult, ConnectionStats
 from connection_manager import ConnectionManager
+from frames import Frame, build_payload, dumps, encode_response
+from status import StatusSnapshots
 
 logger = logging.getLogger(__name__)
 
-# Create router
-router = APIRouter()
 
+# Messages validated before each fan-out when streaming NDJSON
+NDJSON_CHUNK_SIZE = 500
+# Invalid lines reported back to the caller; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+# Longest NDJSON line buffered while waiting for its newline
+MAX_NDJSON_LINE_BYTES = 1024 * 1024
+# Largest page served by /history
+MAX_HISTORY_PAGE = 1000
+# /health/live never changes, so its body is encoded once
+LIVE_BODY = dumps({"status": "alive"})
 
-def create_api_routes(manager: ConnectionManager) -> APIRouter:
-    """Create API routes with the connection manager dependency"""
+
+def _batch_response(
+    accepted: int,
+    rejected: int,
+    errors: List[Dict[str, Any]],
+    result: BroadcastResult
+) -> Dict[str, Any]:
+    """Aggregate response body for the batch broadcast endpoints"""
+    return {
+        "status": "success",
+        "message": f"Broadcasted {accepted} messages",
+        "messages_accepted": accepted,
+        "messages_rejected": rejected,
+        "errors": errors,
+        "recipients": result.recipients,
+        "delivered": result.delivered,
+        "dropped": result.dropped,
+        "failed": result.failed,
+        "duration_ms": result.duration_ms,
+        "relayed": result.relayed,
+        "batched": result.batched,
+        "seq": result.seq
+    }
+
+
+def create_api_routes(manager: ConnectionManager, status: StatusSnapshots) -> APIRouter:
+    """Create API routes with the connection manager and status snapshot dependencies"""
+    
+    # A router per call, so each application (shard) gets routes bound to its own manager
+    router = APIRouter()
+    
+    async def check_rate_limit(request: Request):
+        """Apply the per-caller REST rate limit to broadcast requests"""
+        if manager.rate_limits is None:
+            return
+        caller = request.client.host if request.client is not None else "unknown"
+        retry_after = await manager.rate_limits.admit_request(caller)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+    
+    rate_limited = [Depends(check_rate_limit)]
+    
+    async def build_frame(message: BroadcastMessage, channel: Optional[str] = None) -> Frame:
+        """Encode a REST message, through the transform stages when there are any"""
+        if manager.transforms is None:
+            return Frame.build(
+                message.message, message.sender, message.message_type, message.timestamp, channel, message.coalesce_key
+            )
+        payload = await manager.transforms.apply(
+            build_payload(message.message, message.sender, message.message_type, message.timestamp, channel),
+            channel
+        )
+        if payload is None:
+            raise HTTPException(status_code=422, detail="Message rejected by a transform stage")
+        return Frame.encode(payload, message.coalesce_key)
+    
+    async def build_frames(messages: List[BroadcastMessage]) -> List[Optional[Frame]]:
+        """Encode many REST messages in order; None where a transform stage dropped one"""
+        if manager.transforms is None:
+            return [
+                Frame.build(
+                    message.message, message.sender, message.message_type, message.timestamp,
+                    coalesce_key=message.coalesce_key
+                )
+                for message in messages
+            ]
+        payloads = await manager.transforms.apply_many([
+            build_payload(message.message, message.sender, message.message_type, message.timestamp)
+            for message in messages
+        ])
+        return [
+            Frame.encode(payload, message.coalesce_key) if payload is not None else None
+            for message, payload in zip(messages, payloads)
+        ]
     
-    @router.post("/broadcast", response_model=Dict[str, Any])
+    @router.post("/broadcast", response_model=Dict[str, Any], dependencies=rate_limited)
     async def broadcast_message(message: BroadcastMessage, background_tasks: BackgroundTasks):
         """
         Broadcast a message to all connected WebSocket clients via REST API
         """
-        if message.timestamp is None:
-            message.timestamp = datetime.now()
-        
-        broadcast_data = {
-            "message": message.message,
-            "sender": message.sender,
-            "timestamp": message.timestamp.isoformat(),
-            "message_type": message.message_type
-        }
+        frame = await build_frame(message)
         
-        success = await manager.broadcast(broadcast_data)
+        result = await manager.broadcast(frame)
         
-        if not success:
+        if not result.recipients and not result.relayed and result.seq is None:
             raise HTTPException(status_code=503, detail="No active connections to broadcast to")
         
-        return {
+        # The broadcast frame is echoed back as-is rather than re-serialized
+        return Response(encode_response({
             "status": "success",
             "message": "Message broadcasted successfully",
             "active_connections": len(manager.active_connections),
-            "broadcast_data": broadcast_data
-        }
+            "delivered": result.delivered,
+            "dropped": result.dropped,
+            "failed": result.failed,
+            "duration_ms": result.duration_ms,
+            "relayed": result.relayed,
+            "batched": result.batched,
+            "seq": result.seq
+        }, broadcast_data=frame), media_type="application/json")
 
-    @router.post("/broadcast/specific", response_model=Dict[str, Any])
+    @router.post("/broadcast/specific", response_model=Dict[str, Any], dependencies=rate_limited)
     async def broadcast_to_specific(
         message: BroadcastMessage, 
         client_indices: list[int],
@@ -58,65 +145,276 @@ def create_api_routes(manager: ConnectionManager) -> APIRouter:
         """
         Broadcast a message to specific clients by their connection indices
         """
-        if message.timestamp is None:
-            message.timestamp = datetime.now()
+        frame = await build_frame(message)
         
-        broadcast_data = {
-            "message": message.message,
-            "sender": message.sender,
-            "timestamp": message.timestamp.isoformat(),
-            "message_type": message.message_type
-        }
+        result = await manager.broadcast_to_specific_clients(frame, client_indices)
         
-        success = await manager.broadcast_to_specific_clients(broadcast_data, client_indices)
-        
-        if not success:
+        if not result.delivered:
             raise HTTPException(
                 status_code=503, 
                 detail="Could not send message to any of the specified clients"
             )
         
-        return {
+        return Response(encode_response({
             "status": "success",
             "message": f"Message sent to {len(client_indices)} specific clients",
             "target_clients": client_indices,
-            "broadcast_data": broadcast_data
-        }
+            "delivered": result.delivered,
+            "dropped": result.dropped,
+            "failed": result.failed
+        }, broadcast_data=frame), media_type="application/json")
+
+    @router.post("/broadcast/specific/ids", response_model=Dict[str, Any], dependencies=rate_limited)
+    async def broadcast_to_specific_ids(message: BroadcastMessage, client_ids: list[str]):
+        """
+        Broadcast a message to specific clients by connection ID or client ID
+        """
+        frame = await build_frame(message)
+        
+        result = await manager.broadcast_to_client_ids(frame, client_ids)
+        
+        if not result.delivered and not result.relayed:
+            raise HTTPException(
+                status_code=503, 
+                detail="Could not send message to any of the specified clients"
+            )
+        
+        return Response(encode_response({
+            "status": "success",
+            "message": f"Message sent to {result.delivered} connections",
+            "target_clients": client_ids,
+            "delivered": result.delivered,
+            "dropped": result.dropped,
+            "failed": result.failed,
+            "relayed": result.relayed
+        }, broadcast_data=frame), media_type="application/json")
+
+    @router.post("/broadcast/batch", response_model=Dict[str, Any], dependencies=rate_limited)
+    async def broadcast_batch(messages: List[BroadcastMessage]):
+        """
+        Broadcast many messages in one request, in order
+        
+        The body is a JSON array of broadcast messages. Responds with aggregate
+        delivery counts rather than echoing every message back.
+        """
+        if len(messages) > settings.MAX_BATCH_MESSAGES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {settings.MAX_BATCH_MESSAGES} messages per batch"
+            )
+        if not manager.has_audience():
+            raise HTTPException(status_code=503, detail="No active connections to broadcast to")
+        
+        built = await build_frames(messages)
+        frames = [frame for frame in built if frame is not None]
+        errors = [
+            {"index": index, "error": "Rejected by a transform stage"}
+            for index, frame in enumerate(built) if frame is None
+        ][:MAX_REPORTED_ERRORS]
+        result = await manager.broadcast_many(frames)
+        
+        return _batch_response(len(frames), len(built) - len(frames), errors, result)
+
+    @router.post("/broadcast/batch/ndjson", response_model=Dict[str, Any], dependencies=rate_limited)
+    async def broadcast_batch_ndjson(request: Request):
+        """
+        Broadcast newline-delimited JSON messages streamed in the request body
+        
+        Each line is one broadcast message. Lines are validated and fanned out in
+        chunks as they arrive, so the body is never held in memory as a whole.
+        Invalid lines are skipped and reported by line number. Past the message
+        limit, or at an overlong line, reading stops: the messages before it are
+        still broadcast and the 413 response carries their aggregate counts.
+        """
+        if not manager.has_audience():
+            raise HTTPException(status_code=503, detail="No active connections to broadcast to")
+        
+        total = BroadcastResult()
+        errors: List[Dict[str, Any]] = []
+        accepted = 0
+        rejected = 0
+        line_number = 0
+        chunk: List[BroadcastMessage] = []
+        chunk_lines: List[int] = []
+        buffer = b""
+        limit_error: Optional[str] = None
+        
+        async def flush_chunk():
+            nonlocal chunk, chunk_lines, accepted, rejected
+            if chunk:
+                built = await build_frames(chunk)
+                frames = []
+                for frame, chunk_line in zip(built, chunk_lines):
+                    if frame is not None:
+                        frames.append(frame)
+                        continue
+                    accepted -= 1
+                    rejected += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({"line": chunk_line, "error": "Rejected by a transform stage"})
+                result = await manager.broadcast_many(frames)
+                for field in ("recipients", "delivered", "dropped", "failed", "duration_ms"):
+                    setattr(total, field, getattr(total, field) + getattr(result, field))
+                total.relayed = total.relayed or result.relayed
+                total.batched = total.batched or result.batched
+                if result.seq is not None:
+                    total.seq = result.seq
+                chunk = []
+                chunk_lines = []
+        
+        def parse_line(line: bytes) -> bool:
+            """Validate one line into the chunk; False once the message limit is reached"""
+            nonlocal accepted, rejected
+            if not line.strip():
+                return True
+            if accepted + rejected >= settings.MAX_BATCH_MESSAGES:
+                return False
+            try:
+                message = BroadcastMessage.model_validate_json(line)
+            except ValidationError as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_number, "error": e.errors(include_url=False)[0]["msg"]})
+                return True
+            chunk.append(message)
+            chunk_lines.append(line_number)
+            accepted += 1
+            return True
+        
+        too_many = f"At most {settings.MAX_BATCH_MESSAGES} messages per batch"
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                if not parse_line(line):
+                    limit_error = f"{too_many}, stopped at line {line_number}"
+                    break
+            if limit_error is None and len(buffer) > MAX_NDJSON_LINE_BYTES:
+                limit_error = f"Line {line_number + 1} is too long"
+            if limit_error is not None:
+                break
+            if len(chunk) >= NDJSON_CHUNK_SIZE:
+                await flush_chunk()
+        if limit_error is None and buffer:
+            line_number += 1
+            if not parse_line(buffer):
+                limit_error = f"{too_many}, stopped at line {line_number}"
+        await flush_chunk()
+        
+        body = _batch_response(accepted, rejected, errors, total)
+        if limit_error is not None:
+            # Earlier messages already went out, so report them rather than only the error
+            body.update(status="error", detail=limit_error, message=f"{limit_error}; broadcasted {accepted} messages before it")
+            return JSONResponse(body, status_code=413)
+        return body
+
+    @router.post("/broadcast/{channel}", response_model=Dict[str, Any], dependencies=rate_limited)
+    async def broadcast_to_channel(channel: str, message: BroadcastMessage):
+        """
+        Publish a message to the subscribers of a single channel
+        """
+        frame = await build_frame(message, channel)
+        
+        result = await manager.publish(channel, frame)
+        
+        if not result.recipients and not result.relayed and result.seq is None:
+            raise HTTPException(status_code=503, detail=f"No subscribers on channel '{channel}'")
+        
+        return Response(encode_response({
+            "status": "success",
+            "message": f"Message published to channel '{channel}'",
+            "channel": channel,
+            "subscribers": result.recipients,
+            "delivered": result.delivered,
+            "dropped": result.dropped,
+            "failed": result.failed,
+            "relayed": result.relayed,
+            "batched": result.batched,
+            "seq": result.seq
+        }, broadcast_data=frame), media_type="application/json")
+
+    @router.get("/channels", response_model=Dict[str, int])
+    async def list_channels():
+        """
+        List channels with their subscriber counts
+        """
+        return manager.get_channel_info()
 
     @router.get("/stats", response_model=ConnectionStats)
     async def get_connection_stats():
         """
         Get current connection statistics
         """
-        return manager.get_stats()
+        return Response(await status.get("stats"), media_type="application/json")
 
     @router.get("/info", response_model=Dict[str, Any])
     async def get_connection_info():
         """
-        Get detailed connection information
+        Get detailed connection information, with totals and per-shard details when sharded
         """
-        return manager.get_connection_info()
+        return Response(await status.get("info"), media_type="application/json")
+
+    @router.get("/connections", response_model=list[Dict[str, Any]])
+    async def list_connections():
+        """
+        List active connections with their IDs and per-connection metadata
+        """
+        return manager.list_connections()
+
+    @router.get("/history", response_model=Dict[str, Any])
+    async def get_history(
+        after: int = 0,
+        limit: int = Query(100, ge=1, le=MAX_HISTORY_PAGE),
+        channel: Optional[str] = None
+    ):
+        """
+        Page through recent broadcasts, oldest first
+        
+        Pass the returned ``next_after`` as ``after`` to fetch the next page.
+        Messages are returned exactly as they were sent, including their ``seq``.
+        """
+        history = manager.history
+        if history is None:
+            raise HTTPException(status_code=404, detail="Message history is disabled")
+        
+        entries = history.page(after, limit, channel)
+        # Stored frames are spliced in as-is rather than decoded and re-serialized
+        messages = Frame(b"[" + b",".join(entry[3] for entry in entries) + b"]")
+        return Response(encode_response({
+            "first_seq": history.first_seq,
+            "last_seq": history.last_seq,
+            "next_after": entries[-1][0] if entries else max(after, history.first_seq - 1),
+            "has_more": len(entries) == limit and entries[-1][0] < history.last_seq
+        }, messages=messages), media_type="application/json")
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    async def get_metrics():
+        """
+        Prometheus text exposition of server metrics
+        """
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
     @router.get("/health")
     async def health_check():
         """
         Health check endpoint
         """
-        return {
-            "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
-            "active_connections": len(manager.active_connections),
-            "server_info": {
-                "name": "WebSocket Broadcast System",
-                "version": "1.0.0"
-            }
-        }
+        return Response(await status.get("health"), media_type="application/json")
+
+    @router.get("/health/live")
+    async def liveness_check():
+        """
+        Liveness probe: the process is up and its event loop answers
+        """
+        return Response(LIVE_BODY, media_type="application/json")
 
-    @router.get("/")
-    async def get_test_page():
+    @router.get("/health/ready")
+    async def readiness_check():
         """
-        Serve the HTML test page
+        Readiness probe: 503 while starting, shutting down or with a lagging event loop
         """
-        return FileResponse("templates/index.html")
+        ready, body = status.readiness()
+        return Response(body, status_code=200 if ready else 503, media_type="application/json")
 
     return router
\ No newline at end of file
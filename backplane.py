@@ -0,0 +1,343 @@
+"""
+Pub/sub backplane for relaying broadcasts between workers and hosts
+
+Every ``ConnectionManager`` delivers a message to its own sockets and then
+publishes it on the backplane; every other manager attached to the same
+backplane receives it and delivers it to *its* local sockets. Messages are
+relayed as a small JSON header plus the already-encoded frame bytes, so the
+payload is never re-serialized on the receiving side.
+
+Implementations:
+
+- ``InMemoryBackplane``: managers in one process (the default; with a single
+  manager it relays nothing)
+- ``LocalSocketBackplane``: worker processes on one host, over a Unix domain
+  socket, with no external service. The first worker to take the lock file
+  becomes the hub and relays for the others; if it exits another takes over.
+- ``RedisBackplane``: multiple hosts, via Redis pub/sub (requires ``redis``)
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import struct
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from frames import dumps
+
+logger = logging.getLogger(__name__)
+
+# Handler invoked with (header, frame bytes) for messages from other nodes
+BackplaneHandler = Callable[[Dict[str, Any], bytes], None]
+
+_LENGTH = struct.Struct("!I")
+
+
+def encode_envelope(header: Dict[str, Any], payload: bytes) -> bytes:
+    """Pack a header and an encoded frame into one relay message"""
+    return dumps(header) + b"\n" + payload
+
+
+def decode_envelope(data: bytes) -> Tuple[Dict[str, Any], bytes]:
+    """Split a relay message back into its header and frame bytes"""
+    header, _, payload = data.partition(b"\n")
+    return json.loads(header), payload
+
+
+class Backplane:
+    """Base class for backplane implementations"""
+
+    def __init__(self):
+        self.node_id = uuid.uuid4().hex
+        self.handler: Optional[BackplaneHandler] = None
+        self.messages_published = 0
+        self.messages_received = 0
+
+    async def start(self, handler: BackplaneHandler):
+        """Start relaying; ``handler`` receives messages published by other nodes"""
+        self.handler = handler
+
+    async def stop(self):
+        """Stop relaying and release any resources"""
+        self.handler = None
+
+    async def publish(self, header: Dict[str, Any], payload: bytes):
+        """Publish a message to every other node"""
+        raise NotImplementedError
+
+    def has_peers(self) -> bool:
+        """Whether a published message can currently reach another node"""
+        return False
+
+    def _deliver(self, data: bytes):
+        """Hand a received relay message to the local handler, ignoring our own"""
+        header, payload = decode_envelope(data)
+        if header.get("origin") == self.node_id or self.handler is None:
+            return
+        self.messages_received += 1
+        try:
+            self.handler(header, payload)
+        except Exception as e:
+            logger.error(f"Error delivering backplane message: {e}")
+
+    def get_info(self) -> Dict[str, Any]:
+        """Backplane status for diagnostics endpoints"""
+        return {
+            "type": type(self).__name__,
+            "node_id": self.node_id,
+            "messages_published": self.messages_published,
+            "messages_received": self.messages_received
+        }
+
+
+class InMemoryBackplane(Backplane):
+    """Relays between managers living in the same process"""
+
+    _hubs: Dict[str, List["InMemoryBackplane"]] = {}
+
+    def __init__(self, name: str = "default"):
+        super().__init__()
+        self.name = name
+
+    async def start(self, handler: BackplaneHandler):
+        await super().start(handler)
+        self._hubs.setdefault(self.name, []).append(self)
+
+    async def stop(self):
+        peers = self._hubs.get(self.name, [])
+        if self in peers:
+            peers.remove(self)
+        await super().stop()
+
+    def has_peers(self) -> bool:
+        return len(self._hubs.get(self.name, ())) > 1
+
+    async def publish(self, header: Dict[str, Any], payload: bytes):
+        peers = self._hubs.get(self.name)
+        if not peers or len(peers) < 2:
+            return
+        data = encode_envelope(dict(header, origin=self.node_id), payload)
+        self.messages_published += 1
+        for peer in list(peers):
+            if peer is not self:
+                peer._deliver(data)
+
+
+class LocalSocketBackplane(Backplane):
+    """Relays between worker processes on one host over a Unix domain socket"""
+
+    def __init__(self, path: str, retry_interval: float = 0.5, max_buffer: int = 8 * 1024 * 1024):
+        super().__init__()
+        self.path = path
+        self.retry_interval = retry_interval
+        self.max_buffer = max_buffer
+        self.is_hub = False
+
+        self._lock_file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: List[asyncio.StreamWriter] = []
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self, handler: BackplaneHandler):
+        await super().start(handler)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._release_hub()
+        if self._upstream is not None:
+            self._upstream.close()
+            self._upstream = None
+        await super().stop()
+
+    async def publish(self, header: Dict[str, Any], payload: bytes):
+        data = encode_envelope(dict(header, origin=self.node_id), payload)
+        frame = _LENGTH.pack(len(data)) + data
+        if self.is_hub:
+            self._write_to_peers(frame, exclude=None)
+        elif self._upstream is not None:
+            self._write(self._upstream, frame)
+        else:
+            logger.debug("Backplane not connected, message not relayed")
+            return
+        self.messages_published += 1
+
+    def has_peers(self) -> bool:
+        return bool(self._peers) if self.is_hub else self._upstream is not None
+
+    def _write(self, writer: asyncio.StreamWriter, frame: bytes) -> bool:
+        """Buffer a relay frame without awaiting; drop peers that stopped reading"""
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            logger.warning("Backplane peer is not keeping up, dropping connection")
+            writer.close()
+            return False
+        writer.write(frame)
+        return True
+
+    def _write_to_peers(self, frame: bytes, exclude: Optional[asyncio.StreamWriter]):
+        for peer in list(self._peers):
+            if peer is not exclude and not self._write(peer, frame):
+                self._peers.remove(peer)
+
+    async def _run(self):
+        """Connect to the hub, or become the hub when there is none"""
+        while not self._stopping:
+            if self._try_acquire_hub_lock():
+                await self._serve_as_hub()
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                await asyncio.sleep(self.retry_interval)
+                continue
+            logger.info(f"Backplane connected to hub at {self.path}")
+            self._upstream = writer
+            try:
+                await self._read_frames(reader, self._deliver)
+            finally:
+                self._upstream = None
+                writer.close()
+            logger.warning("Backplane hub went away, reconnecting")
+
+    def _try_acquire_hub_lock(self) -> bool:
+        """Take the hub lock without blocking; the OS releases it if we die"""
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _serve_as_hub(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_peer, path=self.path)
+        self.is_hub = True
+        logger.info(f"Backplane hub listening on {self.path}")
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Relay everything a worker publishes to every other worker and to ourselves"""
+        self._peers.append(writer)
+
+        def relay(data: bytes):
+            self._write_to_peers(_LENGTH.pack(len(data)) + data, exclude=writer)
+            self._deliver(data)
+
+        try:
+            await self._read_frames(reader, relay)
+        finally:
+            if writer in self._peers:
+                self._peers.remove(writer)
+            writer.close()
+
+    async def _read_frames(self, reader: asyncio.StreamReader, callback: Callable[[bytes], None]):
+        try:
+            while True:
+                (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                callback(await reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    async def _release_hub(self):
+        if self._server is not None:
+            self._server.close()
+            for peer in self._peers:
+                peer.close()
+            self._peers.clear()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.is_hub = False
+
+    def get_info(self) -> Dict[str, Any]:
+        info = super().get_info()
+        info.update({"path": self.path, "is_hub": self.is_hub, "peers": len(self._peers)})
+        return info
+
+
+class RedisBackplane(Backplane):
+    """Relays between hosts over Redis pub/sub"""
+
+    def __init__(self, url: str, channel: str):
+        super().__init__()
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("BACKPLANE=redis requires the 'redis' package: pip install redis")
+        self._aioredis = aioredis
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: BackplaneHandler):
+        await super().start(handler)
+        self._redis = self._aioredis.from_url(self.url)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen())
+        logger.info(f"Backplane subscribed to Redis channel '{self.channel}'")
+
+    async def _listen(self):
+        async for message in self._pubsub.listen():
+            if message.get("type") == "message":
+                self._deliver(message["data"])
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.close()
+        if self._redis is not None:
+            await self._redis.close()
+        await super().stop()
+
+    def has_peers(self) -> bool:
+        # Redis does not tell us who else is subscribed; assume someone is
+        return self._redis is not None
+
+    async def publish(self, header: Dict[str, Any], payload: bytes):
+        if self._redis is None:
+            return
+        await self._redis.publish(self.channel, encode_envelope(dict(header, origin=self.node_id), payload))
+        self.messages_published += 1
+
+    def get_info(self) -> Dict[str, Any]:
+        info = super().get_info()
+        info["channel"] = self.channel
+        return info
+
+
+def create_backplane(kind: str, **options: Any) -> Backplane:
+    """Build the backplane selected by the ``BACKPLANE`` setting"""
+    if kind == "memory":
+        return InMemoryBackplane()
+    if kind == "local":
+        return LocalSocketBackplane(options["socket_path"])
+    if kind == "redis":
+        return RedisBackplane(options["redis_url"], options["redis_channel"])
+    raise ValueError(f"Unknown backplane '{kind}', expected one of: memory, local, redis")
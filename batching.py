@@ -0,0 +1,71 @@
+"""
+Micro-batching of broadcast frames for high-rate producers
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, Hashable, List, Optional
+
+from frames import Frame, combine_frames
+
+logger = logging.getLogger(__name__)
+
+
+class MessageBatcher:
+    """Collects frames per target and flushes them as one array frame
+
+    A batch is flushed when its window elapses or when it reaches
+    ``max_messages``, whichever comes first. A batch holding a single message
+    is delivered unchanged, so quiet periods cost only the window's latency.
+    """
+
+    def __init__(
+        self,
+        window_ms: float,
+        max_messages: int,
+        flush: Callable[[Hashable, Frame], None]
+    ):
+        self.window = window_ms / 1000
+        self.max_messages = max(1, max_messages)
+        self.flush_callback = flush
+        self.batches_flushed = 0
+        self.messages_batched = 0
+
+        self._pending: Dict[Hashable, List[Frame]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, key: Hashable, frame: Frame):
+        """Queue a frame for the target identified by ``key``"""
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = []
+        pending.append(frame)
+        self.messages_batched += 1
+
+        if len(pending) >= self.max_messages:
+            self._flush_key(key)
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """Flush every pending batch now"""
+        self._timer = None
+        for key in list(self._pending):
+            self._flush_key(key)
+
+    def _flush_key(self, key: Hashable):
+        frames = self._pending.pop(key, None)
+        if not frames:
+            return
+        if not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.batches_flushed += 1
+        try:
+            self.flush_callback(key, combine_frames(frames))
+        except Exception as e:
+            logger.error(f"Error flushing message batch: {e}")
+
+    def pending_messages(self) -> int:
+        """Number of messages waiting for their batch to flush"""
+        return sum(len(frames) for frames in self._pending.values())
@@ -0,0 +1,351 @@
+"""
+Load generator and fan-out latency benchmark for the broadcast server
+
+Starts the app as a local uvicorn subprocess (or targets a running server with
+``--url``), opens N simulated WebSocket clients split across ``/ws`` and
+``/ws/{client_id}``, drives ``POST /broadcast`` at a target rate and reports:
+
+- end-to-end fan-out latency percentiles (send -> every client received)
+- per-delivery latency percentiles
+- delivery throughput and dropped deliveries
+- server CPU time and peak RSS (subprocess mode, Linux /proc only)
+
+Each ``--connections`` value is a separate run, so one invocation sweeps from
+small to large fleets:
+
+    python benchmarks/broadcast_benchmark.py --connections 100,1000,10000 --rate 50 --duration 10
+
+Large runs need file descriptors for both ends of every socket (``ulimit -n``)
+and, beyond ~25k connections, several loopback source addresses; the harness
+spreads clients over 127.0.0.1-127.0.0.N automatically. Run the client on its
+own core(s) where possible: past a few thousand sockets the load generator
+itself becomes a measurable share of the latency.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import time
+from array import array
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import websockets
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BENCH_PATTERN = re.compile(rb"bench:(\d+):(\d+):(\d+)")
+CONNECTIONS_PER_SOURCE_ADDRESS = 25000
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(needed, soft)), hard))
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        print(f"warning: file descriptor limit {soft} is below the ~{needed} this run needs")
+
+
+class ServerProcess:
+    """The app under test, run as a uvicorn subprocess"""
+
+    def __init__(self, port: int, env: Dict[str, str]):
+        self.port = port
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        env = dict(os.environ, RELOAD="false", LOG_LEVEL="warning", HEARTBEAT_INTERVAL="0", **self.env)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning", "--no-access-log"],
+            cwd=REPO_ROOT,
+            env=env
+        )
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def cpu_seconds(self) -> Optional[float]:
+        """User + system CPU time of the server from /proc"""
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, IndexError, AttributeError):
+            return None
+
+    def peak_rss_mb(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.process.pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, AttributeError):
+            return None
+        return None
+
+
+class HttpPoster:
+    """Minimal keep-alive HTTP/1.1 JSON poster, so the harness needs no HTTP client package"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def post(self, path: str, body: bytes) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        status_line = await self.reader.readline()
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        await self.reader.readexactly(length)
+        return int(status_line.split()[1])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Fleet:
+    """Simulated WebSocket clients recording when each benchmark message arrives"""
+
+    def __init__(self, ws_url: str, count: int, run_id: int):
+        self.ws_url = ws_url
+        self.count = count
+        self.run_id = run_id
+        self.sockets = []
+        self.tasks: List[asyncio.Task] = []
+        self.received = 0
+        self.delivery_latencies = array("d")
+        # seq -> (sent_ns, deliveries, last_received_ns)
+        self.messages: Dict[int, List[int]] = {}
+
+    async def connect(self, concurrency: int = 200):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def open_one(index: int):
+            async with semaphore:
+                path = "/ws" if index % 2 == 0 else f"/ws/bench-{index}"
+                source = f"127.0.0.{1 + index // CONNECTIONS_PER_SOURCE_ADDRESS}"
+                websocket = await websockets.connect(
+                    self.ws_url + path,
+                    local_addr=(source, 0),
+                    max_queue=None,
+                    compression=None,
+                    open_timeout=60,
+                    ping_interval=None
+                )
+                self.sockets.append(websocket)
+                self.tasks.append(asyncio.create_task(self._receive(websocket)))
+
+        results = await asyncio.gather(*(open_one(index) for index in range(self.count)), return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            print(f"  {len(failures)} connections failed, first error: {failures[0]!r}")
+
+    async def _receive(self, websocket):
+        run_id = self.run_id
+        try:
+            async for data in websocket:
+                now = time.perf_counter_ns()
+                raw = data.encode() if isinstance(data, str) else data
+                for match in BENCH_PATTERN.finditer(raw):
+                    if int(match.group(1)) != run_id:
+                        continue
+                    seq, sent_ns = int(match.group(2)), int(match.group(3))
+                    self.received += 1
+                    self.delivery_latencies.append((now - sent_ns) / 1e6)
+                    record = self.messages.get(seq)
+                    if record is not None:
+                        record[1] += 1
+                        record[2] = now
+        except websockets.ConnectionClosed:
+            pass
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*(websocket.close() for websocket in self.sockets), return_exceptions=True)
+
+
+async def wait_until_healthy(host: str, port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f"GET /health HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+            if b"200" in await reader.readline():
+                writer.close()
+                return
+            writer.close()
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become healthy in time")
+
+
+async def run_once(args, host: str, port: int, connections: int, run_id: int, server: Optional[ServerProcess]):
+    fleet = Fleet(f"ws://{host}:{port}", connections, run_id)
+    started = time.perf_counter()
+    await fleet.connect()
+    connect_seconds = time.perf_counter() - started
+    connected = len(fleet.sockets)
+    await asyncio.sleep(args.settle)
+
+    posters = [HttpPoster(host, port) for _ in range(args.http_connections)]
+    free_posters: asyncio.Queue = asyncio.Queue()
+    for poster in posters:
+        free_posters.put_nowait(poster)
+    statuses: Dict[int, int] = {}
+
+    async def send(seq: int):
+        poster = await free_posters.get()
+        try:
+            sent_ns = time.perf_counter_ns()
+            fleet.messages[seq] = [sent_ns, 0, 0]
+            body = json.dumps({"message": f"bench:{run_id}:{seq}:{sent_ns}", "sender": "bench"}).encode()
+            status = await poster.post("/broadcast", body)
+            statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            free_posters.put_nowait(poster)
+
+    cpu_before = server.cpu_seconds() if server else None
+    total_messages = int(args.rate * args.duration)
+    interval = 1 / args.rate
+    sends = []
+    send_started = time.perf_counter()
+    for seq in range(total_messages):
+        delay = send_started + seq * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sends.append(asyncio.create_task(send(seq)))
+    await asyncio.gather(*sends)
+    send_seconds = time.perf_counter() - send_started
+
+    # Give in-flight deliveries time to land
+    expected = total_messages * connected
+    drain_deadline = time.perf_counter() + args.drain
+    while fleet.received < expected and time.perf_counter() < drain_deadline:
+        await asyncio.sleep(0.05)
+    cpu_after = server.cpu_seconds() if server else None
+
+    for poster in posters:
+        poster.close()
+    await fleet.close()
+
+    fan_out = sorted(
+        (last - sent) / 1e6
+        for sent, deliveries, last in fleet.messages.values()
+        if deliveries == connected and connected
+    )
+    per_delivery = sorted(fleet.delivery_latencies)
+    return {
+        "connections": connections,
+        "connected": connected,
+        "connect_seconds": round(connect_seconds, 2),
+        "messages": total_messages,
+        "achieved_rate": round(total_messages / send_seconds, 1),
+        "http_statuses": statuses,
+        "deliveries_expected": expected,
+        "deliveries_received": fleet.received,
+        "dropped": expected - fleet.received,
+        "deliveries_per_second": round(fleet.received / max(send_seconds, 1e-9), 1),
+        "fan_out_ms": {name: round(percentile(fan_out, q), 2) for name, q in (("p50", .5), ("p90", .9), ("p99", .99), ("max", 1))},
+        "delivery_ms": {name: round(percentile(per_delivery, q), 2) for name, q in (("p50", .5), ("p90", .9), ("p99", .99), ("max", 1))},
+        "server_cpu_seconds": round(cpu_after - cpu_before, 2) if cpu_before is not None and cpu_after is not None else None,
+        "server_peak_rss_mb": round(server.peak_rss_mb(), 1) if server and server.peak_rss_mb() else None
+    }
+
+
+def print_table(results: List[dict]):
+    header = (f"{'conns':>7} {'msgs':>6} {'rate':>7} {'deliv/s':>10} {'dropped':>8} "
+              f"{'fan-out p50':>11} {'p99':>8} {'delivery p99':>12} {'cpu s':>7} {'rss MB':>7}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['connected']:>7} {r['messages']:>6} {r['achieved_rate']:>7} {r['deliveries_per_second']:>10} "
+              f"{r['dropped']:>8} {r['fan_out_ms']['p50']:>11} {r['fan_out_ms']['p99']:>8} "
+              f"{r['delivery_ms']['p99']:>12} {str(r['server_cpu_seconds']):>7} {str(r['server_peak_rss_mb']):>7}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def main_async(args):
+    results = []
+    for run_id, connections in enumerate(int(value) for value in args.connections.split(",")):
+        raise_fd_limit(connections * (1 if args.url else 2) + 256)
+        server = None
+        if args.url:
+            parsed = urlparse(args.url)
+            host, port = parsed.hostname, parsed.port or 80
+        else:
+            host, port = "127.0.0.1", free_port()
+            server = ServerProcess(port, dict(item.split("=", 1) for item in args.env))
+            server.start()
+        try:
+            await wait_until_healthy(host, port)
+            print(f"Running {connections} connections...")
+            results.append(await run_once(args, host, port, connections, run_id, server))
+        finally:
+            if server is not None:
+                server.stop()
+
+    print()
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"\nFull results written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", default="100,1000", help="comma-separated connection counts to sweep")
+    parser.add_argument("--rate", type=float, default=20, help="broadcasts per second")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of broadcasting per run")
+    parser.add_argument("--http-connections", type=int, default=4, help="concurrent keep-alive HTTP connections")
+    parser.add_argument("--settle", type=float, default=1, help="seconds to wait after connecting")
+    parser.add_argument("--drain", type=float, default=10, help="max seconds to wait for deliveries after sending")
+    parser.add_argument("--url", help="benchmark a running server instead of starting one, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the server, e.g. BATCH_WINDOW_MS=10")
+    parser.add_argument("--json", help="write full results to this file")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Wire size and CPU cost of the available frame encodings
+
+Compares JSON and MessagePack frames, each with and without permessage-deflate,
+for single messages and for batched array frames. Deflate is simulated with the
+same raw-deflate stream the websockets implementation uses, both with context
+takeover (one compressor per connection, the default) and without.
+
+Usage:
+    python benchmarks/compression_benchmark.py [--messages 2000] [--size 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from frames import JSON, JSON_BACKEND, MSGPACK, BatchFrame, Frame, available_encodings, dumps  # noqa: E402
+
+
+def make_frames(count: int, size: int) -> List[Frame]:
+    """Realistic broadcast payloads with a message body of roughly ``size`` bytes"""
+    words = "the quick brown fox jumps over the lazy dog while the server fans out".split()
+    frames = []
+    for index in range(count):
+        body = " ".join(words[(index + offset) % len(words)] for offset in range(size // 5))
+        frames.append(Frame.build(body[:size], sender=f"producer-{index % 7}", timestamp=datetime.now()))
+    return frames
+
+
+def deflate_stream(context_takeover: bool) -> Callable[[bytes], bytes]:
+    """Compress messages the way permessage-deflate does (raw deflate, sync flush)"""
+    compressor = zlib.compressobj(wbits=-15)
+
+    def compress(data: bytes) -> bytes:
+        nonlocal compressor
+        if not context_takeover:
+            compressor = zlib.compressobj(wbits=-15)
+        out = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return out[:-4] if out.endswith(b"\x00\x00\xff\xff") else out
+
+    return compress
+
+
+def encoder_for(encoding: str) -> Callable[[Frame], bytes]:
+    """Encode a frame from scratch, the way the server does when it is first sent"""
+    def encode(frame: Frame) -> bytes:
+        if isinstance(frame, BatchFrame):
+            # Batches are assembled from their members' own encodings
+            if encoding == JSON:
+                return b"[" + b",".join(dumps(member.payload) for member in frame.frames) + b"]"
+            members = [Frame(member.data, member.message_type, member.payload) for member in frame.frames]
+            return BatchFrame(members).encoded(encoding)
+        if encoding == JSON:
+            return dumps(frame.payload)
+        return Frame(frame.data, frame.message_type, frame.payload).encoded(encoding)
+
+    return encode
+
+
+def measure(name: str, frames: List[Frame], encoding: str, compress=None):
+    """Encode (and optionally compress) every frame once; report bytes and CPU time"""
+    encode = encoder_for(encoding)
+    started = time.process_time()
+    total = 0
+    for frame in frames:
+        data = encode(frame)
+        if compress is not None:
+            data = compress(data)
+        total += len(data)
+    elapsed = time.process_time() - started
+    per_message_us = elapsed / len(frames) * 1e6
+    print(f"{name:<38} {total / len(frames):>10.1f} {per_message_us:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000, help="messages per scenario")
+    parser.add_argument("--size", type=int, default=200, help="approximate message body size in bytes")
+    parser.add_argument("--batch", type=int, default=50, help="messages per batched frame")
+    args = parser.parse_args()
+
+    frames = make_frames(args.messages, args.size)
+    batches = [
+        BatchFrame(frames[start:start + args.batch])
+        for start in range(0, len(frames), args.batch)
+    ]
+
+    print(f"JSON backend: {JSON_BACKEND}; encodings available: {', '.join(available_encodings())}")
+    print(f"{args.messages} messages, ~{args.size} byte bodies, batches of {args.batch}\n")
+    print(f"{'scenario':<38} {'bytes/frame':>10} {'CPU us/frame':>12}")
+
+    for label, scenario in (("single", frames), ("batched", batches)):
+        for encoding in available_encodings():
+            measure(f"{label} {encoding}", scenario, encoding)
+            measure(f"{label} {encoding} + deflate", scenario, encoding, deflate_stream(True))
+            measure(f"{label} {encoding} + deflate (no takeover)", scenario, encoding, deflate_stream(False))
+
+    if MSGPACK not in available_encodings():
+        print("\nInstall msgpack to include MessagePack in the comparison")
+    print(f"\nCPU cost is paid once per frame per encoding ({JSON} is encoded on creation);"
+          " deflate is paid once per frame per client.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Inbound WebSocket message handling throughput, before and after the compiled parser
+
+Runs the per-message work of ``handle_websocket_message`` up to the point of
+handing a frame to the manager: parsing, validation, building the outgoing
+payload and encoding it. The "before" pipeline is the previous implementation
+(``json.loads``, repeated ``dict.get`` calls, two dicts, an exception for plain
+text and a fresh timestamp per message); "after" uses ``inbound.parse_inbound``
+and ``frames.tick_now``. Messages are processed in event-loop iterations of
+``--per-tick`` messages, as when many sockets are readable at once.
+
+Usage:
+    python benchmarks/inbound_benchmark.py [--messages 200000] [--per-tick 100]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from frames import JSON_BACKEND, Frame, tick_now  # noqa: E402
+from inbound import parse_inbound  # noqa: E402
+
+SENDER = "Client-1"
+
+
+def make_messages(count: int) -> List[str]:
+    """A chat-heavy mix: JSON chat, channel messages, plain text and pings"""
+    templates = [
+        json.dumps({"message": "hello everyone, how is it going today?", "message_type": "chat"}),
+        json.dumps({"message": "deploy finished on staging", "sender": "ci", "channel": "ops"}),
+        "just some plain text typed into the box",
+        json.dumps({"message_type": "ping"}),
+        json.dumps({"message": "another chat line with a bit more content in it", "sender": "alice"}),
+    ]
+    return [templates[index % len(templates)] for index in range(count)]
+
+
+def handle_before(data: str):
+    """The previous parsing path, minus the manager calls"""
+    try:
+        message_data = json.loads(data)
+        sender = message_data.get("sender", SENDER)
+        channel = message_data.get("channel")
+        broadcast_msg = {
+            "message": message_data.get("message", data),
+            "sender": sender,
+            "timestamp": datetime.now().isoformat(),
+            "message_type": message_data.get("message_type", "chat")
+        }
+        if channel is not None:
+            broadcast_msg["channel"] = channel
+        msg_type = message_data.get("message_type", "broadcast")
+        if msg_type == "ping":
+            return Frame.build("pong", message_type="pong")
+        return Frame.encode(broadcast_msg)
+    except json.JSONDecodeError:
+        return Frame.encode({
+            "message": data,
+            "sender": SENDER,
+            "timestamp": datetime.now().isoformat(),
+            "message_type": "chat"
+        })
+
+
+def handle_after(data: str):
+    """The compiled parsing path, minus the manager calls"""
+    inbound = parse_inbound(data)
+    if inbound is None:
+        return None
+    if isinstance(inbound, str):
+        return Frame.encode({"message": inbound, "sender": SENDER, "timestamp": tick_now(), "message_type": "chat"})
+    if inbound.message_type == "ping":
+        return Frame.build("pong", message_type="pong")
+    broadcast_msg = {
+        "message": inbound.message if inbound.message is not None else data,
+        "sender": inbound.sender or SENDER,
+        "timestamp": tick_now(),
+        "message_type": inbound.message_type or "chat"
+    }
+    if inbound.channel is not None:
+        broadcast_msg["channel"] = inbound.channel
+    return Frame.encode(broadcast_msg)
+
+
+async def run(handler: Callable[[str], object], messages: List[str], per_tick: int) -> float:
+    """Process every message, yielding to the loop every ``per_tick``; returns CPU seconds"""
+    started = time.process_time()
+    for start in range(0, len(messages), per_tick):
+        for data in messages[start:start + per_tick]:
+            handler(data)
+        await asyncio.sleep(0)
+    return time.process_time() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000, help="messages per run")
+    parser.add_argument("--per-tick", type=int, default=100, help="messages handled per event-loop iteration")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per pipeline; the best is reported")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    print(f"JSON backend for encoding: {JSON_BACKEND}; {args.messages} messages, {args.per_tick} per tick\n")
+    results = {}
+    for name, handler in (("before", handle_before), ("after", handle_after)):
+        best = min([await run(handler, messages, args.per_tick) for _ in range(args.repeat)])
+        results[name] = args.messages / best
+        print(f"{name:<8} {results[name]:>12,.0f} messages/sec per core")
+    print(f"\nspeedup  {results['after'] / results['before']:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
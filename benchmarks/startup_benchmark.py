@@ -0,0 +1,172 @@
+"""
+Cold-start benchmark for the broadcast server
+
+Measures, over several fresh processes:
+
+- how long ``import main`` takes
+- the time from spawning ``python main.py`` (or ``uvicorn main:app`` with
+  ``--uvicorn``) until the first WebSocket connection is accepted and its
+  welcome message received, which is what a new pod adds to a connection spike
+
+for one or more startup profiles (sets of environment variables):
+
+    python benchmarks/startup_benchmark.py --runs 10
+    python benchmarks/startup_benchmark.py --profile production --env LOOP=asyncio
+
+``--record`` appends the medians to ``benchmarks/startup_results.jsonl`` with
+the commit they were measured at, so changes to startup time are tracked in the
+repository. ``--app-dir`` points at another checkout (e.g. a ``git worktree`` of
+an older commit) to measure it with the same harness.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import websockets
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+RESULTS_FILE = os.path.join(REPO_ROOT, "benchmarks", "startup_results.jsonl")
+
+PROFILES: Dict[str, Dict[str, str]] = {
+    "default": {},
+    "production": {"ENVIRONMENT": "production"},
+    "minimal": {"ENVIRONMENT": "production", "WEBHOOKS_ENABLED": "false", "STATIC_ENABLED": "false"},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(app_dir: str, env: Dict[str, str]) -> float:
+    """Seconds to import the application module in a fresh interpreter"""
+    code = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+    output = subprocess.check_output([sys.executable, "-c", code], cwd=app_dir, env=env, stderr=subprocess.DEVNULL)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+async def first_websocket(port: int, started: float, timeout: float) -> float:
+    """Seconds from ``started`` until a WebSocket is accepted and welcomed"""
+    url = f"ws://127.0.0.1:{port}/ws"
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            async with websockets.connect(url, open_timeout=timeout) as ws:
+                await ws.recv()
+                return time.perf_counter() - started
+        except (OSError, websockets.exceptions.InvalidHandshake, websockets.exceptions.ConnectionClosed):
+            await asyncio.sleep(0.005)
+    raise TimeoutError(f"No WebSocket accepted within {timeout}s")
+
+
+def measure_first_connection(app_dir: str, env: Dict[str, str], timeout: float, use_uvicorn: bool) -> float:
+    port = free_port()
+    command = [sys.executable, "main.py"]
+    if use_uvicorn:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        cwd=app_dir,
+        env=dict(env, PORT=str(port), HOST="127.0.0.1"),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        return asyncio.run(first_websocket(port, started, timeout))
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def git_commit(app_dir: str) -> Optional[str]:
+    """The checked-out commit, marked ``-dirty`` when tracked files have uncommitted changes"""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=app_dir, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        changes = subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=app_dir, stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + "-dirty" if changes.strip() else commit
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "median_ms": round(statistics.median(values) * 1000, 1),
+        "min_ms": round(min(values) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES),
+                        help="startup profile to measure; repeatable (default: every profile)")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment variable for every profile; repeatable")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per profile and measurement")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the first connection")
+    parser.add_argument("--uvicorn", action="store_true", help="start with uvicorn main:app instead of python main.py")
+    parser.add_argument("--app-dir", default=REPO_ROOT, help="checkout to measure (default: this one)")
+    parser.add_argument("--label", help="name for this measurement in the results file")
+    parser.add_argument("--record", action="store_true", help=f"append the results to {os.path.relpath(RESULTS_FILE, REPO_ROOT)}")
+    args = parser.parse_args()
+
+    extra = dict(item.split("=", 1) for item in args.env)
+    base_env = dict(os.environ, LOG_LEVEL="warning", HEARTBEAT_INTERVAL="0", **extra)
+    commit = git_commit(args.app_dir)
+    results = []
+    for name in args.profile or sorted(PROFILES):
+        env = dict(base_env, **PROFILES[name])
+        imports = [measure_import(args.app_dir, env) for _ in range(args.runs)]
+        connections = [measure_first_connection(args.app_dir, env, args.timeout, args.uvicorn) for _ in range(args.runs)]
+        result = {
+            "profile": name,
+            "import": summarize(imports),
+            "first_websocket": summarize(connections)
+        }
+        results.append(result)
+        print(
+            f"{name:>12}: import main {result['import']['median_ms']:7.1f} ms   "
+            f"first WebSocket {result['first_websocket']['median_ms']:7.1f} ms "
+            f"(min {result['first_websocket']['min_ms']:.1f}, max {result['first_websocket']['max_ms']:.1f}; "
+            f"median of {args.runs})"
+        )
+
+    if args.record:
+        entry = {
+            "label": args.label or commit,
+            "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "command": "uvicorn main:app" if args.uvicorn else "python main.py",
+            "env": extra,
+            "runs": args.runs,
+            "results": results
+        }
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"Recorded in {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Per-client outbound queue and writer task for the WebSocket Broadcast System
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from frames import JSON, Frame
+from metrics import BYTES_SENT, MESSAGES_DROPPED, MESSAGES_SENT, SEND_LATENCY, SEND_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(str, Enum):
+    """What to do when a client's outbound queue is full"""
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+
+class EnqueueStatus(str, Enum):
+    """Outcome of handing a message to a client's queue"""
+    QUEUED = "queued"
+    DROPPED = "dropped"
+    DISCONNECTED = "disconnected"
+
+
+class ClientConnection:
+    """A connected client with its own bounded send queue and writer task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        connection_id: str,
+        client_id: Optional[str],
+        queue_size: int,
+        overflow_policy: OverflowPolicy,
+        send_timeout: float,
+        on_close: Callable[["ClientConnection"], None],
+        on_sent: Callable[[], None],
+        encoding: str = JSON
+    ):
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.client_id = client_id
+        self.encoding = encoding
+        self.connected_at = datetime.now()
+        self.channels: Set[str] = set()
+        self.queue_size = max(1, queue_size)
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.send_timeout = send_timeout
+        self.on_close = on_close
+        self.on_sent = on_sent
+
+        self.queue: Deque[Tuple[Optional[str], Frame]] = deque()
+        # Frames sent before the queue and exempt from the overflow policy (see prepend)
+        self.backlog: Deque[Frame] = deque()
+        self.closed = False
+        self.close_code = 1008
+        # While above zero the writer sends only the backlog and holds queued frames back (see hold)
+        self._holds = 0
+        self.last_seen = time.monotonic()
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.messages_dropped = 0
+        self.send_timeouts = 0
+
+        self._wakeup = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the writer task that drains the queue onto the socket"""
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def enqueue(self, frame: Frame, coalesce_key: Optional[str] = None) -> EnqueueStatus:
+        """Queue a message for sending without touching the network"""
+        if self.closed:
+            return EnqueueStatus.DISCONNECTED
+
+        if len(self.queue) >= self.queue_size:
+            status = self._handle_overflow(frame, coalesce_key)
+            if status is not EnqueueStatus.QUEUED:
+                return status
+        else:
+            self.queue.append((coalesce_key, frame))
+
+        self._wakeup.set()
+        return EnqueueStatus.QUEUED
+
+    def prepend(self, frames: Iterable[Frame]):
+        """Send frames (e.g. replayed history) before anything in the queue, ignoring its limit"""
+        if self.closed:
+            return
+        self.backlog.extend(frames)
+        self._wakeup.set()
+
+    def hold(self):
+        """Keep queued frames back until ``release``, e.g. while older frames are read for a replay
+
+        Backlog frames are still sent; the overflow policy still applies to the queue.
+        """
+        self._holds += 1
+
+    def release(self):
+        """Undo one ``hold``; queued frames flow again once every hold is released"""
+        self._holds -= 1
+        self._wakeup.set()
+
+    def _handle_overflow(self, frame: Frame, coalesce_key: Optional[str]) -> EnqueueStatus:
+        """Apply the overflow policy to a message arriving at a full queue"""
+        policy = self.overflow_policy
+
+        if policy is OverflowPolicy.DROP_NEWEST:
+            self.messages_dropped += 1
+            MESSAGES_DROPPED.inc()
+            return EnqueueStatus.DROPPED
+
+        if policy is OverflowPolicy.DISCONNECT:
+            logger.warning(f"Disconnecting slow consumer with {len(self.queue)} queued messages")
+            self.close()
+            return EnqueueStatus.DISCONNECTED
+
+        if policy is OverflowPolicy.COALESCE and coalesce_key is not None:
+            # Drop the pending message with the same key instead of an unrelated one; the
+            # new frame still goes to the tail, so it is not sent ahead of older messages
+            for index, (queued_key, _) in enumerate(self.queue):
+                if queued_key == coalesce_key:
+                    del self.queue[index]
+                    self.queue.append((coalesce_key, frame))
+                    self.messages_dropped += 1
+                    MESSAGES_DROPPED.inc()
+                    return EnqueueStatus.QUEUED
+
+        # DROP_OLDEST, and COALESCE when there is nothing to merge with
+        self.queue.popleft()
+        self.queue.append((coalesce_key, frame))
+        self.messages_dropped += 1
+        MESSAGES_DROPPED.inc()
+        return EnqueueStatus.QUEUED
+
+    def close(self, code: int = 1008, notify: bool = True):
+        """Stop accepting messages and let the writer close the socket
+
+        ``notify`` reports the closure to the manager; callers that already
+        removed the connection themselves pass False.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.close_code = code
+        self.queue.clear()
+        self.backlog.clear()
+        self._wakeup.set()
+        if notify:
+            self.on_close(self)
+
+    async def _writer(self):
+        """Drain queued messages onto the socket, one send at a time"""
+        websocket = self.websocket
+        encoding = self.encoding
+        try:
+            while not self.closed:
+                if self.backlog:
+                    frame = self.backlog.popleft()
+                elif self.queue and not self._holds:
+                    _, frame = self.queue.popleft()
+                else:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                try:
+                    started = time.perf_counter()
+                    if encoding == JSON:
+                        size = len(frame)
+                        await asyncio.wait_for(websocket.send_text(frame.text), timeout=self.send_timeout)
+                    else:
+                        data = frame.encoded(encoding)
+                        size = len(data)
+                        await asyncio.wait_for(websocket.send_bytes(data), timeout=self.send_timeout)
+                    SEND_LATENCY.observe(time.perf_counter() - started)
+                    MESSAGES_SENT.inc()
+                    BYTES_SENT.inc(size)
+                    self.bytes_sent += size
+                    self.messages_sent += 1
+                    self.on_sent()
+                except asyncio.TimeoutError:
+                    self.send_timeouts += 1
+                    SEND_TIMEOUTS.inc()
+                    logger.warning(f"Send exceeded the {self.send_timeout}s timeout, disconnecting client")
+                    self.close()
+                except Exception as e:
+                    logger.error(f"Error sending message to client: {e}")
+                    self.close()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self._close_socket()
+
+    async def _close_socket(self):
+        """Close the socket without waiting on an unresponsive peer"""
+        try:
+            await asyncio.wait_for(self.websocket.close(code=self.close_code), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def touch(self):
+        """Record inbound activity for the heartbeat"""
+        self.last_seen = time.monotonic()
+
+    def describe(self) -> Dict[str, Any]:
+        """Per-connection metadata for diagnostics endpoints"""
+        return {
+            "connection_id": self.connection_id,
+            "client_id": self.client_id,
+            "encoding": self.encoding,
+            "connected_at": self.connected_at.isoformat(),
+            "channels": sorted(self.channels),
+            "messages_sent": self.messages_sent,
+            "bytes_sent": self.bytes_sent,
+            "messages_dropped": self.messages_dropped,
+            "queued_messages": len(self.queue),
+            "replay_pending": len(self.backlog),
+            "send_timeouts": self.send_timeouts,
+            "idle_seconds": round(time.monotonic() - self.last_seen, 3)
+        }
+
+    def cancel(self):
+        """Stop the writer task, e.g. after the peer has already gone away"""
+        self.closed = True
+        self.queue.clear()
+        self.backlog.clear()
+        if self._writer_task is not None and not self._writer_task.done():
+            self._writer_task.cancel()
@@ -1,44 +1,193 @@
 """
 Configuration settings for the WebSocket Broadcast System
+
+Settings are read from the environment once, when this module is imported,
+and validated together: a bad value fails startup naming every offending
+variable, instead of surfacing later in whichever subsystem reads it first.
+``Settings.from_env`` builds another instance from any mapping.
 """
 
 import os
-from typing import Optional
+from typing import ClassVar, List, Literal, Mapping, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
-class Settings:
+class Settings(BaseModel):
     """Application settings"""
+
+    model_config = ConfigDict(frozen=True)
     
     # Server settings
-    HOST: str = os.getenv("HOST", "0.0.0.0")
-    PORT: int = int(os.getenv("PORT", "8000"))
-    RELOAD: bool = os.getenv("RELOAD", "true").lower() == "true"
+    HOST: str = "0.0.0.0"
+    PORT: int = Field(8000, ge=1, le=65535)
+    # production turns the access log off by default and refuses RELOAD
+    ENVIRONMENT: Literal["development", "production"] = "development"
+    RELOAD: bool = False  # file watcher, for development only
+    # Worker processes for python main.py; above 1, use BACKPLANE=local or redis so broadcasts reach every worker
+    WORKERS: int = Field(1, ge=1)
+    # auto picks uvloop and httptools when they are installed
+    LOOP: Literal["auto", "asyncio", "uvloop"] = "auto"
+    HTTP: Literal["auto", "h11", "httptools"] = "auto"
+    ACCESS_LOG: Optional[bool] = None  # unset: on in development, off in production
     
     # Logging settings
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
+    LOG_LEVEL: Literal["critical", "error", "warning", "info", "debug"] = "info"
     
     # Application settings
-    APP_NAME: str = "WebSocket Broadcast System"
-    APP_VERSION: str = "1.0.0"
-    APP_DESCRIPTION: str = "A FastAPI application for broadcasting messages to WebSocket clients with webhook support"
+    APP_NAME: ClassVar[str] = "WebSocket Broadcast System"
+    APP_VERSION: ClassVar[str] = "1.0.0"
+    APP_DESCRIPTION: ClassVar[str] = "A FastAPI application for broadcasting messages to WebSocket clients with webhook support"
     
     # WebSocket settings
-    MAX_CONNECTIONS: Optional[int] = int(os.getenv("MAX_CONNECTIONS", "100")) if os.getenv("MAX_CONNECTIONS") else None
-    HEARTBEAT_INTERVAL: int = int(os.getenv("HEARTBEAT_INTERVAL", "30"))  # seconds
+    MAX_CONNECTIONS: Optional[int] = Field(None, ge=1)  # unset: no limit
+    # Connections beyond MAX_CONNECTIONS wait this many at a time for a free slot; 0 refuses them at once
+    ADMISSION_QUEUE_SIZE: int = Field(0, ge=0)
+    ADMISSION_QUEUE_TIMEOUT: float = 5.0  # seconds
+    # WebSocket protocol pings, answered by every client's WebSocket library (python main.py only)
+    WS_PING_INTERVAL: Optional[float] = Field(20.0, gt=0)  # seconds, unset disables
+    WS_PING_TIMEOUT: Optional[float] = Field(20.0, gt=0)  # seconds without a pong before closing
+    # Application-level heartbeat: clients must answer a "ping" message; 0 disables
+    HEARTBEAT_INTERVAL: int = 0  # seconds
+    HEARTBEAT_TIMEOUT: int = 30  # seconds after a ping before eviction
+    MAX_SUBSCRIPTIONS_PER_CLIENT: int = 100
+    # permessage-deflate compression, negotiated per client by the websockets implementation
+    WS_PER_MESSAGE_DEFLATE: bool = True
+    SEND_TIMEOUT: float = 5.0  # seconds per client send
+    # Event-loop threads serving connections in one process (python main.py only, no MESSAGE_LOG_DIR); 1 disables sharding
+    SHARDS: int = Field(1, ge=1)
+    
+    # Rate limits (token buckets, messages or requests per second); a rate of 0 disables that limit
+    CONNECTION_RATE_LIMIT: float = Field(20, ge=0)  # per WebSocket connection
+    CONNECTION_RATE_BURST: float = 40
+    CLIENT_ID_RATE_LIMIT: float = Field(0, ge=0)  # per client ID, all its connections
+    CLIENT_ID_RATE_BURST: float = 40
+    REST_RATE_LIMIT: float = Field(0, ge=0)  # per REST caller address on /broadcast*
+    REST_RATE_BURST: float = 100
+    # One of: drop, delay (wait up to RATE_LIMIT_MAX_DELAY seconds, then drop), disconnect
+    RATE_LIMIT_POLICY: Literal["drop", "delay", "disconnect"] = "drop"
+    RATE_LIMIT_MAX_DELAY: float = 1.0
     
     # Message settings
-    MAX_MESSAGE_SIZE: int = int(os.getenv("MAX_MESSAGE_SIZE", "1024"))  # bytes
-    MESSAGE_QUEUE_SIZE: int = int(os.getenv("MESSAGE_QUEUE_SIZE", "100"))
+    MAX_MESSAGE_SIZE: int = Field(1024, ge=1)  # bytes
+    MAX_BATCH_MESSAGES: int = Field(10000, ge=1)  # per /broadcast/batch request
+    MESSAGE_QUEUE_SIZE: int = Field(100, ge=1)
+    # Micro-batching: 0 disables; otherwise broadcasts within the window are sent as one array frame
+    BATCH_WINDOW_MS: float = Field(0, ge=0)
+    BATCH_MAX_MESSAGES: int = Field(100, ge=1)
+    # Recent broadcasts kept for clients resuming with ?since=<seq>; 0 disables
+    HISTORY_SIZE: int = Field(1000, ge=0)
+    HISTORY_MAX_BYTES: int = 8 * 1024 * 1024
+    # Durable log of the same messages, for replay across restarts; empty disables
+    MESSAGE_LOG_DIR: str = ""
+    MESSAGE_LOG_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    MESSAGE_LOG_RETENTION_BYTES: int = 1024 * 1024 * 1024
+    # One of: always (every group commit), interval (every MESSAGE_LOG_FSYNC_INTERVAL seconds), never
+    MESSAGE_LOG_FSYNC: Literal["always", "interval", "never"] = "interval"
+    MESSAGE_LOG_FSYNC_INTERVAL: float = 1.0
+    MESSAGE_LOG_FLUSH_INTERVAL_MS: float = 10  # group commit window
+    MESSAGE_LOG_INDEX_INTERVAL_BYTES: int = 4096
+    MESSAGE_LOG_MAX_REPLAY: int = 10000  # messages per catch-up
+    # Transform stages run on messages before fan-out: comma-separated module:function[@inline|thread|process]
+    TRANSFORM_STAGES: str = ""
+    TRANSFORM_THREAD_WORKERS: int = Field(4, ge=1)
+    TRANSFORM_PROCESS_WORKERS: int = Field(0, ge=0)  # 0: one per CPU
+    TRANSFORM_MAX_PENDING: int = Field(256, ge=1)  # pooled jobs in flight
+    # Private messages held for offline client IDs until they connect; 0 disables
+    INBOX_MAX_MESSAGES: int = Field(100, ge=0)  # per recipient
+    INBOX_MAX_RECIPIENTS: int = Field(10000, ge=0)
+    INBOX_TTL: float = 86400
+    # One of: drop_oldest, drop_newest, coalesce, disconnect
+    QUEUE_OVERFLOW_POLICY: Literal["drop_oldest", "drop_newest", "coalesce", "disconnect"] = "drop_oldest"
+    
+    # Backplane settings (relay broadcasts between workers/hosts)
+    # One of: memory (single process), local (workers on one host), redis (multiple hosts)
+    BACKPLANE: Literal["memory", "local", "redis"] = "memory"
+    BACKPLANE_SOCKET_PATH: str = "/tmp/websocket-broadcast.sock"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_CHANNEL: str = "websocket-broadcast"
+    
+    # Webhook delivery settings
+    WEBHOOKS_ENABLED: bool = True  # false leaves out webhook delivery and its routes, unimported
+    # POST/DELETE /webhooks/subscriptions; unauthenticated, so only enable behind trusted access
+    WEBHOOK_REGISTRATION_ENABLED: bool = False
+    WEBHOOK_QUEUE_SIZE: int = Field(10000, ge=1)  # events waiting for dispatch
+    WEBHOOK_BATCH_WINDOW_MS: float = 100  # for batching subscribers
+    WEBHOOK_MAX_RETRIES: int = Field(5, ge=0)
+    WEBHOOK_RETRY_BACKOFF: float = 0.5  # seconds, doubled per retry
+    WEBHOOK_TIMEOUT: float = 5.0  # seconds per request
+    WEBHOOK_MAX_CONNECTIONS: int = Field(100, ge=1)  # shared keep-alive pool
+    WEBHOOK_STATS_INTERVAL: float = 60  # seconds, 0 disables
+    # Comma-separated URLs subscribed to every event at startup (each worker registers them)
+    WEBHOOK_URLS: List[str] = []
     
     # Static files
-    STATIC_DIR: str = os.getenv("STATIC_DIR", "static")
-    TEMPLATES_DIR: str = os.getenv("TEMPLATES_DIR", "templates")
+    STATIC_ENABLED: bool = True  # false leaves out the test page and /static routes, unimported
+    STATIC_DIR: str = "static"
+    TEMPLATES_DIR: str = "templates"
+    STATIC_MAX_AGE: int = 3600  # Cache-Control max-age for /static files
+    # Seconds between checks of a served file for changes; 0 never re-reads files after loading
+    STATIC_CHECK_INTERVAL: float = 2.0
+    
+    # Status endpoints: /stats, /info and /health bodies are re-rendered at most this often; 0 renders every request
+    STATUS_CACHE_TTL: float = Field(1.0, ge=0)  # seconds
+    LOOP_LAG_PROBE_INTERVAL: float = Field(0.5, ge=0)  # seconds, 0 disables
+    READY_MAX_LOOP_LAG: float = 0.5  # seconds before /health/ready fails
+    
+    # Event-loop diagnostics: lag histogram, stall stacks, route timings and /debug/profile; off adds no overhead
+    DIAGNOSTICS: bool = False
+    DIAGNOSTICS_SAMPLE_INTERVAL: float = Field(0.02, gt=0)  # seconds
+    SLOW_CALLBACK_THRESHOLD: float = Field(0.1, ge=0)  # seconds blocked before a stall is logged
+    PROFILE_MAX_SECONDS: float = 60
     
     # CORS settings
-    CORS_ORIGINS: list = os.getenv("CORS_ORIGINS", "*").split(",")
-    CORS_METHODS: list = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
-    CORS_HEADERS: list = ["*"]
+    CORS_ORIGINS: List[str] = ["*"]
+    CORS_METHODS: ClassVar[List[str]] = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+    CORS_HEADERS: ClassVar[List[str]] = ["*"]
+
+    @field_validator("WEBHOOK_URLS", "CORS_ORIGINS", mode="before")
+    @classmethod
+    def _split_list(cls, value):
+        """Comma-separated environment values become lists"""
+        if isinstance(value, str):
+            return [item for item in value.split(",") if item]
+        return value
+
+    @field_validator("MAX_CONNECTIONS", "ACCESS_LOG", "WS_PING_INTERVAL", "WS_PING_TIMEOUT", mode="before")
+    @classmethod
+    def _empty_as_unset(cls, value):
+        return None if value == "" else value
+
+    @field_validator("ENVIRONMENT", "LOG_LEVEL", mode="before")
+    @classmethod
+    def _lowercase(cls, value):
+        return value.lower() if isinstance(value, str) else value
+
+    @model_validator(mode="after")
+    def _check_combinations(self) -> "Settings":
+        if self.RELOAD and self.production:
+            raise ValueError("RELOAD cannot be enabled with ENVIRONMENT=production")
+        if self.RELOAD and self.WORKERS > 1:
+            raise ValueError("RELOAD and WORKERS above 1 cannot be combined")
+        if self.SHARDS > 1 and self.WORKERS > 1:
+            raise ValueError("Use SHARDS or WORKERS above 1, not both")
+        if self.SHARDS > 1 and self.MESSAGE_LOG_DIR:
+            raise ValueError("MESSAGE_LOG_DIR cannot be combined with SHARDS above 1")
+        return self
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "Settings":
+        """Settings from the variables named like the fields; unset ones keep their defaults"""
+        return cls.model_validate({name: environ[name] for name in cls.model_fields if name in environ})
+
+    @property
+    def production(self) -> bool:
+        return self.ENVIRONMENT == "production"
+
+    @property
+    def access_log(self) -> bool:
+        return self.ACCESS_LOG if self.ACCESS_LOG is not None else not self.production
 
 
-# Global settings instance
-settings = Settings()
\ No newline at end of file
+# Global settings instance, validated once at import
+settings = Settings.from_env()
@@ -2,14 +2,36 @@
 WebSocket Connection Manager for handling client connections and broadcasting
 """
 
-import json
+import asyncio
 import logging
+import time
+import uuid
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Optional, Tuple, Union
 
 from fastapi import WebSocket
 
-from models import ConnectionStats
+from admission import AdmissionController
+from backplane import Backplane, InMemoryBackplane
+from batching import MessageBatcher
+from client_connection import ClientConnection, EnqueueStatus, OverflowPolicy
+from config import settings
+from frames import JSON, Frame, available_encodings
+from history import MessageHistory
+from inbox import OfflineInbox
+from metrics import (
+    BROADCAST_DURATION, BROADCAST_RECIPIENTS, CONNECTIONS_CLOSED, CONNECTIONS_OPENED, PRIVATE_MESSAGES, REGISTRY
+)
+from models import BroadcastResult, ConnectionStats
+from rate_limit import RateLimits
+from webhook_events import CLIENT_CONNECTED, CLIENT_DISCONNECTED, MESSAGE_BROADCAST, notification
+
+if TYPE_CHECKING:
+    # Optional subsystems, only imported by main when enabled
+    from message_log import MessageLog
+    from sharding import ShardSet
+    from transforms import TransformPipeline
+    from webhook_dispatcher import WebhookDispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -17,109 +39,662 @@ logger = logging.getLogger(__name__)
 class ConnectionManager:
     """Manages WebSocket connections and broadcasting"""
     
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(
+        self,
+        send_timeout: float = settings.SEND_TIMEOUT,
+        queue_size: int = settings.MESSAGE_QUEUE_SIZE,
+        overflow_policy: OverflowPolicy = settings.QUEUE_OVERFLOW_POLICY,
+        max_subscriptions: int = settings.MAX_SUBSCRIPTIONS_PER_CLIENT,
+        backplane: Optional[Backplane] = None,
+        batch_window_ms: float = settings.BATCH_WINDOW_MS,
+        batch_max_messages: int = settings.BATCH_MAX_MESSAGES,
+        history_size: int = settings.HISTORY_SIZE,
+        history_max_bytes: int = settings.HISTORY_MAX_BYTES,
+        message_log: Optional["MessageLog"] = None,
+        max_log_replay: int = settings.MESSAGE_LOG_MAX_REPLAY,
+        inbox_max_messages: int = settings.INBOX_MAX_MESSAGES,
+        inbox_max_recipients: int = settings.INBOX_MAX_RECIPIENTS,
+        inbox_ttl: float = settings.INBOX_TTL,
+        rate_limits: Optional[RateLimits] = None,
+        admission: Optional[AdmissionController] = None,
+        webhooks: Optional["WebhookDispatcher"] = None,
+        transforms: Optional["TransformPipeline"] = None,
+        shards: Optional["ShardSet"] = None
+    ):
+        # Keyed by connection ID; dicts keep insertion order, so iteration follows connect order
+        self.active_connections: Dict[str, ClientConnection] = {}
+        # Secondary index: client ID -> {connection ID: connection} (a client may hold several sockets)
+        self.clients_by_id: Dict[str, Dict[str, ClientConnection]] = {}
+        # Inverted index: channel -> {connection ID: subscriber}
+        self.channels: Dict[str, Dict[str, ClientConnection]] = {}
+        self.max_subscriptions = max_subscriptions
+        self.backplane = backplane if backplane is not None else InMemoryBackplane()
+        # Optional micro-batching: broadcasts within the window go out as one array frame
+        self.batcher = (
+            MessageBatcher(batch_window_ms, batch_max_messages, self._flush_batch)
+            if batch_window_ms > 0 else None
+        )
+        # Recent broadcasts with sequence numbers, replayed to clients that resume; shards share one
+        if shards is not None:
+            self.history = shards.history
+        else:
+            self.history = MessageHistory(history_size, history_max_bytes) if history_size > 0 else None
+        # Optional durable log of the same frames; sequence numbers come from the history
+        if message_log is not None and self.history is None:
+            logger.warning("The message log needs HISTORY_SIZE > 0 for sequence numbers, durable log disabled")
+            message_log = None
+        self.message_log = message_log
+        self.max_log_replay = max_log_replay
+        # Private messages for client IDs that are not connected, delivered when they next connect; shards share one
+        if shards is not None:
+            self.inbox = shards.inbox
+        else:
+            self.inbox = (
+                OfflineInbox(inbox_max_messages, inbox_max_recipients, inbox_ttl)
+                if inbox_max_messages > 0 else None
+            )
+        # Connection slots, taken before a handshake is accepted
+        self.admission = admission if admission is not None else AdmissionController(settings.MAX_CONNECTIONS)
+        # Optional inbound rate limits, checked by the WebSocket and REST routes
+        self.rate_limits = rate_limits
+        # Optional outbound webhooks; emitting only queues, so it is safe on the hot path
+        self.webhooks = webhooks
+        # Optional transform stages, applied by the routes to client and REST messages before fan-out
+        self.transforms = transforms if transforms else None
+        # The other shards in this process, when sharded; stats and info aggregate across them
+        self.shards = shards
+        self.send_timeout = send_timeout
+        self.queue_size = queue_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
         self.connection_count = 0
         self.total_messages_sent = 0
+        self.total_messages_dropped = 0
+        self.slow_consumers_disconnected = 0
+        self.connections_evicted = 0
         self.start_time = datetime.now()
+        self._started = time.monotonic()
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        client_id: Optional[str] = None,
+        encoding: str = JSON,
+        since: Optional[int] = None
+    ) -> Optional[ClientConnection]:
+        """Accept a new WebSocket connection and register it under a fresh connection ID
 
-    async def connect(self, websocket: WebSocket):
-        """Accept a new WebSocket connection"""
-        await websocket.accept()
-        self.active_connections.append(websocket)
+        ``encoding`` selects the wire format for this client; unsupported values
+        fall back to JSON and the welcome message reports what was chosen.
+        With ``since``, broadcasts after that sequence number are replayed
+        right after the welcome message. Returns None, without accepting the
+        handshake, when the server is at capacity.
+        """
+        if not await self.admission.acquire():
+            logger.warning(f"Refusing connection: at capacity ({self.admission.max_connections} connections)")
+            await websocket.close(code=1013)
+            return None
+        try:
+            await websocket.accept()
+        except Exception:
+            self.admission.release()
+            raise
+        if encoding not in available_encodings():
+            logger.warning(f"Unsupported encoding '{encoding}' requested, falling back to JSON")
+            encoding = JSON
+        client = ClientConnection(
+            websocket,
+            connection_id=uuid.uuid4().hex,
+            client_id=client_id,
+            queue_size=self.queue_size,
+            overflow_policy=self.overflow_policy,
+            send_timeout=self.send_timeout,
+            on_close=self._on_client_closed,
+            on_sent=self._on_message_sent,
+            encoding=encoding
+        )
+        self._register(client)
         self.connection_count += 1
+        CONNECTIONS_OPENED.inc()
+        client.start()
         logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
+        if self._has_webhook(CLIENT_CONNECTED):
+            self.webhooks.emit(CLIENT_CONNECTED, notification("client_connected", {
+                "client_number": self.connection_count,
+                "total_connections": len(self.active_connections),
+                "connection_id": client.connection_id,
+                "client_id": client.client_id
+            }))
         
-        # Send welcome message to the new client
-        welcome_msg = {
+        # Send welcome message to the new client, ahead of any replayed history
+        client.prepend([Frame.encode({
             "message": f"Welcome! You are client #{self.connection_count}",
             "sender": "System",
-            "timestamp": datetime.now().isoformat(),
-            "message_type": "welcome"
-        }
-        await websocket.send_text(json.dumps(welcome_msg))
+            "timestamp": datetime.now(),
+            "message_type": "welcome",
+            "connection_id": client.connection_id,
+            "encoding": encoding,
+            "last_seq": self.history.last_seq if self.history is not None else None
+        })])
+        if since is not None:
+            await self.replay(client, since)
+        if self.inbox is not None and client_id is not None:
+            client.prepend(self.inbox.take(client_id))
+        return client
+
+    async def replay(self, client: ClientConnection, since: int, channel: Optional[str] = None) -> int:
+        """Send a client the stored broadcasts after ``since``; returns how many
+
+        Without a channel, only messages sent to everyone are replayed. Messages
+        older than the in-memory history come from the durable log, if enabled,
+        up to ``max_log_replay`` of them. A ``history_gap`` notice precedes the
+        replay when the client missed messages that are no longer stored.
+        """
+        if self.history is None:
+            return 0
+        frames, gap = self.history.replay(since, channel)
+        first_seq = self.history.first_seq
+        held = False
+        if gap and self.message_log is not None and since < first_seq - 1:
+            # Frames queued for the client during the read are newer: hold them until the replay is prepended
+            client.hold()
+            held = True
+            start = max(since, first_seq - 1 - self.max_log_replay)
+        try:
+            if held:
+                entries = await asyncio.to_thread(self.message_log.read, start, first_seq - 1)
+                if entries:
+                    frames = [
+                        Frame(data, message_type)
+                        for _, entry_channel, message_type, data in entries
+                        if entry_channel == channel
+                    ] + frames
+                    first_seq = entries[0][0]
+                gap = since + 1 < first_seq
+            if gap:
+                client.prepend([Frame.encode({
+                    "message": "Some messages are no longer available, resync required",
+                    "sender": "System",
+                    "timestamp": datetime.now(),
+                    "message_type": "history_gap",
+                    "since": since,
+                    "first_seq": first_seq,
+                    "last_seq": self.history.last_seq,
+                    "channel": channel
+                })])
+            client.prepend(frames)
+        finally:
+            if held:
+                client.release()
+        return len(frames)
 
-    def disconnect(self, websocket: WebSocket):
+    def _register(self, client: ClientConnection):
+        """Add a connection to the primary and client ID indexes"""
+        self.active_connections[client.connection_id] = client
+        if client.client_id is not None:
+            self.clients_by_id.setdefault(client.client_id, {})[client.connection_id] = client
+
+    def _unregister(self, client: ClientConnection) -> bool:
+        """Remove a connection from every index in O(1); returns False if already gone"""
+        if self.active_connections.pop(client.connection_id, None) is None:
+            return False
+        self.admission.release()
+        if client.client_id is not None:
+            sockets = self.clients_by_id.get(client.client_id)
+            if sockets is not None:
+                sockets.pop(client.connection_id, None)
+                if not sockets:
+                    del self.clients_by_id[client.client_id]
+        for channel in client.channels:
+            self._remove_subscriber(channel, client)
+        if self.rate_limits is not None:
+            self.rate_limits.forget(client.connection_id)
+        return True
+
+    def subscribe(self, client: ClientConnection, channel: str) -> bool:
+        """Subscribe a connection to a channel; returns False if the subscription limit is hit"""
+        if channel in client.channels:
+            return True
+        if len(client.channels) >= self.max_subscriptions:
+            logger.warning(f"Connection {client.connection_id} hit the subscription limit")
+            return False
+        client.channels.add(channel)
+        self.channels.setdefault(channel, {})[client.connection_id] = client
+        return True
+
+    def unsubscribe(self, client: ClientConnection, channel: str) -> bool:
+        """Unsubscribe a connection from a channel; returns False if it was not subscribed"""
+        if channel not in client.channels:
+            return False
+        client.channels.discard(channel)
+        self._remove_subscriber(channel, client)
+        return True
+
+    def _remove_subscriber(self, channel: str, client: ClientConnection):
+        """Drop a connection from a channel's subscriber set, pruning empty channels"""
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.pop(client.connection_id, None)
+            if not subscribers:
+                del self.channels[channel]
+
+    def disconnect(self, client: ClientConnection):
         """Remove a WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        if self._unregister(client):
+            CONNECTIONS_CLOSED.labels("client").inc()
+            self._emit_disconnected(client, "client")
+        client.cancel()
         logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send a personal message to a specific client"""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
+    def evict(self, clients: List[ClientConnection], reason: str, code: int = 1001):
+        """Remove many connections at once and close their sockets in the background"""
+        for client in clients:
+            if self._unregister(client):
+                client.close(code=code, notify=False)
+                self._emit_disconnected(client, "evicted")
+        CONNECTIONS_CLOSED.labels("evicted").inc(len(clients))
+        self.connections_evicted += len(clients)
+        logger.info(f"Evicted {len(clients)} connections ({reason}). Total connections: {len(self.active_connections)}")
+
+    def _on_client_closed(self, client: ClientConnection):
+        """Forget a client whose writer gave up on it (timeout, error or overflow)"""
+        self.slow_consumers_disconnected += 1
+        if self._unregister(client):
+            CONNECTIONS_CLOSED.labels("slow_consumer").inc()
+            self._emit_disconnected(client, "slow_consumer")
+            logger.info(f"Client dropped. Total connections: {len(self.active_connections)}")
+
+    def _has_webhook(self, event: str) -> bool:
+        return self.webhooks is not None and self.webhooks.has_subscribers(event)
+
+    def _emit_disconnected(self, client: ClientConnection, reason: str):
+        if self._has_webhook(CLIENT_DISCONNECTED):
+            self.webhooks.emit(CLIENT_DISCONNECTED, notification("client_disconnected", {
+                "remaining_connections": len(self.active_connections),
+                "connection_id": client.connection_id,
+                "client_id": client.client_id,
+                "reason": reason
+            }))
+
+    def resolve(self, target_ids: List[str]) -> List[ClientConnection]:
+        """Resolve connection IDs and client IDs to live connections, without duplicates"""
+        targets: Dict[str, ClientConnection] = {}
+        for target_id in target_ids:
+            client = self.active_connections.get(target_id)
+            if client is not None:
+                targets[client.connection_id] = client
+                continue
+            sockets = self.clients_by_id.get(target_id)
+            if sockets:
+                targets.update(sockets)
+        return list(targets.values())
+
+    def _on_message_sent(self):
+        """Count a message a writer task has put on the wire"""
+        self.total_messages_sent += 1
+
+    async def send_personal_message(self, message: Union[str, Frame], client: ClientConnection) -> bool:
+        """Queue a personal message for a specific client"""
+        frame = message if isinstance(message, Frame) else Frame(message.encode("utf-8"))
+        return client.enqueue(frame) is EnqueueStatus.QUEUED
+
+    def _fan_out(self, clients: List[ClientConnection], frame: Frame) -> BroadcastResult:
+        """Hand a pre-encoded frame to each client's queue without awaiting the network"""
+        started = time.perf_counter()
+        result = BroadcastResult(recipients=len(clients))
+        coalesce_key = frame.coalesce_key
+        for client in clients:
+            status = client.enqueue(frame, coalesce_key)
+            if status is EnqueueStatus.QUEUED:
+                result.delivered += 1
+            elif status is EnqueueStatus.DROPPED:
+                result.dropped += 1
+            else:
+                result.failed += 1
+
+        self.total_messages_dropped += result.dropped
+        elapsed = time.perf_counter() - started
+        BROADCAST_DURATION.observe(elapsed)
+        BROADCAST_RECIPIENTS.inc(result.recipients)
+        result.duration_ms = elapsed * 1000
+        return result
+
+    async def broadcast(self, message: Union[Dict[str, Any], Frame]) -> BroadcastResult:
+        """Broadcast message to all connected clients on every node"""
+        frame = message if isinstance(message, Frame) else Frame.encode(message)
+        stamped, seq = self._record(frame)
+        result = self._deliver_to_all(stamped, seq)
+        result.relayed = await self._relay({"kind": "all"}, self._for_relay(frame, stamped))
+        if self._has_webhook(MESSAGE_BROADCAST):
+            self.webhooks.emit(MESSAGE_BROADCAST, frame.payload)
+        return result
+
+    def _record(self, frame: Frame, channel: Optional[str] = None) -> Tuple[Frame, Optional[int]]:
+        """Sequence a frame into the history (and durable log); returns the stamped frame and its seq"""
+        history = self.history
+        if history is None:
+            return frame, None
+        # Held across the log append too, so the log receives sequence numbers in order
+        with history.lock:
+            frame = history.record(frame, channel)
+            seq = history.last_seq
+            if self.message_log is not None:
+                self.message_log.append(seq, channel, frame)
+        return frame, seq
+
+    def _for_relay(self, original: Frame, stamped: Frame) -> Frame:
+        """The frame to hand to other nodes: shards share our history, other processes number their own"""
+        return stamped if self.shards is not None else original
 
-    async def broadcast(self, message: Dict[str, Any]) -> bool:
-        """Broadcast message to all connected clients"""
+    def _deliver_to_all(self, frame: Frame, seq: Optional[int] = None) -> BroadcastResult:
+        """Fan an already recorded frame out to every local connection"""
         if not self.active_connections:
             logger.warning("No active connections to broadcast to")
+            return BroadcastResult(seq=seq)
+
+        if self.batcher is not None:
+            self.batcher.add(("all",), frame)
+            return BroadcastResult(recipients=len(self.active_connections), batched=True, seq=seq)
+
+        result = self._fan_out(list(self.active_connections.values()), frame)
+        result.seq = seq
+
+        logger.info(
+            f"Queued message for {result.delivered}/{result.recipients} clients "
+            f"({result.dropped} dropped, {result.failed} disconnected) in {result.duration_ms:.1f}ms"
+        )
+        return result
+
+    async def broadcast_many(self, frames: Iterable[Frame]) -> BroadcastResult:
+        """Broadcast frames in order to every node, returning aggregate counts"""
+        started = time.perf_counter()
+        total = BroadcastResult()
+        messages = 0
+        for frame in frames:
+            messages += 1
+            original = frame
+            frame, seq = self._record(frame)
+            if seq is not None:
+                total.seq = seq
+            if self.batcher is not None:
+                if self.active_connections:
+                    self.batcher.add(("all",), frame)
+                    total.recipients += len(self.active_connections)
+                    total.batched = True
+            elif self.active_connections:
+                result = self._fan_out(list(self.active_connections.values()), frame)
+                total.recipients += result.recipients
+                total.delivered += result.delivered
+                total.dropped += result.dropped
+                total.failed += result.failed
+            if await self._relay({"kind": "all"}, self._for_relay(original, frame)):
+                total.relayed = True
+            if self._has_webhook(MESSAGE_BROADCAST):
+                self.webhooks.emit(MESSAGE_BROADCAST, original.payload)
+
+        total.duration_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Queued {messages} messages: {total.delivered} deliveries "
+            f"({total.dropped} dropped, {total.failed} disconnected) in {total.duration_ms:.1f}ms"
+        )
+        return total
+
+    def has_audience(self) -> bool:
+        """Whether a broadcast could currently reach any client on any node, now or on resume"""
+        return bool(self.active_connections) or self.backplane.has_peers() or self.history is not None
+
+    async def publish(self, channel: str, message: Union[Dict[str, Any], Frame]) -> BroadcastResult:
+        """Send a message only to the subscribers of a channel on every node"""
+        frame = message if isinstance(message, Frame) else Frame.encode(message)
+        stamped, seq = self._record(frame, channel)
+        result = self._deliver_to_channel(channel, stamped, seq)
+        result.relayed = await self._relay({"kind": "channel", "channel": channel}, self._for_relay(frame, stamped))
+        return result
+
+    def _deliver_to_channel(self, channel: str, frame: Frame, seq: Optional[int] = None) -> BroadcastResult:
+        """Fan an already recorded frame out to the local subscribers of a channel"""
+        subscribers = self.channels.get(channel)
+        if not subscribers:
+            logger.warning(f"No subscribers on channel '{channel}'")
+            return BroadcastResult(seq=seq)
+
+        if self.batcher is not None:
+            self.batcher.add(("channel", channel), frame)
+            return BroadcastResult(recipients=len(subscribers), batched=True, seq=seq)
+
+        result = self._fan_out(list(subscribers.values()), frame)
+        result.seq = seq
+
+        logger.info(f"Queued message for {result.delivered}/{result.recipients} subscribers of '{channel}'")
+        return result
+
+    async def _relay(self, header: Dict[str, Any], frame: Frame) -> bool:
+        """Publish a frame on the backplane; returns True if other nodes may receive it"""
+        if not self.backplane.has_peers():
+            return False
+        header["message_type"] = frame.message_type
+        if frame.coalesce_key is not None:
+            header["coalesce_key"] = frame.coalesce_key
+        try:
+            await self.backplane.publish(header, frame.data)
+        except Exception as e:
+            logger.error(f"Error publishing to backplane: {e}")
             return False
+        return True
+
+    def _on_backplane_message(self, header: Dict[str, Any], payload: bytes):
+        """Deliver a message another node published to our local connections
+
+        Broadcasts are recorded whether or not anyone here receives them, so
+        clients can still resume from them later. Shards share the publisher's
+        history, so a frame from another shard arrives already sequenced.
+        """
+        frame = Frame(payload, header.get("message_type"), coalesce_key=header.get("coalesce_key"))
+        kind = header.get("kind")
+        if kind == "all":
+            seq = None
+            if self.shards is None:
+                frame, seq = self._record(frame)
+            if self.active_connections:
+                self._deliver_to_all(frame, seq)
+        elif kind == "channel":
+            channel = header.get("channel")
+            seq = None
+            if self.shards is None:
+                frame, seq = self._record(frame, channel)
+            if channel in self.channels:
+                self._deliver_to_channel(channel, frame, seq)
+        elif kind == "ids":
+            targets = self.resolve(header.get("ids", []))
+            if targets:
+                self._fan_out(targets, frame)
 
-        message_text = json.dumps(message)
-        disconnected_clients = []
+    def _flush_batch(self, key: Tuple[str, ...], frame: Frame):
+        """Fan out a combined batch frame once its window closes"""
+        if key[0] == "all":
+            clients = list(self.active_connections.values())
+        else:
+            clients = list(self.channels.get(key[1], {}).values())
+        if clients:
+            self._fan_out(clients, frame)
 
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_text)
-                self.total_messages_sent += 1
-            except Exception as e:
-                logger.error(f"Error sending message to client: {e}")
-                disconnected_clients.append(connection)
+    async def start(self):
+        """Open the durable log, start transform pools and attach to the backplane; call from the lifespan"""
+        if self.transforms is not None:
+            self.transforms.start()
+        if self.shards is not None:
+            self.shards.register(self)
+        if self.message_log is not None:
+            if await self.message_log.start():
+                # Warm the in-memory history so sequence numbers continue where they left off
+                log = self.message_log
+                since = max(0, log.last_seq - self.history.max_messages)
+                entries = await asyncio.to_thread(log.read, since, log.last_seq)
+                with self.history.lock:
+                    self.history.load(entries)
+                    self.history.last_seq = max(self.history.last_seq, log.last_seq)
+            else:
+                self.message_log = None
+        await self.backplane.start(self._on_backplane_message)
 
-        # Remove disconnected clients
-        for client in disconnected_clients:
+    async def stop(self):
+        """Detach from the backplane and stop every writer task"""
+        if self.batcher is not None:
+            self.batcher.flush()
+        await self.backplane.stop()
+        for client in list(self.active_connections.values()):
             self.disconnect(client)
+        if self.message_log is not None:
+            await self.message_log.stop()
+        if self.transforms is not None:
+            await self.transforms.stop()
+        if self.shards is not None:
+            self.shards.unregister(self)
 
-        logger.info(f"Broadcasted message to {len(self.active_connections)} clients")
-        return True
+    async def send_private(self, recipient: str, message: Union[Dict[str, Any], Frame]) -> BroadcastResult:
+        """Send a message to one client ID (every socket it holds) or connection ID
+
+        The recipient is looked up in the ID indexes, so the cost does not
+        depend on how many clients are connected. Shards look it up in each
+        other's indexes too and relay only to reach it on another shard. If it
+        is connected nowhere, the message goes into the offline inbox until
+        that client ID connects. Other processes cannot be checked: with a
+        cross-process backplane the message is relayed and not stored, and is
+        lost if the recipient is offline everywhere.
+        """
+        frame = message if isinstance(message, Frame) else Frame.encode(message)
+        targets = self.resolve([recipient])
+        result = self._fan_out(targets, frame) if targets else BroadcastResult()
+        if self.shards is None or self.shards.holds(recipient, exclude=self):
+            result.relayed = await self._relay({"kind": "ids", "ids": [recipient]}, frame)
+        if targets:
+            outcome = "delivered"
+        elif result.relayed:
+            outcome = "relayed"
+        elif self.inbox is not None:
+            self.inbox.put(recipient, frame)
+            result.stored = True
+            outcome = "stored"
+        else:
+            outcome = "undeliverable"
+        PRIVATE_MESSAGES.labels(outcome).inc()
+        return result
 
-    async def broadcast_to_specific_clients(self, message: Dict[str, Any], client_indices: List[int]) -> bool:
+    def get_channel_info(self) -> Dict[str, int]:
+        """Subscriber count per channel"""
+        return {channel: len(subscribers) for channel, subscribers in self.channels.items()}
+
+    async def broadcast_to_specific_clients(
+        self,
+        message: Union[Dict[str, Any], Frame],
+        client_indices: List[int]
+    ) -> BroadcastResult:
         """Broadcast message to specific clients by their connection index"""
         if not self.active_connections:
             logger.warning("No active connections available")
-            return False
+            return BroadcastResult()
 
-        message_text = json.dumps(message)
-        sent_count = 0
-        disconnected_clients = []
-
-        for index in client_indices:
-            if 0 <= index < len(self.active_connections):
-                connection = self.active_connections[index]
-                try:
-                    await connection.send_text(message_text)
-                    self.total_messages_sent += 1
-                    sent_count += 1
-                except Exception as e:
-                    logger.error(f"Error sending message to client {index}: {e}")
-                    disconnected_clients.append(connection)
-
-        # Remove disconnected clients
-        for client in disconnected_clients:
-            self.disconnect(client)
+        frame = message if isinstance(message, Frame) else Frame.encode(message)
+        connections = list(self.active_connections.values())
+        targets = [
+            connections[index]
+            for index in dict.fromkeys(client_indices)
+            if 0 <= index < len(connections)
+        ]
+        result = self._fan_out(targets, frame)
+
+        logger.info(f"Queued message for {result.delivered} specific clients")
+        return result
 
-        logger.info(f"Sent message to {sent_count} specific clients")
-        return sent_count > 0
+    async def broadcast_to_client_ids(
+        self,
+        message: Union[Dict[str, Any], Frame],
+        target_ids: List[str]
+    ) -> BroadcastResult:
+        """Broadcast message to specific clients by connection ID or client ID, on every node"""
+        frame = message if isinstance(message, Frame) else Frame.encode(message)
+        targets = self.resolve(target_ids)
+        if targets:
+            result = self._fan_out(targets, frame)
+            logger.info(f"Queued message for {result.delivered} clients by ID")
+        else:
+            logger.warning("None of the requested clients are connected to this node")
+            result = BroadcastResult()
+        result.relayed = await self._relay({"kind": "ids", "ids": list(target_ids)}, frame)
+        return result
 
     def get_stats(self) -> ConnectionStats:
-        """Get current connection statistics"""
-        uptime = (datetime.now() - self.start_time).total_seconds()
+        """Get current connection statistics, summed over every shard when sharded"""
+        uptime = time.monotonic() - self._started
+        if self.shards is not None:
+            # Plain reads of other shards' counters; each is read atomically under the GIL
+            managers = [manager for manager, _ in self.shards.managers]
+            return ConnectionStats(
+                active_connections=sum(len(manager.active_connections) for manager in managers),
+                total_messages_sent=sum(manager.total_messages_sent for manager in managers),
+                uptime_seconds=int(uptime)
+            )
         return ConnectionStats(
             active_connections=len(self.active_connections),
             total_messages_sent=self.total_messages_sent,
             uptime_seconds=int(uptime)
         )
 
+    def queued_messages(self) -> int:
+        """Frames waiting in all client queues"""
+        # Snapshot first: the gauges may read this from another shard's thread
+        return sum(len(client.queue) for client in list(self.active_connections.values()))
+
+    def max_queue_depth(self) -> int:
+        """Deepest client queue, the first sign of a slow consumer"""
+        return max((len(client.queue) for client in list(self.active_connections.values())), default=0)
+
+    def list_connections(self) -> List[Dict[str, Any]]:
+        """Per-connection metadata in connect order"""
+        return [client.describe() for client in self.active_connections.values()]
+
     def get_connection_info(self) -> Dict[str, Any]:
         """Get detailed connection information"""
         return {
             "active_connections": len(self.active_connections),
             "total_connections_created": self.connection_count,
             "total_messages_sent": self.total_messages_sent,
+            "total_messages_dropped": self.total_messages_dropped,
+            "slow_consumers_disconnected": self.slow_consumers_disconnected,
+            "connections_evicted": self.connections_evicted,
+            "queued_messages": self.queued_messages(),
+            "distinct_client_ids": len(self.clients_by_id),
+            "channels": len(self.channels),
+            "queue_size": self.queue_size,
+            "overflow_policy": self.overflow_policy.value,
+            "backplane": self.backplane.get_info(),
+            "batching": {
+                "window_ms": self.batcher.window * 1000,
+                "max_messages": self.batcher.max_messages,
+                "batches_flushed": self.batcher.batches_flushed,
+                "messages_batched": self.batcher.messages_batched,
+                "pending_messages": self.batcher.pending_messages()
+            } if self.batcher is not None else None,
+            "history": self.history.get_info() if self.history is not None else None,
+            "message_log": self.message_log.get_info() if self.message_log is not None else None,
+            "inbox": self.inbox.get_info() if self.inbox is not None else None,
+            "admission": self.admission.get_info(),
+            "rate_limits": self.rate_limits.get_info() if self.rate_limits is not None else None,
+            "webhooks": self.webhooks.get_info() if self.webhooks is not None else None,
+            "transforms": self.transforms.get_info() if self.transforms is not None else None,
             "start_time": self.start_time.isoformat(),
-            "uptime_seconds": int((datetime.now() - self.start_time).total_seconds())
-        }
\ No newline at end of file
+            "uptime_seconds": int(time.monotonic() - self._started)
+        }
+
+# Every application's manager in this process (one per shard), for the process-wide gauges.
+# Kept here rather than in main, which is imported twice when run as a script.
+managers: List[ConnectionManager] = []
+
+# Gauges read from the managers at scrape time
+REGISTRY.gauge("websocket_active_connections", "Currently open WebSocket connections",
+               function=lambda: sum(len(manager.active_connections) for manager in managers))
+REGISTRY.gauge("websocket_queued_messages", "Frames waiting in all client send queues",
+               function=lambda: sum(manager.queued_messages() for manager in managers))
+REGISTRY.gauge("websocket_max_queue_depth", "Deepest client send queue",
+               function=lambda: max((manager.max_queue_depth() for manager in managers), default=0))
+REGISTRY.gauge("websocket_channels", "Channels with at least one subscriber",
+               function=lambda: sum(len(manager.channels) for manager in managers))
@@ -0,0 +1,238 @@
+"""
+Opt-in event-loop diagnostics for the WebSocket Broadcast System
+
+Everything here is enabled by ``DIAGNOSTICS=true`` and costs nothing
+otherwise: the middleware is not installed, the routes are not registered and
+the readiness probe keeps its plain timer.
+
+- ``LoopSampler`` measures event-loop lag into ``event_loop_lag_seconds``. A
+  watchdog thread notices when the sampler's timer is overdue by more than
+  ``slow_threshold`` and captures the event-loop thread's stack at that
+  moment, i.e. the code that is blocking every socket (``GET /debug/stalls``).
+- ``RouteTimingMiddleware`` records ``http_request_duration_seconds`` by
+  method and route template.
+- ``SamplingProfiler`` samples stacks for N seconds on demand
+  (``GET /debug/profile``) and returns them in the collapsed "folded" format
+  read by flamegraph.pl, speedscope and similar tools.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from types import FrameType
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from metrics import EVENT_LOOP_LAG, EVENT_LOOP_STALLS, HTTP_REQUEST_DURATION
+from status import LoopLagProbe
+
+logger = logging.getLogger(__name__)
+
+# Stalls kept for /debug/stalls
+MAX_RECORDED_STALLS = 50
+# Deepest stack kept per stall or profile sample
+MAX_STACK_DEPTH = 100
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame: Optional[FrameType]) -> List[FrameType]:
+    """Frames from the outermost call to ``frame``"""
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+class LoopSampler(LoopLagProbe):
+    """A loop-lag probe that also records a histogram and reports stalls with their stacks
+
+    Lag is sampled every ``interval`` seconds on the loop; a stall is noticed
+    by the watchdog thread within ``slow_threshold / 2`` of it passing the
+    threshold, and its full duration is filled in once the loop runs again.
+    """
+
+    def __init__(self, interval: float = 0.02, slow_threshold: float = 0.1):
+        super().__init__(interval)
+        self.slow_threshold = slow_threshold
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=MAX_RECORDED_STALLS)
+        self.stall_count = 0
+        self.loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._reported_due: Optional[float] = None
+
+    def start(self):
+        super().start()
+        self.loop_thread_id = threading.get_ident()
+        if self.slow_threshold > 0 and self._watchdog is None:
+            self._stopped.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+        await super().stop()
+
+    def _record(self, lag: float):
+        super()._record(lag)
+        EVENT_LOOP_LAG.observe(lag)
+        if lag > self.slow_threshold and self.stalls and self.stalls[-1]["due"] == self._due:
+            self.stalls[-1]["duration_ms"] = round(lag * 1000, 3)
+
+    def _watch(self):
+        """Runs in its own thread: capture the loop thread's stack when the sampler is overdue"""
+        while not self._stopped.wait(self.slow_threshold / 2):
+            due = self._due
+            if due is None or due == self._reported_due:
+                continue
+            overdue = time.monotonic() - due
+            if overdue <= self.slow_threshold:
+                continue
+            self._reported_due = due
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = [
+                f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+                for frame in _stack(frame)
+            ]
+            self.stall_count += 1
+            EVENT_LOOP_STALLS.inc()
+            self.stalls.append({
+                "due": due,
+                "detected_at": datetime.now().isoformat(),
+                "duration_ms": round(overdue * 1000, 3),
+                "stack": stack
+            })
+            logger.warning(
+                f"Event loop blocked for over {overdue * 1000:.0f}ms, at:\n  " + "\n  ".join(stack[-15:])
+            )
+
+    def get_stalls(self) -> List[Dict[str, Any]]:
+        return [{key: value for key, value in stall.items() if key != "due"} for stall in list(self.stalls)]
+
+
+class RouteTimingMiddleware:
+    """ASGI middleware timing HTTP requests by route template, e.g. ``/static/{path:path}``"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # The router stores the matched route in the scope it was given
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], route.path if route is not None else "unmatched"
+            ).observe(time.perf_counter() - started)
+
+
+class SamplingProfiler:
+    """Samples thread stacks for a while and counts them as folded stacks"""
+
+    def __init__(self, max_seconds: float = 60.0):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float, interval: float, thread_id: Optional[int] = None) -> str:
+        """Blocking: sample every ``interval`` seconds, one thread or all but this one, and render
+
+        Each output line is ``frame;frame;...;frame count``, outermost frame
+        first; with every thread sampled, stacks start with the thread name.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            own = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + min(seconds, self.max_seconds)
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or (thread_id is not None and ident != thread_id):
+                        continue
+                    names_on_stack = [_frame_name(f) for f in _stack(frame)]
+                    if thread_id is None:
+                        names_on_stack.insert(0, names.get(ident, str(ident)))
+                    stacks[";".join(names_on_stack)] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+
+class Diagnostics:
+    """The loop sampler and profiler of one application (one per shard)"""
+
+    def __init__(self, sample_interval: float = 0.02, slow_threshold: float = 0.1, profile_max_seconds: float = 60.0):
+        self.sampler = LoopSampler(sample_interval, slow_threshold)
+        self.profiler = SamplingProfiler(profile_max_seconds)
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "sample_interval": self.sampler.interval,
+            "slow_threshold_ms": self.sampler.slow_threshold * 1000,
+            "loop_lag_ms": round(self.sampler.current() * 1000, 3),
+            "max_loop_lag_ms": round(self.sampler.max_lag * 1000, 3),
+            "stalls": self.sampler.stall_count,
+            "profiling": self.profiler.busy
+        }
+
+
+def create_diagnostics_routes(diagnostics: Diagnostics) -> APIRouter:
+    """Routes for loop stalls and on-demand profiles"""
+
+    router = APIRouter(prefix="/debug")
+
+    @router.get("/stalls")
+    async def get_stalls():
+        """
+        Diagnostics summary and the most recent event-loop stalls, with the blocking stack
+        """
+        return {**diagnostics.get_info(), "recent_stalls": diagnostics.sampler.get_stalls()}
+
+    @router.get("/profile", response_class=PlainTextResponse)
+    async def get_profile(
+        seconds: float = Query(5.0, gt=0),
+        interval_ms: float = Query(5.0, ge=1, le=1000),
+        all_threads: bool = False
+    ):
+        """
+        Sample stacks for a number of seconds and return them as folded stacks for a flamegraph
+
+        Samples this server's event-loop thread unless ``all_threads`` is set.
+        """
+        if diagnostics.profiler.busy:
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        thread_id = None if all_threads else threading.get_ident()
+        try:
+            folded = await asyncio.to_thread(diagnostics.profiler.profile, seconds, interval_ms / 1000, thread_id)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return PlainTextResponse(folded)
+
+    return router
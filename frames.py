@@ -0,0 +1,253 @@
+"""
+Encode-once message frames for the WebSocket Broadcast System
+
+A payload is serialized exactly once into a ``Frame`` which is then shared by
+every recipient queue and, where useful, embedded verbatim in REST responses.
+orjson is used when it is installed; otherwise the standard library is used.
+
+Clients may negotiate a binary encoding (MessagePack, when ``msgpack`` is
+installed). Each frame encodes itself at most once per encoding, on first use,
+so the cost is per message and encoding rather than per recipient.
+"""
+
+import asyncio
+import json
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from metrics import SERIALIZATION_DURATION
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+
+def _default(value: Any) -> Any:
+    """Serialize the non-JSON types our payloads carry"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize an object to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default)
+else:
+    JSON_BACKEND = "json"
+    _encoder = json.JSONEncoder(default=_default, separators=(",", ":"), ensure_ascii=False)
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize an object to UTF-8 JSON bytes"""
+        return _encoder.encode(obj).encode("utf-8")
+
+
+# Per thread, so each shard's event loop caches and expires its own timestamp
+_tick = threading.local()
+
+
+def _expire_tick_now():
+    _tick.now = None
+
+
+def tick_now() -> datetime:
+    """The current time, read once per event-loop iteration
+
+    Messages handled in the same iteration share one timestamp, which saves a
+    clock read per message under load. Outside a running loop it is uncached.
+    """
+    now = getattr(_tick, "now", None)
+    if now is None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return datetime.now()
+        now = _tick.now = datetime.now()
+        # Callbacks scheduled now run in the next iteration, after this one's work
+        loop.call_soon(_expire_tick_now)
+    return now
+
+
+def available_encodings() -> List[str]:
+    """Wire encodings clients can ask for"""
+    return [JSON, MSGPACK] if msgpack is not None else [JSON]
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def _msgpack_array_header(length: int) -> bytes:
+    """MessagePack array header; the items follow it already encoded"""
+    if length < 16:
+        return bytes((0x90 | length,))
+    if length < 0x10000:
+        return b"\xdc" + struct.pack(">H", length)
+    return b"\xdd" + struct.pack(">I", length)
+
+
+def build_payload(
+    message: str,
+    sender: str = "System",
+    message_type: str = "broadcast",
+    timestamp: Optional[datetime] = None,
+    channel: Optional[str] = None
+) -> Dict[str, Any]:
+    """The standard broadcast payload, e.g. to transform before encoding"""
+    payload = {
+        "message": message,
+        "sender": sender,
+        "timestamp": timestamp or tick_now(),
+        "message_type": message_type
+    }
+    if channel is not None:
+        payload["channel"] = channel
+    return payload
+
+
+class Frame:
+    """An immutable, pre-encoded message shared by every recipient"""
+
+    __slots__ = ("data", "message_type", "coalesce_key", "_text", "_payload", "_encoded")
+
+    def __init__(
+        self,
+        data: bytes,
+        message_type: Optional[str] = None,
+        payload: Any = None,
+        coalesce_key: Optional[str] = None
+    ):
+        self.data = data
+        self.message_type = message_type
+        # Set by the producer: a newer frame with the same key may replace this one in a full queue
+        self.coalesce_key = coalesce_key
+        self._text: Optional[str] = None
+        self._payload = payload
+        self._encoded: Optional[Dict[str, bytes]] = None
+
+    @classmethod
+    def encode(cls, message: Dict[str, Any], coalesce_key: Optional[str] = None) -> "Frame":
+        """Serialize a message payload once"""
+        started = time.perf_counter()
+        data = dumps(message)
+        SERIALIZATION_DURATION.observe(time.perf_counter() - started)
+        return cls(data, message.get("message_type"), message, coalesce_key)
+
+    @classmethod
+    def build(
+        cls,
+        message: str,
+        sender: str = "System",
+        message_type: str = "broadcast",
+        timestamp: Optional[datetime] = None,
+        channel: Optional[str] = None,
+        coalesce_key: Optional[str] = None
+    ) -> "Frame":
+        """Encode a standard broadcast payload without an intermediate model"""
+        return cls.encode(build_payload(message, sender, message_type, timestamp, channel), coalesce_key)
+
+    def with_sequence(self, seq: int) -> "Frame":
+        """A copy of an object frame with a leading ``seq`` field, spliced into the bytes"""
+        if self.data[:1] != b"{":
+            return self
+        separator = b"," if len(self.data) > 2 else b""
+        payload = self._payload
+        if isinstance(payload, dict):
+            payload = {"seq": seq, **payload}
+        return Frame(b'{"seq":%d' % seq + separator + self.data[1:], self.message_type, payload, self.coalesce_key)
+
+    @property
+    def text(self) -> str:
+        """The frame as text, decoded at most once for text-mode sends"""
+        if self._text is None:
+            self._text = self.data.decode("utf-8")
+        return self._text
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def payload(self) -> Any:
+        """The decoded payload, kept from encoding or parsed back from the JSON bytes once"""
+        if self._payload is None:
+            try:
+                self._payload = json.loads(self.data)
+            except ValueError:
+                self._payload = self.text
+        return self._payload
+
+    def encoded(self, encoding: str) -> bytes:
+        """The frame in a wire encoding, computed once per encoding and then cached"""
+        if encoding == JSON:
+            return self.data
+        if self._encoded is None:
+            self._encoded = {}
+        data = self._encoded.get(encoding)
+        if data is None:
+            started = time.perf_counter()
+            data = self._encoded[encoding] = self._encode_as(encoding)
+            SERIALIZATION_DURATION.observe(time.perf_counter() - started)
+        return data
+
+    def _encode_as(self, encoding: str) -> bytes:
+        if encoding == MSGPACK and msgpack is not None:
+            return msgpack.packb(self.payload, default=_msgpack_default)
+        raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+class BatchFrame(Frame):
+    """Several frames sent as one array frame, built from their existing encodings"""
+
+    __slots__ = ("frames",)
+
+    def __init__(self, frames: List[Frame]):
+        super().__init__(b"[" + b",".join(frame.data for frame in frames) + b"]", "batch")
+        self.frames = frames
+
+    def _encode_as(self, encoding: str) -> bytes:
+        if encoding == MSGPACK and msgpack is not None:
+            return _msgpack_array_header(len(self.frames)) + b"".join(
+                frame.encoded(encoding) for frame in self.frames
+            )
+        raise ValueError(f"Unsupported encoding '{encoding}'")
+
+
+def combine_frames(frames: List[Frame]) -> Frame:
+    """Join already-encoded frames into one array frame without re-encoding"""
+    if len(frames) == 1:
+        return frames[0]
+    return BatchFrame(frames)
+
+
+def encode_response(body: Dict[str, Any], **frames: Frame) -> bytes:
+    """Render a JSON object whose extra fields are embedded pre-encoded frames
+
+    The frames are spliced in as raw bytes so a payload that has already been
+    serialized for broadcasting is not serialized again for the HTTP response.
+    """
+    encoded = dumps(body)
+    if not frames:
+        return encoded
+    parts = [encoded[:-1]]
+    separator = b"," if len(encoded) > 2 else b""
+    for key, frame in frames.items():
+        parts.append(separator + dumps(key) + b":" + frame.data)
+        separator = b","
+    parts.append(b"}")
+    return b"".join(parts)
@@ -0,0 +1,90 @@
+"""
+Server-driven heartbeat and dead-connection reaper for the WebSocket Broadcast System
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from connection_manager import ConnectionManager
+from frames import Frame
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatMonitor:
+    """Pings idle connections and evicts the ones that stop answering
+
+    Every ``interval`` seconds, connections that have not sent anything for at
+    least ``interval`` seconds get a ``ping`` message (one shared frame per tick).
+    Connections silent for longer than ``interval + timeout`` are evicted in
+    one pass. Any inbound message counts as a sign of life, not only ``pong``.
+
+    Clients must be written to answer, so this is opt-in; dead connections are
+    otherwise found by the WebSocket protocol pings uvicorn sends.
+    """
+
+    def __init__(self, manager: ConnectionManager, interval: float, timeout: float):
+        self.manager = manager
+        self.interval = interval
+        self.timeout = timeout
+        self.pings_sent = 0
+        self.connections_reaped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the heartbeat loop; a non-positive interval disables it"""
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Heartbeat started: ping after {self.interval}s idle, evict after {self.interval + self.timeout}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Heartbeat tick failed: {e}")
+
+    def tick(self):
+        """Ping idle connections and evict dead ones in a single scan"""
+        now = time.monotonic()
+        ping_after = now - self.interval
+        evict_after = now - self.interval - self.timeout
+
+        idle = []
+        dead = []
+        for client in self.manager.active_connections.values():
+            if client.last_seen <= evict_after:
+                dead.append(client)
+            elif client.last_seen <= ping_after:
+                idle.append(client)
+
+        if dead:
+            self.manager.evict(dead, reason="heartbeat timeout")
+            self.connections_reaped += len(dead)
+
+        if idle:
+            ping = Frame.build("ping", message_type="ping", timestamp=datetime.now())
+            for client in idle:
+                client.enqueue(ping)
+            self.pings_sent += len(idle)
+
+    def get_info(self):
+        return {
+            "interval": self.interval,
+            "timeout": self.timeout,
+            "pings_sent": self.pings_sent,
+            "connections_reaped": self.connections_reaped
+        }
@@ -0,0 +1,110 @@
+"""
+Recent broadcast history for the WebSocket Broadcast System
+
+Every broadcast frame is stamped with a monotonically increasing sequence
+number and kept in a bounded ring buffer, so reconnecting clients can ask for
+what they missed (``?since=<seq>``) and get the stored bytes back without
+re-encoding anything.
+
+Shards of one process share a single history, so ``lock`` is held around
+every read and write of the buffer: by this class for replays and pages, and
+by the caller around ``record`` and ``load``, which it may need to combine
+with other work in the same critical section.
+"""
+
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from frames import Frame
+
+# (seq, channel, message_type, encoded JSON bytes): plain tuples keep entries small
+HistoryEntry = Tuple[int, Optional[str], Optional[str], bytes]
+
+
+class MessageHistory:
+    """Bounded ring buffer of sequenced broadcast frames
+
+    The buffer holds at most ``max_messages`` frames and ``max_bytes`` of
+    encoded data; the oldest frames are evicted first. Only the JSON bytes are
+    retained, not the decoded payloads.
+    """
+
+    def __init__(self, max_messages: int, max_bytes: int):
+        self.max_messages = max(1, max_messages)
+        self.max_bytes = max_bytes
+        self.last_seq = 0
+        self.bytes_stored = 0
+        self._entries: Deque[HistoryEntry] = deque()
+        self.lock = threading.Lock()
+
+    @property
+    def first_seq(self) -> int:
+        """Oldest retained sequence number, or the next one if the buffer is empty"""
+        return self._entries[0][0] if self._entries else self.last_seq + 1
+
+    def record(self, frame: Frame, channel: Optional[str] = None) -> Frame:
+        """Assign the next sequence number and store the frame; returns the stamped frame"""
+        self.last_seq += 1
+        stamped = frame.with_sequence(self.last_seq)
+        self._append((self.last_seq, channel, stamped.message_type, stamped.data))
+        return stamped
+
+    def load(self, entries: Iterable[HistoryEntry]):
+        """Refill the buffer with already-sequenced entries, e.g. from the durable log after a restart"""
+        for entry in entries:
+            if entry[0] > self.last_seq:
+                self._append(entry)
+                self.last_seq = entry[0]
+
+    def _append(self, entry: HistoryEntry):
+        entries = self._entries
+        entries.append(entry)
+        self.bytes_stored += len(entry[3])
+        while len(entries) > self.max_messages or (self.bytes_stored > self.max_bytes and len(entries) > 1):
+            self.bytes_stored -= len(entries.popleft()[3])
+
+    def _after(self, seq: int):
+        """Entries with a sequence number above ``seq``, skipping older ones by position"""
+        start = max(0, seq - self.first_seq + 1)
+        return islice(self._entries, start, None)
+
+    def replay(self, since: int, channel: Optional[str] = None) -> Tuple[List[Frame], bool]:
+        """Frames after ``since`` sent to ``channel`` (None: to everyone)
+
+        The flag is True when the client has a gap this buffer cannot fill:
+        frames after ``since`` were already evicted, or ``since`` is ahead of
+        the sequence (numbering restarted with the server).
+        """
+        with self.lock:
+            frames = [
+                Frame(data, message_type)
+                for _, entry_channel, message_type, data in self._after(since)
+                if entry_channel == channel
+            ]
+            return frames, since + 1 < self.first_seq or since > self.last_seq
+
+    def page(self, after: int, limit: int, channel: Optional[str] = None) -> List[HistoryEntry]:
+        """Up to ``limit`` entries after ``after``, optionally only one channel's"""
+        entries = []
+        with self.lock:
+            for entry in self._after(after):
+                if channel is None or entry[1] == channel:
+                    entries.append(entry)
+                    if len(entries) >= limit:
+                        break
+        return entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "messages": len(self._entries),
+            "bytes": self.bytes_stored,
+            "first_seq": self.first_seq,
+            "last_seq": self.last_seq,
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes
+        }
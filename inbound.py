@@ -0,0 +1,36 @@
+"""
+Inbound WebSocket message parsing for the WebSocket Broadcast System
+
+Messages are parsed and validated in one step by the compiled pydantic-core
+validator for ``InboundMessage``, without building an intermediate dict. Plain
+text is recognized from its first character instead of by catching a JSON
+decoding error.
+"""
+
+from typing import Union
+
+from pydantic import ValidationError
+
+from models import InboundMessage
+
+_validate_json = InboundMessage.__pydantic_validator__.validate_json
+_WHITESPACE = " \t\r\n"
+
+
+def parse_inbound(data: str) -> Union[InboundMessage, str, None]:
+    """Parse one inbound message
+
+    Returns an ``InboundMessage`` for a JSON object, the text itself for plain
+    text (anything that is not a JSON object, including malformed JSON), and
+    None for a JSON object with fields of the wrong type.
+    """
+    start = data[:1]
+    if start != "{" and (start not in _WHITESPACE or not data.lstrip().startswith("{")):
+        return data
+    try:
+        return _validate_json(data)
+    except ValidationError as e:
+        if e.errors(include_url=False)[0]["type"] == "json_invalid":
+            return data
+        return None
+
@@ -0,0 +1,82 @@
+"""
+Offline inbox for private messages in the WebSocket Broadcast System
+
+Private messages addressed to a client ID with no open connection are held
+here and delivered when that client next connects. Both the messages kept per
+recipient and the number of recipients are bounded, and messages expire, so an
+address nobody ever claims cannot grow memory without limit. Shards of one
+process share a single inbox, so it is guarded by a lock.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from frames import Frame
+from metrics import INBOX_EVICTED
+
+
+class OfflineInbox:
+    """Per-recipient queues of undelivered private frames
+
+    Each recipient keeps at most ``max_messages`` frames, oldest dropped first;
+    at ``max_recipients`` the inbox that was written longest ago is discarded
+    to make room. Frames older than ``ttl`` seconds are discarded on delivery.
+    """
+
+    def __init__(self, max_messages: int, max_recipients: int, ttl: float):
+        self.max_messages = max(1, max_messages)
+        self.max_recipients = max(1, max_recipients)
+        self.ttl = ttl
+        self.stored = 0
+        self.delivered = 0
+        # Recipient -> (stored at, frame); dict order tracks the least recently written recipient
+        self._inboxes: Dict[str, Deque[Tuple[float, Frame]]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, recipient: str, frame: Frame):
+        """Hold a frame for a recipient that is not connected"""
+        with self._lock:
+            inbox = self._inboxes.pop(recipient, None)
+            if inbox is None:
+                if len(self._inboxes) >= self.max_recipients:
+                    oldest = next(iter(self._inboxes))
+                    INBOX_EVICTED.inc(len(self._inboxes.pop(oldest)))
+                inbox = deque(maxlen=self.max_messages)
+            elif len(inbox) == self.max_messages:
+                INBOX_EVICTED.inc()
+            inbox.append((time.monotonic(), frame))
+            # Re-inserting moves the recipient to the end, so eviction takes the stalest inbox
+            self._inboxes[recipient] = inbox
+            self.stored += 1
+
+    def take(self, recipient: str) -> List[Frame]:
+        """Remove and return a recipient's unexpired frames, oldest first"""
+        with self._lock:
+            inbox = self._inboxes.pop(recipient, None)
+        if not inbox:
+            return []
+        cutoff = time.monotonic() - self.ttl
+        frames = [frame for stored_at, frame in inbox if stored_at >= cutoff]
+        if len(frames) < len(inbox):
+            INBOX_EVICTED.inc(len(inbox) - len(frames))
+        with self._lock:
+            self.delivered += len(frames)
+        return frames
+
+    def pending(self) -> int:
+        """Frames currently held across all recipients"""
+        with self._lock:
+            return sum(len(inbox) for inbox in self._inboxes.values())
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "recipients": len(self._inboxes),
+            "pending_messages": self.pending(),
+            "max_messages": self.max_messages,
+            "max_recipients": self.max_recipients,
+            "ttl_seconds": self.ttl,
+            "stored": self.stored,
+            "delivered": self.delivered
+        }
@@ -7,39 +7,195 @@ This application provides:
 3. REST API endpoints for sending broadcast messages
 4. Webhook support for external notifications
 5. Simple web interface for testing
+
+Importing this module does not build the application: ``main:app`` is created
+on first access, and ``python main.py`` serves ``create_app`` as a factory, so
+each process builds exactly one. Webhooks, the test page, diagnostics, the
+durable log, transform stages and sharding are only imported when enabled.
 """
 
+import asyncio
+import importlib.util
 import logging
 from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 # Import local modules
+from admission import AdmissionController
+from backplane import create_backplane
 from config import settings
-from connection_manager import ConnectionManager
+from connection_manager import ConnectionManager, managers
+from heartbeat import HeartbeatMonitor
+from rate_limit import RateLimits
+from status import LoopLagProbe, StatusSnapshots
 from api_routes import create_api_routes
 from websocket_routes import create_websocket_routes
-from webhooks import setup_webhooks
+
+if TYPE_CHECKING:
+    from sharding import ShardSet
 
 # Configure logging
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL.upper()))
 logger = logging.getLogger(__name__)
 
-# Initialize connection manager
-manager = ConnectionManager()
 
-# Lifespan events
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    logger.info("FastAPI WebSocket Broadcast Server starting up...")
-    yield
-    logger.info("FastAPI WebSocket Broadcast Server shutting down...")
+def create_app(shards: Optional["ShardSet"] = None) -> FastAPI:
+    """Create and configure the FastAPI application with its own manager and background services
+
+    With ``shards``, the application is one of several shards in this process:
+    it relays through the other shards, shares their message history and takes
+    its share of ``MAX_CONNECTIONS``.
+    """
+    
+    # Outbound webhook delivery
+    webhooks = None
+    if settings.WEBHOOKS_ENABLED:
+        from webhook_dispatcher import WebhookDispatcher
+        from webhook_events import SERVER_STATUS, WEBHOOK_EVENTS, notification
+        webhooks = WebhookDispatcher(
+            queue_size=settings.WEBHOOK_QUEUE_SIZE,
+            batch_window_ms=settings.WEBHOOK_BATCH_WINDOW_MS,
+            max_retries=settings.WEBHOOK_MAX_RETRIES,
+            retry_backoff=settings.WEBHOOK_RETRY_BACKOFF,
+            timeout=settings.WEBHOOK_TIMEOUT,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            stats_interval=settings.WEBHOOK_STATS_INTERVAL,
+            stats_source=lambda: {
+                "active_connections": len(manager.active_connections),
+                "total_messages": manager.total_messages_sent,
+                "uptime": int(manager.get_stats().uptime_seconds)
+            }
+        )
+        for url in settings.WEBHOOK_URLS:
+            webhooks.subscribe(url, list(WEBHOOK_EVENTS))
+
+    # Optional durable message log
+    message_log = None
+    if settings.MESSAGE_LOG_DIR:
+        from message_log import MessageLog
+        message_log = MessageLog(
+            settings.MESSAGE_LOG_DIR,
+            segment_bytes=settings.MESSAGE_LOG_SEGMENT_BYTES,
+            retention_bytes=settings.MESSAGE_LOG_RETENTION_BYTES,
+            fsync=settings.MESSAGE_LOG_FSYNC,
+            fsync_interval=settings.MESSAGE_LOG_FSYNC_INTERVAL,
+            flush_interval_ms=settings.MESSAGE_LOG_FLUSH_INTERVAL_MS,
+            index_interval_bytes=settings.MESSAGE_LOG_INDEX_INTERVAL_BYTES
+        )
+
+    # Optional transform stages, applied before fan-out
+    transforms = None
+    if settings.TRANSFORM_STAGES:
+        from transforms import TransformPipeline, load_stages
+        transforms = TransformPipeline(
+            load_stages(settings.TRANSFORM_STAGES),
+            thread_workers=settings.TRANSFORM_THREAD_WORKERS,
+            process_workers=settings.TRANSFORM_PROCESS_WORKERS or None,
+            max_pending=settings.TRANSFORM_MAX_PENDING
+        )
+
+    # Inbound rate limits
+    rate_limits = RateLimits(
+        settings.RATE_LIMIT_POLICY,
+        max_delay=settings.RATE_LIMIT_MAX_DELAY,
+        connection_rate=settings.CONNECTION_RATE_LIMIT,
+        connection_burst=settings.CONNECTION_RATE_BURST,
+        client_rate=settings.CLIENT_ID_RATE_LIMIT,
+        client_burst=settings.CLIENT_ID_RATE_BURST,
+        rest_rate=settings.REST_RATE_LIMIT,
+        rest_burst=settings.REST_RATE_BURST
+    )
+
+    max_connections = settings.MAX_CONNECTIONS
+    if shards is not None:
+        from sharding import ThreadBackplane
+        backplane = ThreadBackplane(shards)
+        if max_connections is not None:
+            max_connections = -(-max_connections // shards.count)
+    else:
+        backplane = create_backplane(
+            settings.BACKPLANE,
+            socket_path=settings.BACKPLANE_SOCKET_PATH,
+            redis_url=settings.REDIS_URL,
+            redis_channel=settings.REDIS_CHANNEL
+        )
+
+    # Initialize connection manager
+    manager = ConnectionManager(
+        backplane=backplane,
+        message_log=message_log,
+        rate_limits=rate_limits,
+        admission=AdmissionController(
+            max_connections,
+            queue_size=settings.ADMISSION_QUEUE_SIZE,
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT
+        ),
+        webhooks=webhooks,
+        transforms=transforms,
+        shards=shards
+    )
+    managers.append(manager)
 
+    heartbeat = HeartbeatMonitor(manager, settings.HEARTBEAT_INTERVAL, settings.HEARTBEAT_TIMEOUT)
+
+    # Optional event-loop diagnostics; its sampler doubles as the readiness probe's lag check
+    diagnostics = None
+    if settings.DIAGNOSTICS:
+        from diagnostics import Diagnostics
+        diagnostics = Diagnostics(
+            sample_interval=settings.DIAGNOSTICS_SAMPLE_INTERVAL,
+            slow_threshold=settings.SLOW_CALLBACK_THRESHOLD,
+            profile_max_seconds=settings.PROFILE_MAX_SECONDS
+        )
+
+    # Pre-rendered status bodies and the readiness probe's loop-lag check
+    status = StatusSnapshots(
+        manager,
+        ttl=settings.STATUS_CACHE_TTL,
+        lag_probe=(
+            diagnostics.sampler if diagnostics is not None
+            else LoopLagProbe(settings.LOOP_LAG_PROBE_INTERVAL)
+        ),
+        max_loop_lag=settings.READY_MAX_LOOP_LAG
+    )
 
-def create_app() -> FastAPI:
-    """Create and configure the FastAPI application"""
+    # Test page and static files, served from memory
+    assets = None
+    if settings.STATIC_ENABLED:
+        from static_assets import AssetCache
+        assets = AssetCache(
+            {"templates": settings.TEMPLATES_DIR, "static": settings.STATIC_DIR},
+            check_interval=settings.STATIC_CHECK_INTERVAL
+        )
+
+    # Lifespan events
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        logger.info("FastAPI WebSocket Broadcast Server starting up...")
+        if webhooks is not None:
+            await webhooks.start()
+        # Files are read in the background: connections are accepted without waiting for them
+        preload = asyncio.create_task(asyncio.to_thread(assets.preload)) if assets is not None else None
+        await manager.start()
+        heartbeat.start()
+        status.start()
+        if webhooks is not None:
+            webhooks.emit(SERVER_STATUS, notification("server_startup", {"status": "running", "additional_info": {}}))
+        yield
+        logger.info("FastAPI WebSocket Broadcast Server shutting down...")
+        await status.stop()
+        if webhooks is not None:
+            webhooks.emit(SERVER_STATUS, notification("server_shutdown", {"status": "stopping", "additional_info": {}}))
+        await heartbeat.stop()
+        await manager.stop()
+        if webhooks is not None:
+            await webhooks.stop()
+        if preload is not None:
+            await preload
     
     # Initialize FastAPI app
     app = FastAPI(
@@ -48,6 +204,7 @@ def create_app() -> FastAPI:
         version=settings.APP_VERSION,
         lifespan=lifespan
     )
+    app.state.manager = manager
 
     # Add CORS middleware
     app.add_middleware(
@@ -58,13 +215,35 @@ def create_app() -> FastAPI:
         allow_headers=settings.CORS_HEADERS,
     )
 
+    # Outermost, so route timings include the other middleware
+    if diagnostics is not None:
+        from diagnostics import RouteTimingMiddleware
+        app.add_middleware(RouteTimingMiddleware)
+
     # Setup webhook definitions
-    setup_webhooks(app)
+    if webhooks is not None:
+        from webhooks import setup_webhooks
+        setup_webhooks(app)
 
     # Include API routes
-    api_router = create_api_routes(manager)
+    api_router = create_api_routes(manager, status)
     app.include_router(api_router)
 
+    # Include test page and static file routes
+    if assets is not None:
+        from static_assets import create_static_routes
+        app.include_router(create_static_routes(assets, settings.STATIC_MAX_AGE))
+
+    # Include webhook subscriber registration routes
+    if webhooks is not None:
+        from webhooks import create_webhook_routes
+        app.include_router(create_webhook_routes(webhooks, settings.WEBHOOK_REGISTRATION_ENABLED))
+
+    # Include stall and profiler routes when diagnostics are enabled
+    if diagnostics is not None:
+        from diagnostics import create_diagnostics_routes
+        app.include_router(create_diagnostics_routes(diagnostics))
+
     # Include WebSocket routes
     websocket_router = create_websocket_routes(manager)
     app.include_router(websocket_router)
@@ -72,14 +251,75 @@ def create_app() -> FastAPI:
     return app
 
 
-# Create the app instance
-app = create_app()
+def __getattr__(name: str) -> Any:
+    """Build the default application on first access to ``main.app`` or ``main.manager``
+
+    ``uvicorn main:app`` still works; merely importing this module stays cheap.
+    """
+    if name in ("app", "manager"):
+        app = create_app()
+        globals().update(app=app, manager=app.state.manager)
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def server_options() -> Dict[str, Any]:
+    """uvicorn options for the configured profile: event loop, HTTP parser, access log and WebSocket limits"""
+    return {
+        "host": settings.HOST,
+        "port": settings.PORT,
+        "log_level": settings.LOG_LEVEL,
+        "access_log": settings.access_log,
+        "loop": settings.LOOP,
+        "http": settings.HTTP,
+        "ws": "websockets",
+        "ws_per_message_deflate": settings.WS_PER_MESSAGE_DEFLATE,
+        # Liveness at the protocol level: every client answers these pings without application code
+        "ws_ping_interval": settings.WS_PING_INTERVAL,
+        "ws_ping_timeout": settings.WS_PING_TIMEOUT,
+        # Oversized frames are refused by the protocol layer from their header, before buffering
+        "ws_max_size": settings.MAX_MESSAGE_SIZE
+    }
+
+
+def _describe_profile() -> str:
+    """The loop and parser that "auto" resolves to, for the startup log"""
+    def resolve(choice: str, fast: str, fallback: str) -> str:
+        if choice != "auto":
+            return choice
+        return fast if importlib.util.find_spec(fast) is not None else fallback
+
+    return (
+        f"{settings.ENVIRONMENT} mode, loop={resolve(settings.LOOP, 'uvloop', 'asyncio')}, "
+        f"http={resolve(settings.HTTP, 'httptools', 'h11')}, "
+        f"workers={settings.WORKERS}, shards={settings.SHARDS}, reload={settings.RELOAD}"
+    )
+
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app", 
-        host=settings.HOST, 
-        port=settings.PORT, 
-        reload=settings.RELOAD,
-        log_level=settings.LOG_LEVEL
-    )
\ No newline at end of file
+    logger.info(f"Starting in {_describe_profile()}")
+    options = server_options()
+    if settings.SHARDS > 1:
+        # Several event loops in this process; each shard builds its own application
+        from history import MessageHistory
+        from inbox import OfflineInbox
+        from sharding import ShardSet, serve_sharded
+        shard_set = ShardSet(
+            settings.SHARDS,
+            history=MessageHistory(settings.HISTORY_SIZE, settings.HISTORY_MAX_BYTES) if settings.HISTORY_SIZE > 0 else None,
+            inbox=(
+                OfflineInbox(settings.INBOX_MAX_MESSAGES, settings.INBOX_MAX_RECIPIENTS, settings.INBOX_TTL)
+                if settings.INBOX_MAX_MESSAGES > 0 else None
+            )
+        )
+        host, port = options.pop("host"), options.pop("port")
+        serve_sharded(lambda index: create_app(shard_set), settings.SHARDS, host, port, **options)
+    else:
+        # A factory, so each worker (or the reloader's child) builds its own application on startup
+        uvicorn.run(
+            "main:create_app",
+            factory=True,
+            reload=settings.RELOAD,
+            workers=settings.WORKERS,
+            **options
+        )
@@ -0,0 +1,418 @@
+"""
+Durable append-only message log for the WebSocket Broadcast System
+
+Sequenced broadcast frames are appended to segment files on disk so they
+survive restarts. Appends only buffer the record; a background task
+group-commits everything buffered in one write (and, depending on the fsync
+policy, one fsync) per flush interval. Each segment has a sparse index of
+``(seq, position)`` pairs so replay can seek close to a sequence number and
+read forward through a memory map instead of scanning the whole log.
+
+Layout: ``<base seq>.log`` holds records, ``<base seq>.idx`` the sparse index.
+A record is a fixed header followed by the channel, message type and frame bytes.
+"""
+
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from frames import Frame
+from history import HistoryEntry
+
+logger = logging.getLogger(__name__)
+
+# body length, crc32, seq, channel length, message type length
+RECORD_HEADER = struct.Struct("<IIQHB")
+# The part of the header covered by the checksum, together with the body
+CHECKSUMMED_HEADER = struct.Struct("<QHB")
+INDEX_ENTRY = struct.Struct("<QQ")
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def encode_record(seq: int, channel: Optional[str], message_type: Optional[str], data: bytes) -> bytes:
+    """Serialize one log record; a missing channel or message type is stored as empty"""
+    channel_bytes = channel.encode("utf-8") if channel else b""
+    type_bytes = message_type.encode("utf-8") if message_type else b""
+    if len(type_bytes) > 255:
+        # Only used as a coalescing key, so an oversized type is not worth keeping
+        type_bytes = b""
+    body = channel_bytes + type_bytes + data
+    checksum = zlib.crc32(body, zlib.crc32(CHECKSUMMED_HEADER.pack(seq, len(channel_bytes), len(type_bytes))))
+    return RECORD_HEADER.pack(len(body), checksum, seq, len(channel_bytes), len(type_bytes)) + body
+
+
+class _Segment:
+    """One log file with its sparse index, kept in memory"""
+
+    __slots__ = ("base_seq", "path", "index_path", "size", "last_seq", "index_seqs", "index_positions",
+                 "last_indexed")
+
+    def __init__(self, directory: str, base_seq: int):
+        self.base_seq = base_seq
+        self.path = os.path.join(directory, f"{base_seq:020d}.log")
+        self.index_path = os.path.join(directory, f"{base_seq:020d}.idx")
+        self.size = 0
+        self.last_seq = base_seq - 1
+        self.index_seqs: List[int] = []
+        self.index_positions: List[int] = []
+        self.last_indexed = -1
+
+    def seek_position(self, seq: int) -> int:
+        """File position of an indexed record at or before ``seq``"""
+        slot = bisect_right(self.index_seqs, seq) - 1
+        return self.index_positions[slot] if slot >= 0 else 0
+
+
+class MessageLog:
+    """Segmented append-only log of sequenced frames with group commit"""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int,
+        retention_bytes: int,
+        fsync: str = "interval",
+        fsync_interval: float = 1.0,
+        flush_interval_ms: float = 10,
+        index_interval_bytes: int = 4096
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of: {', '.join(FSYNC_POLICIES)}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retention_bytes = retention_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.flush_interval = flush_interval_ms / 1000
+        self.index_interval_bytes = index_interval_bytes
+
+        self.segments: List[_Segment] = []
+        self.last_seq = 0
+        self.records_written = 0
+        self.commits = 0
+        self.fsyncs = 0
+        self.bytes_written = 0
+        self.segments_deleted = 0
+
+        self._pending: List[Tuple[int, bytes]] = []
+        self._log_fd: Optional[int] = None
+        self._index_fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._last_fsync = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    # Lifecycle
+
+    async def start(self) -> bool:
+        """Recover the log from disk and start committing; False if another process owns it"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.directory, "LOCK"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            logger.error(f"Message log {self.directory} is in use by another process, durable log disabled")
+            return False
+
+        await asyncio.to_thread(self._recover)
+        self._task = asyncio.create_task(self._commit_loop())
+        logger.info(
+            f"Message log opened: {len(self.segments)} segments, "
+            f"seq {self.first_seq}-{self.last_seq}, {self.total_bytes()} bytes"
+        )
+        return True
+
+    async def stop(self):
+        """Commit what is buffered, sync and close the files"""
+        if self._task is None:
+            return
+        # Let an in-flight commit finish rather than cancelling it mid-write
+        self._stopping.set()
+        await self._task
+        self._task = None
+        await self._commit(force_fsync=self.fsync != "never")
+        await asyncio.to_thread(self._close_files)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # Writing
+
+    def append(self, seq: int, channel: Optional[str], frame: Frame):
+        """Buffer a record; it reaches the disk with the next group commit"""
+        self._pending.append((seq, encode_record(seq, channel, frame.message_type, frame.data)))
+        self.last_seq = seq
+
+    async def _commit_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._commit()
+            except Exception as e:
+                logger.error(f"Error committing message log: {e}")
+
+    async def _commit(self, force_fsync: bool = False):
+        """Write every buffered record in one go, rolling segments and applying retention
+
+        Positions and index entries are planned on the event loop (the log has a
+        single writer, so a segment's size is its next write position); only the
+        file I/O runs in a worker thread. Readers see new records once committed.
+        """
+        if not self._pending and not force_fsync:
+            return
+        pending, self._pending = self._pending, []
+
+        # Each write: (segment, data, index entries, new size, last seq, whether it starts the segment)
+        writes = []
+        segment = self.segments[-1] if self.segments else None
+        chunk: List[bytes] = []
+        index: List[Tuple[int, int]] = []
+        size = segment.size if segment is not None else 0
+        last_indexed = segment.last_indexed if segment is not None else -1
+        last_seq = segment.last_seq if segment is not None else 0
+        new_segment = False
+        for seq, record in pending:
+            if segment is None or size >= self.segment_bytes:
+                if chunk:
+                    writes.append((segment, b"".join(chunk), index, size, last_seq, new_segment))
+                segment = _Segment(self.directory, seq)
+                chunk, index, size, last_indexed, new_segment = [], [], 0, -1, True
+            if last_indexed < 0 or size - last_indexed >= self.index_interval_bytes:
+                index.append((seq, size))
+                last_indexed = size
+            chunk.append(record)
+            size += len(record)
+            last_seq = seq
+        if chunk:
+            writes.append((segment, b"".join(chunk), index, size, last_seq, new_segment))
+
+        sync = force_fsync or self.fsync == "always" or (
+            self.fsync == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval
+        )
+        await asyncio.to_thread(self._write, writes, sync)
+
+        for segment, data, index, size, last_seq, new_segment in writes:
+            if new_segment:
+                self.segments.append(segment)
+            for seq, position in index:
+                segment.index_seqs.append(seq)
+                segment.index_positions.append(position)
+            if index:
+                segment.last_indexed = index[-1][1]
+            segment.size = size
+            segment.last_seq = last_seq
+        self.records_written += len(pending)
+        self.commits += 1
+        await self._apply_retention()
+
+    def _write(self, writes, sync: bool):
+        """Append planned chunks to their segment files (runs in a worker thread)"""
+        for segment, data, index, size, last_seq, new_segment in writes:
+            if new_segment or self._log_fd is None:
+                self._open_segment(segment, sync_previous=self.fsync != "never")
+            os.write(self._log_fd, data)
+            if index:
+                os.write(self._index_fd, b"".join(INDEX_ENTRY.pack(seq, position) for seq, position in index))
+            self.bytes_written += len(data)
+        if sync and self._log_fd is not None:
+            os.fsync(self._log_fd)
+            os.fsync(self._index_fd)
+            self.fsyncs += 1
+            self._last_fsync = time.monotonic()
+
+    def _open_segment(self, segment: _Segment, sync_previous: bool):
+        if self._log_fd is not None:
+            if sync_previous:
+                os.fsync(self._log_fd)
+                os.fsync(self._index_fd)
+            self._close_files()
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        self._log_fd = os.open(segment.path, flags, 0o644)
+        self._index_fd = os.open(segment.index_path, flags, 0o644)
+
+    def _close_files(self):
+        for fd in (self._log_fd, self._index_fd):
+            if fd is not None:
+                os.close(fd)
+        self._log_fd = self._index_fd = None
+
+    async def _apply_retention(self):
+        """Delete the oldest closed segments while the log exceeds its retention size"""
+        expired = []
+        total = self.total_bytes()
+        while len(self.segments) > 1 and total > self.retention_bytes:
+            segment = self.segments.pop(0)
+            total -= segment.size
+            expired.append(segment)
+        if expired:
+            await asyncio.to_thread(self._delete, expired)
+            self.segments_deleted += len(expired)
+
+    @staticmethod
+    def _delete(segments: List[_Segment]):
+        for segment in segments:
+            for path in (segment.path, segment.index_path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    # Recovery
+
+    def _recover(self):
+        """Load segment indexes and truncate a torn write at the end of the log"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(".log"))
+        for number, name in enumerate(names):
+            segment = _Segment(self.directory, int(name[:-4]))
+            segment.size = os.path.getsize(segment.path)
+            self._load_index(segment)
+            if number == len(names) - 1:
+                # Only the active segment can end in a partial record
+                self._scan_tail(segment)
+            else:
+                segment.last_seq = int(names[number + 1][:-4]) - 1
+            if segment.size:
+                self.segments.append(segment)
+            else:
+                self._delete([segment])
+        if self.segments:
+            self.last_seq = self.segments[-1].last_seq
+
+    def _load_index(self, segment: _Segment):
+        try:
+            with open(segment.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for seq, position in INDEX_ENTRY.iter_unpack(data[:usable]):
+            if position >= segment.size:
+                break
+            segment.index_seqs.append(seq)
+            segment.index_positions.append(position)
+        if not segment.index_seqs:
+            # Missing or empty index: rebuild it while scanning the whole file
+            segment.index_seqs.clear()
+            segment.index_positions.clear()
+            self._scan_tail(segment, rebuild_index=True)
+            return
+        segment.last_indexed = segment.index_positions[-1]
+
+    def _scan_tail(self, segment: _Segment, rebuild_index: bool = False):
+        """Validate records from the last index entry on, truncating at the first bad one"""
+        position = 0 if rebuild_index else (segment.index_positions[-1] if segment.index_positions else 0)
+        index: List[Tuple[int, int]] = []
+        with open(segment.path, "rb") as f:
+            f.seek(position)
+            data = f.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum, seq, channel_length, type_length = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length
+            body = data[offset + RECORD_HEADER.size:end]
+            if end > len(data) or zlib.crc32(
+                body, zlib.crc32(CHECKSUMMED_HEADER.pack(seq, channel_length, type_length))
+            ) != checksum:
+                break
+            if rebuild_index and (not index or position + offset - index[-1][1] >= self.index_interval_bytes):
+                index.append((seq, position + offset))
+            segment.last_seq = seq
+            offset = end
+
+        valid_size = position + offset
+        if valid_size < segment.size:
+            logger.warning(f"Truncating {segment.size - valid_size} bytes of partial records from {segment.path}")
+            os.truncate(segment.path, valid_size)
+            segment.size = valid_size
+        if rebuild_index:
+            segment.index_seqs = [seq for seq, _ in index]
+            segment.index_positions = [pos for _, pos in index]
+            with open(segment.index_path, "wb") as f:
+                f.write(b"".join(INDEX_ENTRY.pack(seq, pos) for seq, pos in index))
+        else:
+            # Drop index entries pointing past a truncated tail
+            while segment.index_positions and segment.index_positions[-1] >= segment.size:
+                segment.index_positions.pop()
+                segment.index_seqs.pop()
+        segment.last_indexed = segment.index_positions[-1] if segment.index_positions else -1
+
+    # Reading
+
+    @property
+    def first_seq(self) -> int:
+        """Oldest sequence number on disk, or the next one if the log is empty"""
+        return self.segments[0].base_seq if self.segments else self.last_seq + 1
+
+    @property
+    def committed_seq(self) -> int:
+        return self.segments[-1].last_seq if self.segments else 0
+
+    def read(self, since: int, until: int) -> List[HistoryEntry]:
+        """Committed records with ``since < seq <= until``, read through memory maps
+
+        Record headers and channels are parsed in place; each frame body is
+        copied out of the map exactly once.
+        """
+        entries: List[HistoryEntry] = []
+        start = max(0, bisect_right([s.base_seq for s in self.segments], since + 1) - 1)
+        for segment in self.segments[start:]:
+            if segment.base_seq > until:
+                break
+            size = segment.size
+            if not size or segment.last_seq <= since:
+                continue
+            try:
+                with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as view:
+                    self._read_segment(view, segment.seek_position(since + 1), size, since, until, entries)
+            except (FileNotFoundError, ValueError):
+                # Deleted by retention since the segment list was read
+                continue
+        return entries
+
+    @staticmethod
+    def _read_segment(view: mmap.mmap, offset: int, size: int, since: int, until: int, entries: List[HistoryEntry]):
+        header_size = RECORD_HEADER.size
+        while offset + header_size <= size:
+            length, _, seq, channel_length, type_length = RECORD_HEADER.unpack_from(view, offset)
+            body = offset + header_size
+            offset = body + length
+            if seq <= since:
+                continue
+            if seq > until:
+                break
+            data_start = body + channel_length + type_length
+            channel = view[body:body + channel_length].decode("utf-8") if channel_length else None
+            message_type = view[body + channel_length:data_start].decode("utf-8") if type_length else None
+            entries.append((seq, channel, message_type, view[data_start:offset]))
+
+    def total_bytes(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+    def get_info(self) -> Dict[str, object]:
+        return {
+            "directory": self.directory,
+            "segments": len(self.segments),
+            "bytes": self.total_bytes(),
+            "first_seq": self.first_seq,
+            "last_seq": self.last_seq,
+            "committed_seq": self.committed_seq,
+            "pending_records": len(self._pending),
+            "records_written": self.records_written,
+            "commits": self.commits,
+            "fsyncs": self.fsyncs,
+            "fsync_policy": self.fsync,
+            "segments_deleted": self.segments_deleted
+        }
@@ -0,0 +1,284 @@
+"""
+Lightweight Prometheus-style metrics for the WebSocket Broadcast System
+
+Metrics are plain Python values guarded by a per-metric lock, since shards
+update them from several event-loop threads. The lock is almost never
+contended, so an update costs little more than the attribute operations and is
+cheap enough to leave on in production. ``REGISTRY.render()`` produces the Prometheus
+text exposition format served at ``/metrics``.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond queue hand-offs up to multi-second stalls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """A monotonically increasing value, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.value = 0
+        self._children: Dict[Tuple[str, ...], "Counter"] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def labels(self, *values: str) -> "Counter":
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, type(self)(self.name, self.documentation))
+        return child
+
+    def samples(self) -> List[str]:
+        if not self.labelnames:
+            return [f"{self.name} {_format_value(self.value)}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    """A value that can go up and down, or is read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {_format_value(self.function())}"]
+        return super().samples()
+
+
+class Histogram:
+    """Bucketed observations, optionally split by labels; buckets are cumulated only when rendered"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        labelnames: Sequence[str] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._children: Dict[Tuple[str, ...], "Histogram"] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def labels(self, *values: str) -> "Histogram":
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.name, self.documentation, self.bounds))
+        return child
+
+    def time(self) -> "_Timer":
+        """Context manager observing the elapsed wall time in seconds"""
+        return _Timer(self)
+
+    def samples(self) -> List[str]:
+        if not self.labelnames:
+            return self._samples("")
+        lines = []
+        for values, child in list(self._children.items()):
+            lines.extend(child._samples(_format_labels(self.labelnames, values)[1:-1]))
+        return lines
+
+    def _samples(self, labels: str) -> List[str]:
+        prefix = labels + "," if labels else ""
+        suffix = "{" + labels + "}" if labels else ""
+        # Copied together so the buckets, sum and count agree with each other
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket in zip(self.bounds + [math.inf], counts):
+            cumulative += bucket
+            lines.append(f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum{suffix} {repr(total)}")
+        lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class MetricsRegistry:
+    """Holds every metric and renders the text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        labelnames: Sequence[str] = ()
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets, labelnames))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Fan-out and delivery
+BROADCAST_DURATION = REGISTRY.histogram(
+    "broadcast_fan_out_seconds", "Time to hand one frame to every recipient queue")
+BROADCAST_RECIPIENTS = REGISTRY.counter(
+    "broadcast_recipients_total", "Recipient deliveries attempted by fan-outs")
+SEND_LATENCY = REGISTRY.histogram(
+    "websocket_send_seconds", "Time a single socket send took in a writer task")
+MESSAGES_SENT = REGISTRY.counter(
+    "websocket_messages_sent_total", "Frames written to client sockets")
+BYTES_SENT = REGISTRY.counter(
+    "websocket_bytes_sent_total", "Payload bytes written to client sockets")
+MESSAGES_DROPPED = REGISTRY.counter(
+    "websocket_messages_dropped_total", "Frames dropped or replaced by queue overflow policies")
+SEND_TIMEOUTS = REGISTRY.counter(
+    "websocket_send_timeouts_total", "Sends that exceeded SEND_TIMEOUT")
+
+# Serialization
+SERIALIZATION_DURATION = REGISTRY.histogram(
+    "frame_serialization_seconds", "Time to encode one frame in one wire encoding")
+
+# Connection lifecycle
+CONNECTIONS_OPENED = REGISTRY.counter(
+    "websocket_connections_opened_total", "WebSocket connections accepted")
+CONNECTIONS_CLOSED = REGISTRY.counter(
+    "websocket_connections_closed_total", "WebSocket connections closed, by reason", ["reason"])
+CONNECTIONS_REJECTED = REGISTRY.counter(
+    "websocket_connections_rejected_total", "Connections refused by admission control, by reason", ["reason"])
+
+# Inbound traffic
+INBOUND_MESSAGES = REGISTRY.counter(
+    "websocket_inbound_messages_total", "Messages received from clients, by message type", ["message_type"])
+OVERSIZED_MESSAGES = REGISTRY.counter(
+    "websocket_oversized_messages_total", "Inbound messages over MAX_MESSAGE_SIZE, whose connections were closed")
+RATE_LIMITED = REGISTRY.counter(
+    "rate_limited_total", "Messages and requests over a rate limit, by limit scope and action taken",
+    ["scope", "action"])
+
+# Message transforms
+TRANSFORM_DURATION = REGISTRY.histogram(
+    "transform_stage_seconds", "Time one transform stage took for one message, including pool wait")
+TRANSFORM_MESSAGES = REGISTRY.counter(
+    "transform_messages_total", "Messages through each transform stage, by outcome: passed, dropped or error",
+    ["stage", "outcome"])
+
+# Private messages
+PRIVATE_MESSAGES = REGISTRY.counter(
+    "private_messages_total", "Private messages by outcome: delivered, stored, relayed or undeliverable",
+    ["outcome"])
+INBOX_EVICTED = REGISTRY.counter(
+    "inbox_messages_evicted_total", "Offline inbox messages discarded by a size limit or expiry")
+
+# Diagnostics (recorded only when DIAGNOSTICS is enabled)
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran the lag sampler's timer")
+EVENT_LOOP_STALLS = REGISTRY.counter(
+    "event_loop_stalls_total", "Times the event loop was blocked for longer than SLOW_CALLBACK_THRESHOLD")
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request, by method and route template",
+    labelnames=["method", "route"])
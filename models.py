@@ -3,8 +3,8 @@ Pydantic models for the WebSocket Broadcast System
 """
 
 from datetime import datetime
-from typing import Dict, Any
-from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional
+from pydantic import AnyHttpUrl, BaseModel, Field
 
 
 class BroadcastMessage(BaseModel):
@@ -13,6 +13,10 @@ class BroadcastMessage(BaseModel):
     sender: str = Field(default="System", description="The sender of the message")
     timestamp: datetime = Field(default_factory=datetime.now, description="Timestamp of the message")
     message_type: str = Field(default="broadcast", description="Type of the message")
+    coalesce_key: Optional[str] = Field(
+        default=None,
+        description="With QUEUE_OVERFLOW_POLICY=coalesce, a newer message with the same key replaces this one in a full client queue"
+    )
 
 
 class WebhookNotification(BaseModel):
@@ -22,6 +26,13 @@ class WebhookNotification(BaseModel):
     timestamp: datetime = Field(default_factory=datetime.now, description="Timestamp of the event")
 
 
+class WebhookSubscriptionRequest(BaseModel):
+    """Model for registering a webhook subscriber"""
+    url: AnyHttpUrl = Field(..., description="http(s) URL that receives a POST per event (or per batch)")
+    events: List[str] = Field(..., min_length=1, description="Webhook events to deliver to the URL")
+    batch_size: int = Field(default=1, ge=1, le=1000, description="Events per POST; above 1 the body is a JSON array")
+
+
 class ConnectionStats(BaseModel):
     """Model for connection statistics"""
     active_connections: int = Field(..., description="Number of active WebSocket connections")
@@ -29,8 +40,37 @@ class ConnectionStats(BaseModel):
     uptime_seconds: int = Field(..., description="Server uptime in seconds")
 
 
+class BroadcastResult(BaseModel):
+    """Model for the outcome of a fan-out to multiple clients"""
+    recipients: int = Field(default=0, description="Number of clients the message was addressed to")
+    delivered: int = Field(default=0, description="Number of clients the message was queued for")
+    dropped: int = Field(default=0, description="Number of clients whose full queue dropped the message")
+    failed: int = Field(default=0, description="Number of clients already closed or disconnected as slow consumers")
+    duration_ms: float = Field(default=0.0, description="Wall-clock duration of the fan-out in milliseconds")
+    relayed: bool = Field(default=False, description="Whether the message was relayed to other workers or hosts")
+    batched: bool = Field(default=False, description="Whether the message is waiting in a batch window before fan-out")
+    seq: Optional[int] = Field(default=None, description="Sequence number of the message in this server's history")
+    stored: bool = Field(default=False, description="Whether the message was held in the offline inbox for a later connect")
+
+
 class ChatMessage(BaseModel):
     """Model for chat messages from WebSocket clients"""
     message: str = Field(..., description="The chat message content")
     sender: str = Field(default="Anonymous", description="The sender's name")
-    message_type: str = Field(default="chat", description="Type of the message")
\ No newline at end of file
+    message_type: str = Field(default="chat", description="Type of the message")
+
+
+class InboundMessage(BaseModel):
+    """Model for messages received over the WebSocket
+
+    The chat fields of ``ChatMessage``, optional here because control messages
+    (``ping``, ``subscribe``...) omit them, plus the routing fields clients may set.
+    Unknown fields are ignored.
+    """
+    message: Optional[str] = Field(default=None, description="The chat message content")
+    sender: Optional[str] = Field(default=None, description="The sender's name")
+    message_type: Optional[str] = Field(default=None, description="Type of the message")
+    channel: Optional[str] = Field(default=None, description="Channel to publish to or subscribe to")
+    channels: Optional[List[str]] = Field(default=None, description="Channels to subscribe to or unsubscribe from")
+    since: Optional[int] = Field(default=None, description="Sequence number to replay channel history from")
+    to: Optional[str] = Field(default=None, description="Client ID or connection ID a private message is addressed to")
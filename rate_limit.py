@@ -0,0 +1,209 @@
+"""
+Token-bucket rate limiting for the WebSocket Broadcast System
+
+Every inbound WebSocket message can turn into an N-way broadcast, so one
+flooding client can saturate the server. Limits apply per connection, per
+client ID (across all of its connections) and per REST caller.
+
+Buckets are refilled lazily from the elapsed time when they are checked, so no
+timers run; a bucket is two floats and a counter. Buckets that have refilled completely
+carry no state worth keeping and are pruned when a limiter reaches its key cap.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from enum import Enum
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitPolicy(str, Enum):
+    """What happens to a message over the limit"""
+    DROP = "drop"
+    DELAY = "delay"
+    DISCONNECT = "disconnect"
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "throttled")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.throttled = 0
+
+
+class RateLimiter:
+    """Token buckets keyed by connection, client ID or caller"""
+
+    def __init__(self, scope: str, rate: float, burst: float, max_keys: int = 10000):
+        self.scope = scope
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_keys = max_keys
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+
+    def acquire(self, key: Hashable, reserve: bool = False) -> float:
+        """Take a token; returns 0 if one was available, else the seconds until one is
+
+        With ``reserve`` the token is taken anyway (the bucket goes negative), so
+        a caller that waits the returned time is then entitled to proceed.
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+        tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        if tokens >= 1:
+            bucket.tokens = tokens - 1
+            return 0.0
+        bucket.throttled += 1
+        bucket.tokens = tokens - 1 if reserve else tokens
+        return (1 - tokens) / self.rate
+
+    def refund(self, key: Hashable):
+        """Give back a token taken for a message that another limit then rejected"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.tokens = min(self.burst, bucket.tokens + 1)
+
+    def forget(self, key: Hashable):
+        self._buckets.pop(key, None)
+
+    def _prune(self, now: float):
+        """Drop buckets that have refilled completely; they behave exactly like new ones"""
+        full = [
+            key for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated) * self.rate >= self.burst
+        ]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            logger.warning(f"{self.scope} rate limiter is tracking {len(self._buckets)} active keys")
+
+    def top_throttled(self, count: int = 10) -> List[Dict[str, Any]]:
+        """The keys throttled most often among those currently tracked"""
+        top = heapq.nlargest(count, self._buckets.items(), key=lambda item: item[1].throttled)
+        return [{"key": str(key), "throttled": bucket.throttled} for key, bucket in top if bucket.throttled]
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tracked_keys": len(self._buckets),
+            "top_throttled": self.top_throttled()
+        }
+
+
+class RateLimits:
+    """The configured limiters and the policy applied when one is exceeded
+
+    A rate of 0 disables that limiter. With the ``delay`` policy a message
+    waits for its token, which also stops reading from that socket so TCP
+    pushes back on the sender; waits longer than ``max_delay`` are dropped.
+    """
+
+    def __init__(
+        self,
+        policy: RateLimitPolicy,
+        max_delay: float,
+        connection_rate: float,
+        connection_burst: float,
+        client_rate: float,
+        client_burst: float,
+        rest_rate: float,
+        rest_burst: float,
+        max_keys: int = 10000
+    ):
+        self.policy = RateLimitPolicy(policy)
+        self.max_delay = max_delay
+        self.connection = RateLimiter("connection", connection_rate, connection_burst) if connection_rate > 0 else None
+        self.client_id = RateLimiter("client_id", client_rate, client_burst, max_keys) if client_rate > 0 else None
+        self.rest = RateLimiter("rest", rest_rate, rest_burst, max_keys) if rest_rate > 0 else None
+
+    def _acquire(self, limiters: List[Tuple[RateLimiter, Hashable]]) -> float:
+        """Take a token from every applicable limiter; returns the longest wait
+
+        A message that will not be processed gets its tokens back, so being
+        rejected by one limit does not also use up another.
+        """
+        reserve = self.policy is RateLimitPolicy.DELAY
+        wait = 0.0
+        taken = []
+        for limiter, key in limiters:
+            limiter_wait = limiter.acquire(key, reserve)
+            if reserve or not limiter_wait:
+                taken.append((limiter, key))
+            if limiter_wait:
+                wait = max(wait, limiter_wait)
+                RATE_LIMITED.labels(limiter.scope, self._action(limiter, limiter_wait)).inc()
+                if not reserve:
+                    break
+        if wait and (not reserve or wait > self.max_delay):
+            for limiter, key in taken:
+                limiter.refund(key)
+        return wait
+
+    def _action(self, limiter: RateLimiter, wait: float) -> str:
+        """Metric label for what happens to a throttled message or request"""
+        if self.policy is RateLimitPolicy.DELAY:
+            return "delayed" if wait <= self.max_delay else "dropped"
+        if self.policy is RateLimitPolicy.DISCONNECT and limiter is not self.rest:
+            return "disconnected"
+        return "dropped"
+
+    async def admit_message(self, connection_id: str, client_id: Optional[str]) -> Optional[bool]:
+        """Decide on one inbound WebSocket message
+
+        Returns True to process it, False to drop it, and None when the policy
+        says the connection should be closed.
+        """
+        limiters = []
+        if self.connection is not None:
+            limiters.append((self.connection, connection_id))
+        if self.client_id is not None and client_id is not None:
+            limiters.append((self.client_id, client_id))
+        if not limiters:
+            return True
+
+        wait = self._acquire(limiters)
+        if not wait:
+            return True
+        if self.policy is RateLimitPolicy.DISCONNECT:
+            return None
+        if self.policy is RateLimitPolicy.DELAY and wait <= self.max_delay:
+            await asyncio.sleep(wait)
+            return True
+        return False
+
+    async def admit_request(self, caller: str) -> float:
+        """Decide on one REST request; returns 0 to proceed, else the seconds to retry after"""
+        if self.rest is None:
+            return 0.0
+        wait = self._acquire([(self.rest, caller)])
+        if wait and self.policy is RateLimitPolicy.DELAY and wait <= self.max_delay:
+            await asyncio.sleep(wait)
+            return 0.0
+        return wait
+
+    def forget(self, connection_id: str):
+        """Release a closed connection's bucket"""
+        if self.connection is not None:
+            self.connection.forget(connection_id)
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy.value,
+            "max_delay": self.max_delay,
+            "connection": self.connection.get_info() if self.connection is not None else None,
+            "client_id": self.client_id.get_info() if self.client_id is not None else None,
+            "rest": self.rest.get_info() if self.rest is not None else None
+        }
@@ -0,0 +1,225 @@
+"""
+Sharded serving within one process for the WebSocket Broadcast System
+
+With ``SHARDS`` above 1 the server runs K shards, each a uvicorn server with
+its own event loop thread, application, ``ConnectionManager``, writer tasks
+and heartbeat. Every shard listens on the same port (``SO_REUSEPORT`` where
+available, so the kernel spreads new connections across them); a socket
+stays on the shard that accepted it, since asyncio transports belong to one
+loop.
+
+Shards relay broadcasts to each other through a ``ThreadBackplane``: the
+already-encoded frame bytes are handed to each peer loop with
+``call_soon_threadsafe``, one append to the loop's ready queue and a wakeup,
+with no lock taken and nothing re-encoded.
+
+The shards share one message history, so sequence numbers are assigned once,
+by the shard that publishes, and mean the same on every shard a client may
+reconnect to. A relayed frame arrives already stamped and is not recorded
+again. The durable message log cannot be combined with shards. They also
+share one offline inbox, and a private message is relayed only when another
+shard holds its recipient, so it is stored rather than lost otherwise.
+
+Shards share one interpreter, so Python code still runs one thread at a time;
+what runs in parallel is the work that releases the GIL, mainly socket writes
+and permessage-deflate compression. For CPU-bound fan-out across all cores,
+run several worker processes with ``BACKPLANE=local`` instead (or as well).
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import signal
+import socket
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import uvicorn
+# anyio loads its asyncio backend on first use; loading it here keeps shard threads
+# from importing it concurrently, which can leave one with a partially initialized module
+import anyio._backends._asyncio  # noqa: F401
+
+from backplane import Backplane, BackplaneHandler, encode_envelope
+from history import MessageHistory
+from inbox import OfflineInbox
+
+if TYPE_CHECKING:
+    from connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadBackplane(Backplane):
+    """Relays between shards of one process, each running its own event loop"""
+
+    def __init__(self, shards: "ShardSet"):
+        super().__init__()
+        self.shards = shards
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self, handler: BackplaneHandler):
+        await super().start(handler)
+        self.loop = asyncio.get_running_loop()
+        self.shards.attach(self)
+
+    async def stop(self):
+        self.shards.detach(self)
+        await super().stop()
+
+    def has_peers(self) -> bool:
+        return len(self.shards.backplanes) > 1
+
+    async def publish(self, header: Dict[str, Any], payload: bytes):
+        data = encode_envelope(dict(header, origin=self.node_id), payload)
+        peers = self.shards.backplanes
+        if len(peers) < 2:
+            return
+        self.messages_published += 1
+        for peer in peers:
+            if peer is not self:
+                try:
+                    peer.loop.call_soon_threadsafe(peer._deliver, data)
+                except RuntimeError:
+                    # The peer's loop closed while it was shutting down
+                    pass
+
+
+class ShardSet:
+    """The shards of this process: their backplanes and managers, for relaying and aggregate stats
+
+    The tuples are replaced rather than mutated, so other threads can iterate
+    them without a lock. ``history`` and ``inbox``, when set, are the ones
+    every shard uses.
+    """
+
+    def __init__(
+        self,
+        count: int,
+        history: Optional[MessageHistory] = None,
+        inbox: Optional[OfflineInbox] = None
+    ):
+        self.count = count
+        self.history = history
+        self.inbox = inbox
+        self.backplanes: Tuple[ThreadBackplane, ...] = ()
+        self.managers: Tuple[Tuple["ConnectionManager", asyncio.AbstractEventLoop], ...] = ()
+        self._lock = threading.Lock()
+
+    def attach(self, backplane: ThreadBackplane):
+        with self._lock:
+            self.backplanes = self.backplanes + (backplane,)
+
+    def detach(self, backplane: ThreadBackplane):
+        with self._lock:
+            self.backplanes = tuple(peer for peer in self.backplanes if peer is not backplane)
+
+    def register(self, manager: "ConnectionManager"):
+        """Add a shard's manager; call from its own loop"""
+        with self._lock:
+            self.managers = self.managers + ((manager, asyncio.get_running_loop()),)
+
+    def unregister(self, manager: "ConnectionManager"):
+        with self._lock:
+            self.managers = tuple(entry for entry in self.managers if entry[0] is not manager)
+
+    def holds(self, target_id: str, exclude: Optional["ConnectionManager"] = None) -> bool:
+        """Whether a shard other than ``exclude`` has a connection with this connection or client ID
+
+        Reads the other shards' ID indexes directly; a membership test is atomic under the GIL.
+        """
+        return any(
+            target_id in manager.active_connections or target_id in manager.clients_by_id
+            for manager, _ in self.managers
+            if manager is not exclude
+        )
+
+    def active_connections(self) -> int:
+        return sum(len(manager.active_connections) for manager, _ in self.managers)
+
+    async def collect(self, func: Callable[["ConnectionManager"], Any]) -> List[Any]:
+        """Call ``func`` with each shard's manager on that shard's own loop; results in shard order"""
+        current = asyncio.get_running_loop()
+        waiters = []
+        for manager, loop in self.managers:
+            if loop is current:
+                future = current.create_future()
+                future.set_result(func(manager))
+            else:
+                future = asyncio.wrap_future(self._call_in(loop, func, manager))
+            waiters.append(future)
+        return list(await asyncio.gather(*waiters))
+
+    @staticmethod
+    def _call_in(loop: asyncio.AbstractEventLoop, func: Callable, manager: "ConnectionManager") -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def run():
+            try:
+                future.set_result(func(manager))
+            except Exception as e:
+                future.set_exception(e)
+
+        loop.call_soon_threadsafe(run)
+        return future
+
+    async def get_connection_info(self) -> Dict[str, Any]:
+        """Totals across shards plus each shard's own connection info"""
+        shards = await self.collect(lambda manager: manager.get_connection_info())
+        totals = {
+            field: sum(info[field] for info in shards)
+            for field in (
+                "active_connections", "total_connections_created", "total_messages_sent",
+                "total_messages_dropped", "slow_consumers_disconnected", "connections_evicted",
+                "queued_messages"
+            )
+        }
+        return {"shard_count": self.count, **totals, "shards": shards}
+
+
+def _listen_sockets(host: str, port: int, count: int) -> List[socket.socket]:
+    """One listening socket per shard with SO_REUSEPORT, else one socket shared by all"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    sockets = []
+    for _ in range(count if reuse_port else 1):
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        sockets.append(sock)
+    return sockets if reuse_port else sockets * count
+
+
+def serve_sharded(app_factory: Callable[[int], Any], count: int, host: str, port: int, **config: Any):
+    """Run ``count`` shards until interrupted; ``app_factory(index)`` builds each shard's application
+
+    ``config`` is passed to each shard's ``uvicorn.Config``. Call from the main
+    thread: it handles the signals and asks every shard to shut down.
+    """
+    sockets = _listen_sockets(host, port, count)
+    servers = [uvicorn.Server(uvicorn.Config(app_factory(index), **config)) for index in range(count)]
+    # Install the configured loop policy (uvloop, say) for the asyncio.run in every shard thread
+    servers[0].config.setup_event_loop()
+    threads = [
+        threading.Thread(target=asyncio.run, args=(server.serve([sock]),), name=f"shard-{index}")
+        for index, (server, sock) in enumerate(zip(servers, sockets))
+    ]
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+    logger.info(f"Serving {count} shards on {host}:{port}")
+    for thread in threads:
+        thread.start()
+    try:
+        while not stopping.wait(0.2) and all(thread.is_alive() for thread in threads):
+            pass
+    finally:
+        for server in servers:
+            server.should_exit = True
+        for thread in threads:
+            thread.join()
+        for sock in set(sockets):
+            sock.close()
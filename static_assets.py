@@ -0,0 +1,195 @@
+"""
+In-memory static asset serving for the WebSocket Broadcast System
+
+The test page (``TEMPLATES_DIR``) and files under ``STATIC_DIR`` are read once,
+compressed once (gzip, and brotli when the ``brotli`` package is installed)
+and then served from memory with strong ETags, so a repeat visit costs a 304
+and a fresh one costs a dictionary lookup. Files are re-read when their size
+or modification time changes, checked at most every ``check_interval``
+seconds per file.
+
+Relative directories are resolved against the application directory, not the
+current working directory.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Smaller files are not worth a Content-Encoding
+MIN_COMPRESS_BYTES = 256
+
+
+class StaticAsset:
+    """One file's bytes, its precompressed variants and validators"""
+
+    __slots__ = ("path", "content_type", "variants", "mtime_ns", "size", "checked")
+
+    def __init__(self, path: str, data: bytes, mtime_ns: int):
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.content_type in ("application/javascript", "application/json"):
+            # text/* types get their charset from the Response
+            self.content_type += "; charset=utf-8"
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        # Content-Encoding -> (bytes, strong ETag); each representation gets its own ETag
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (data, f'"{digest}"')}
+        if len(data) >= MIN_COMPRESS_BYTES:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                self.variants["gzip"] = (compressed, f'"{digest}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    self.variants["br"] = (compressed, f'"{digest}-br"')
+        self.mtime_ns = mtime_ns
+        self.size = len(data)
+        self.checked = time.monotonic()
+
+    def matches(self, if_none_match: str) -> bool:
+        """Whether an If-None-Match header names any representation of this asset"""
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(etag in tags for _, etag in self.variants.values())
+
+    def select(self, accept_encoding: str) -> str:
+        """The most compact representation the client accepts"""
+        accepted = {
+            part.split(";")[0].strip().lower()
+            for part in accept_encoding.split(",")
+            if not part.replace(" ", "").endswith(";q=0")
+        }
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return "identity"
+
+
+class AssetCache:
+    """Assets loaded from a set of named directories, kept in memory"""
+
+    def __init__(self, directories: Dict[str, str], check_interval: float = 2.0):
+        self.directories = {
+            name: os.path.realpath(os.path.join(APP_DIR, directory))
+            for name, directory in directories.items()
+        }
+        self.check_interval = check_interval
+        self.hits = 0
+        self.not_modified = 0
+        self.loads = 0
+        self._assets: Dict[Tuple[str, str], StaticAsset] = {}
+
+    def preload(self):
+        """Read and compress every file up front, e.g. from the lifespan via a thread"""
+        for name, root in self.directories.items():
+            for directory, _, files in os.walk(root):
+                for filename in files:
+                    relative = os.path.relpath(os.path.join(directory, filename), root)
+                    self._load(name, relative.replace(os.sep, "/"))
+        logger.info(f"Loaded {len(self._assets)} static assets")
+
+    def _resolve(self, name: str, relative: str) -> Optional[str]:
+        """The file's real path, or None if it is missing or outside its directory"""
+        root = self.directories.get(name)
+        if root is None:
+            return None
+        path = os.path.realpath(os.path.join(root, relative))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            return None
+        return path
+
+    def _load(self, name: str, relative: str) -> Optional[StaticAsset]:
+        """(Re)read a file if it is new or changed; blocking, so run off the event loop"""
+        key = (name, relative)
+        path = self._resolve(name, relative)
+        if path is None:
+            self._assets.pop(key, None)
+            return None
+        stat = os.stat(path)
+        asset = self._assets.get(key)
+        if asset is not None and asset.mtime_ns == stat.st_mtime_ns and asset.size == stat.st_size:
+            asset.checked = time.monotonic()
+            return asset
+        with open(path, "rb") as f:
+            asset = self._assets[key] = StaticAsset(path, f.read(), stat.st_mtime_ns)
+        self.loads += 1
+        return asset
+
+    async def get(self, name: str, relative: str) -> Optional[StaticAsset]:
+        """An asset from memory, re-checked against the file at most every ``check_interval``"""
+        asset = self._assets.get((name, relative))
+        if asset is not None and (
+            self.check_interval <= 0 or time.monotonic() - asset.checked < self.check_interval
+        ):
+            return asset
+        return await asyncio.to_thread(self._load, name, relative)
+
+    def respond(self, request: Request, asset: StaticAsset, cache_control: str) -> Response:
+        """A 304 if the client's copy is current, else the best representation it accepts"""
+        self.hits += 1
+        if_none_match = request.headers.get("if-none-match")
+        encoding = asset.select(request.headers.get("accept-encoding", ""))
+        body, etag = asset.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if if_none_match is not None and asset.matches(if_none_match):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=asset.content_type, headers=headers)
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "assets": len(self._assets),
+            "bytes": sum(asset.size for asset in self._assets.values()),
+            "brotli": brotli is not None,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "loads": self.loads
+        }
+
+
+def create_static_routes(assets: AssetCache, max_age: int) -> APIRouter:
+    """Routes for the test page and ``/static/...`` files, served from the asset cache"""
+
+    router = APIRouter()
+
+    @router.get("/")
+    async def get_test_page(request: Request):
+        """
+        Serve the HTML test page
+        """
+        asset = await assets.get("templates", "index.html")
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Test page not found")
+        # Revalidated on every load, which costs a 304 while the page is unchanged
+        return assets.respond(request, asset, "no-cache")
+
+    @router.get("/static/{path:path}")
+    async def get_static_file(path: str, request: Request):
+        """
+        Serve a file from the static directory
+        """
+        asset = await assets.get("static", path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        return assets.respond(request, asset, f"public, max-age={max_age}")
+
+    return router
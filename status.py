@@ -0,0 +1,185 @@
+"""
+Pre-rendered status responses and health probes for the WebSocket Broadcast System
+
+Load balancers and dashboards poll ``/stats``, ``/info`` and ``/health`` far
+more often than their contents change. ``StatusSnapshots`` renders each body
+to JSON bytes once and serves those bytes until the snapshot is ``ttl``
+seconds old, skipping response-model validation and re-serialization. A
+snapshot is re-rendered sooner when the counters it shows change (at most
+every ``MIN_REFRESH_INTERVAL`` seconds), so connection counts stay current.
+
+``/health/live`` answers from a constant body. ``/health/ready`` reports 503
+until the lifespan has started, once shutdown begins, and while the event
+loop lags behind by more than ``max_loop_lag`` seconds, as measured by a
+probe task that sleeps for a fixed interval and records how late it woke.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from connection_manager import ConnectionManager
+from frames import dumps
+
+logger = logging.getLogger(__name__)
+
+# Counter changes re-render a snapshot no more often than this (seconds)
+MIN_REFRESH_INTERVAL = 0.05
+
+Renderer = Callable[[], Union[Dict[str, Any], Awaitable[Dict[str, Any]]]]
+
+
+class LoopLagProbe:
+    """Measures how late the event loop runs a timer, a direct sign of blocking work"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._due: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._due = None
+
+    async def _run(self):
+        while True:
+            self._due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self._record(max(0.0, time.monotonic() - self._due))
+
+    def _record(self, lag: float):
+        self.lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def current(self) -> float:
+        """The last measured lag, or how overdue the probe is now if that is worse"""
+        if self._due is None:
+            return self.lag
+        return max(self.lag, time.monotonic() - self._due)
+
+
+class StatusSnapshots:
+    """JSON bodies for the status endpoints, rendered once and served as bytes"""
+
+    def __init__(
+        self,
+        manager: ConnectionManager,
+        ttl: float = 1.0,
+        lag_probe: Optional[LoopLagProbe] = None,
+        max_loop_lag: float = 0.5
+    ):
+        self.manager = manager
+        self.ttl = ttl
+        self.lag_probe = lag_probe or LoopLagProbe()
+        self.max_loop_lag = max_loop_lag
+        self.ready = False
+        self.stopping = False
+        self.renders = 0
+        self.hits = 0
+        # name -> (body, rendered at, counters key)
+        self._snapshots: Dict[str, Tuple[bytes, float, Hashable]] = {}
+        self._renderers: Dict[str, Renderer] = {
+            "stats": self._render_stats,
+            "info": self._render_info,
+            "health": self._render_health
+        }
+
+    def start(self):
+        """Start the lag probe and report ready; call from the lifespan once serving can begin"""
+        self.lag_probe.start()
+        self.ready = True
+
+    async def stop(self):
+        """Report not ready first, so load balancers stop routing here while connections drain"""
+        self.ready = False
+        self.stopping = True
+        await self.lag_probe.stop()
+
+    def _counters(self) -> Hashable:
+        """What the snapshots show that should not wait out the TTL when it changes"""
+        manager = self.manager
+        if manager.shards is not None:
+            return tuple((len(m.active_connections), m.connection_count) for m, _ in manager.shards.managers)
+        return (len(manager.active_connections), manager.connection_count)
+
+    async def get(self, name: str) -> bytes:
+        """A snapshot's body, re-rendered when it is older than the TTL or its counters moved"""
+        now = time.monotonic()
+        snapshot = self._snapshots.get(name)
+        if snapshot is not None:
+            body, rendered, counters = snapshot
+            age = now - rendered
+            if age < self.ttl and (age < MIN_REFRESH_INTERVAL or counters == self._counters()):
+                self.hits += 1
+                return body
+        counters = self._counters()
+        result = self._renderers[name]()
+        if not isinstance(result, dict):
+            result = await result
+        body = dumps(result)
+        self.renders += 1
+        if self.ttl > 0:
+            self._snapshots[name] = (body, now, counters)
+        return body
+
+    def _render_stats(self) -> Dict[str, Any]:
+        return self.manager.get_stats().model_dump()
+
+    def _render_info(self) -> Union[Dict[str, Any], Awaitable[Dict[str, Any]]]:
+        if self.manager.shards is not None:
+            return self.manager.shards.get_connection_info()
+        return self.manager.get_connection_info()
+
+    def _render_health(self) -> Dict[str, Any]:
+        manager = self.manager
+        return {
+            "status": "healthy",
+            "timestamp": datetime.now().isoformat(),
+            "active_connections": (
+                manager.shards.active_connections() if manager.shards is not None
+                else len(manager.active_connections)
+            ),
+            "server_info": {
+                "name": "WebSocket Broadcast System",
+                "version": "1.0.0"
+            }
+        }
+
+    def readiness(self) -> Tuple[bool, bytes]:
+        """Whether to take traffic, and the body explaining why"""
+        lag = self.lag_probe.current()
+        if not self.ready:
+            reason = "shutting down" if self.stopping else "starting"
+        elif lag > self.max_loop_lag:
+            reason = "event loop lagging"
+        else:
+            reason = None
+        return reason is None, dumps({
+            "status": "ready" if reason is None else "not_ready",
+            "reason": reason,
+            "loop_lag_ms": round(lag * 1000, 3)
+        })
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "ttl": self.ttl,
+            "renders": self.renders,
+            "hits": self.hits,
+            "ready": self.ready,
+            "loop_lag_ms": round(self.lag_probe.current() * 1000, 3),
+            "max_loop_lag_ms": round(self.lag_probe.max_lag * 1000, 3)
+        }
@@ -0,0 +1,45 @@
+"""
+Batch broadcast endpoint tests
+"""
+
+import json
+
+from fastapi.testclient import TestClient
+
+import api_routes
+from config import Settings
+from main import create_app
+
+
+def test_ndjson_batch_reports_the_last_sequence_number():
+    with TestClient(create_app()) as client:
+        lines = [json.dumps({"message": f"message {index}"}) for index in range(3)]
+        response = client.post("/broadcast/batch/ndjson", content="\n".join(lines) + "\n")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["messages_accepted"] == 3
+        assert body["seq"] == 3
+        assert client.get("/history").json()["last_seq"] == 3
+
+
+def test_ndjson_batch_reports_invalid_lines():
+    with TestClient(create_app()) as client:
+        response = client.post("/broadcast/batch/ndjson", content=b'{"message": "ok"}\n{"sender": "x"}\n')
+        body = response.json()
+        assert body["messages_accepted"] == 1
+        assert body["messages_rejected"] == 1
+        assert body["errors"][0]["line"] == 2
+
+
+def test_ndjson_batch_over_the_limit_reports_what_was_sent(monkeypatch):
+    monkeypatch.setattr(api_routes, "settings", Settings(MAX_BATCH_MESSAGES=2))
+    with TestClient(create_app()) as client:
+        lines = [json.dumps({"message": f"message {index}"}) for index in range(4)]
+        response = client.post("/broadcast/batch/ndjson", content="\n".join(lines))
+        assert response.status_code == 413
+        body = response.json()
+        assert body["status"] == "error"
+        assert body["messages_accepted"] == 2
+        assert body["seq"] == 2
+        assert "line 3" in body["detail"]
+        assert client.get("/history").json()["last_seq"] == 2
@@ -0,0 +1,94 @@
+"""
+Resume ordering tests: replayed history must arrive before live broadcasts
+"""
+
+import asyncio
+import json
+import time
+from typing import List
+
+from connection_manager import ConnectionManager
+from message_log import MessageLog
+
+
+class FakeWebSocket:
+    """Records what the writer task sends"""
+
+    def __init__(self):
+        self.sent: List[dict] = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class SlowLog(MessageLog):
+    """A message log whose reads take long enough for a broadcast to happen meanwhile"""
+
+    def read(self, since: int, until: int):
+        time.sleep(0.2)
+        return super().read(since, until)
+
+
+def make_manager(tmp_path) -> ConnectionManager:
+    log = SlowLog(str(tmp_path), segment_bytes=1 << 20, retention_bytes=1 << 30, fsync="never", flush_interval_ms=1)
+    return ConnectionManager(history_size=2, message_log=log, inbox_max_messages=0)
+
+
+async def wait_for_sent(websocket: FakeWebSocket, count: int):
+    for _ in range(500):
+        if len(websocket.sent) >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Only {len(websocket.sent)} of {count} frames were sent")
+
+
+def test_broadcast_during_log_replay_arrives_after_it(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        await manager.start()
+        for index in range(6):
+            await manager.broadcast({"message": str(index), "message_type": "broadcast"})
+        # Let the group commit write the records so the log can serve them
+        await asyncio.sleep(0.05)
+
+        websocket = FakeWebSocket()
+        connecting = asyncio.create_task(manager.connect(websocket, since=0))
+        await asyncio.sleep(0.05)
+        await manager.broadcast({"message": "live", "message_type": "broadcast"})
+        await connecting
+        await wait_for_sent(websocket, 8)
+        await manager.stop()
+        return websocket.sent
+
+    sent = asyncio.run(scenario())
+    assert sent[0]["message_type"] == "welcome"
+    assert [message["seq"] for message in sent[1:]] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_broadcast_during_channel_replay_arrives_after_it(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        await manager.start()
+        websocket = FakeWebSocket()
+        client = await manager.connect(websocket)
+        for index in range(6):
+            await manager.publish("room", {"message": str(index), "message_type": "broadcast"})
+        await asyncio.sleep(0.05)
+
+        manager.subscribe(client, "room")
+        replaying = asyncio.create_task(manager.replay(client, 0, "room"))
+        await asyncio.sleep(0.05)
+        await manager.publish("room", {"message": "live", "message_type": "broadcast"})
+        await replaying
+        await wait_for_sent(websocket, 8)
+        await manager.stop()
+        return websocket.sent
+
+    sent = asyncio.run(scenario())
+    assert [message["seq"] for message in sent[1:]] == [1, 2, 3, 4, 5, 6, 7]
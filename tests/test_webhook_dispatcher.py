@@ -0,0 +1,204 @@
+"""
+Webhook delivery tests against a local stand-in HTTP server
+"""
+
+import asyncio
+import json
+from typing import List
+
+import pytest
+
+from webhook_dispatcher import WebhookDispatcher
+from webhook_events import CLIENT_CONNECTED, MESSAGE_BROADCAST
+
+
+class StandInServer:
+    """A minimal keep-alive HTTP/1.1 server that records request bodies
+
+    Responses use the scripted status codes in order, then 200.
+    """
+
+    def __init__(self, statuses: List[int] = ()):
+        self.statuses = list(statuses)
+        self.bodies: List[bytes] = []
+        self.responses: List[int] = []
+        self._server = None
+
+    async def __aenter__(self) -> "StandInServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/hook"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n")[1:]:
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                self.bodies.append(await reader.readexactly(length))
+                status = self.statuses.pop(0) if self.statuses else 200
+                self.responses.append(status)
+                writer.write(b"HTTP/1.1 %d Status\r\nContent-Length: 0\r\n\r\n" % status)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_dispatcher(**overrides) -> WebhookDispatcher:
+    options = dict(
+        queue_size=100,
+        batch_window_ms=50,
+        max_retries=3,
+        retry_backoff=0.01,
+        timeout=2.0,
+        max_connections=4
+    )
+    options.update(overrides)
+    return WebhookDispatcher(**options)
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Timed out waiting for webhook delivery")
+        await asyncio.sleep(0.01)
+
+
+def test_single_events_are_posted_in_order():
+    async def scenario():
+        async with StandInServer() as server:
+            dispatcher = make_dispatcher()
+            subscriber = dispatcher.subscribe(server.url, [MESSAGE_BROADCAST])
+            await dispatcher.start()
+            for index in range(3):
+                dispatcher.emit(MESSAGE_BROADCAST, {"message": index})
+            # Not subscribed, so never queued
+            dispatcher.emit(CLIENT_CONNECTED, {"message": "ignored"})
+            await wait_until(lambda: subscriber.delivered == 3)
+            await dispatcher.stop()
+        return server, subscriber
+
+    server, subscriber = asyncio.run(scenario())
+    assert [json.loads(body) for body in server.bodies] == [{"message": 0}, {"message": 1}, {"message": 2}]
+    assert subscriber.failed == 0
+
+
+def test_events_within_the_window_are_batched():
+    async def scenario():
+        async with StandInServer() as server:
+            dispatcher = make_dispatcher(batch_window_ms=100)
+            subscriber = dispatcher.subscribe(server.url, [MESSAGE_BROADCAST], batch_size=10)
+            await dispatcher.start()
+            for index in range(5):
+                dispatcher.emit(MESSAGE_BROADCAST, {"message": index})
+            await wait_until(lambda: subscriber.delivered == 5)
+            await dispatcher.stop()
+        return server
+
+    server = asyncio.run(scenario())
+    assert len(server.bodies) == 1
+    assert json.loads(server.bodies[0]) == [{"message": index} for index in range(5)]
+
+
+def test_full_batches_are_split():
+    async def scenario():
+        async with StandInServer() as server:
+            dispatcher = make_dispatcher()
+            subscriber = dispatcher.subscribe(server.url, [MESSAGE_BROADCAST], batch_size=2)
+            await dispatcher.start()
+            for index in range(4):
+                dispatcher.emit(MESSAGE_BROADCAST, {"message": index})
+            await wait_until(lambda: subscriber.delivered == 4)
+            await dispatcher.stop()
+        return server
+
+    server = asyncio.run(scenario())
+    assert [len(json.loads(body)) for body in server.bodies] == [2, 2]
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_retryable_statuses_are_retried_with_backoff(status):
+    async def scenario():
+        async with StandInServer([status, status]) as server:
+            dispatcher = make_dispatcher()
+            subscriber = dispatcher.subscribe(server.url, [MESSAGE_BROADCAST])
+            await dispatcher.start()
+            dispatcher.emit(MESSAGE_BROADCAST, {"message": "retry me"})
+            await wait_until(lambda: subscriber.delivered == 1)
+            await dispatcher.stop()
+        return server, subscriber
+
+    server, subscriber = asyncio.run(scenario())
+    assert server.responses == [status, status, 200]
+    assert subscriber.retries == 2
+    assert subscriber.failed == 0
+    assert subscriber.last_error == f"HTTP {status}"
+
+
+def test_retries_give_up_after_max_retries():
+    async def scenario():
+        async with StandInServer([500] * 10) as server:
+            dispatcher = make_dispatcher(max_retries=2)
+            subscriber = dispatcher.subscribe(server.url, [MESSAGE_BROADCAST])
+            await dispatcher.start()
+            dispatcher.emit(MESSAGE_BROADCAST, {"message": "lost"})
+            await wait_until(lambda: subscriber.failed == 1)
+            await dispatcher.stop()
+        return server, subscriber
+
+    server, subscriber = asyncio.run(scenario())
+    assert len(server.bodies) == 3
+    assert subscriber.retries == 2
+    assert subscriber.delivered == 0
+
+
+@pytest.mark.parametrize("status", [400, 404, 410])
+def test_client_errors_are_not_retried(status):
+    async def scenario():
+        async with StandInServer([status]) as server:
+            dispatcher = make_dispatcher()
+            subscriber = dispatcher.subscribe(server.url, [MESSAGE_BROADCAST])
+            await dispatcher.start()
+            dispatcher.emit(MESSAGE_BROADCAST, {"message": "rejected"})
+            dispatcher.emit(MESSAGE_BROADCAST, {"message": "accepted"})
+            await wait_until(lambda: subscriber.failed == 1 and subscriber.delivered == 1)
+            await dispatcher.stop()
+        return server, subscriber
+
+    server, subscriber = asyncio.run(scenario())
+    assert server.responses == [status, 200]
+    assert subscriber.retries == 0
+    assert subscriber.last_error == f"HTTP {status}"
+
+
+def test_invalid_url_does_not_stop_delivery():
+    async def scenario():
+        dispatcher = make_dispatcher()
+        subscriber = dispatcher.subscribe("http://[::1", [MESSAGE_BROADCAST])
+        await dispatcher.start()
+        dispatcher.emit(MESSAGE_BROADCAST, {"message": 1})
+        dispatcher.emit(MESSAGE_BROADCAST, {"message": 2})
+        await wait_until(lambda: subscriber.failed == 2)
+        alive = not subscriber.task.done()
+        await dispatcher.stop()
+        return subscriber, alive
+
+    subscriber, alive = asyncio.run(scenario())
+    assert alive
+    assert subscriber.retries == 0
+    assert subscriber.last_error.startswith("InvalidURL")
+    assert not subscriber.pending
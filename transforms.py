@@ -0,0 +1,193 @@
+"""
+Pluggable message transform stages for the WebSocket Broadcast System
+
+Transforms (content filtering, enrichment, per-channel formatting) run on a
+message payload before it is encoded and fanned out. A stage is a function
+``(payload, channel) -> payload or None``; returning None drops the message.
+
+Each stage declares where it runs: ``inline`` on the event loop (for cheap
+work), in a ``thread`` pool (for work that releases the GIL or blocks on I/O)
+or in a ``process`` pool (for CPU-bound Python). Pooled stages are bounded by
+``max_pending`` jobs in flight, so a burst waits at the stage instead of piling
+up in the executor, and the event loop stays free for socket I/O meanwhile.
+"""
+
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from metrics import TRANSFORM_DURATION, TRANSFORM_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+Payload = Dict[str, Any]
+TransformFunc = Callable[[Payload, Optional[str]], Optional[Payload]]
+
+
+class ExecutionMode(str, Enum):
+    """Where a transform stage runs"""
+    INLINE = "inline"
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class TransformStage:
+    """One named transform, optionally limited to some channels
+
+    ``channels`` of None applies the stage to every message; otherwise only to
+    messages published to one of those channels (``None`` in the set matches
+    messages sent to everyone). Functions for ``process`` stages must be
+    importable module-level functions, and payloads must be picklable.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: TransformFunc,
+        mode: ExecutionMode = ExecutionMode.INLINE,
+        channels: Optional[Sequence[Optional[str]]] = None
+    ):
+        self.name = name
+        self.func = func
+        self.mode = ExecutionMode(mode)
+        self.channels = frozenset(channels) if channels is not None else None
+        self.passed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def applies_to(self, channel: Optional[str]) -> bool:
+        return self.channels is None or channel in self.channels
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "mode": self.mode.value,
+            "channels": sorted(self.channels, key=str) if self.channels is not None else None,
+            "passed": self.passed,
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
+
+
+class TransformPipeline:
+    """Runs a message payload through the configured stages in order
+
+    A stage that raises drops the message (and is counted as an error), so a
+    failing filter never lets unfiltered content through.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[TransformStage] = (),
+        thread_workers: int = 4,
+        process_workers: Optional[int] = None,
+        max_pending: int = 256
+    ):
+        self.stages: List[TransformStage] = list(stages)
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.max_pending = max(1, max_pending)
+        self._executors: Dict[ExecutionMode, Executor] = {}
+        self._pending: Optional[asyncio.Semaphore] = None
+
+    def add_stage(self, stage: TransformStage):
+        """Append a stage; pools are created on first use if the pipeline is already running"""
+        self.stages.append(stage)
+
+    def __bool__(self) -> bool:
+        return bool(self.stages)
+
+    def start(self):
+        """Create the pools the stages need; process workers start now rather than on the first message"""
+        self._pending = asyncio.Semaphore(self.max_pending)
+        for stage in self.stages:
+            self._executor(stage.mode)
+
+    async def stop(self):
+        """Shut the pools down, waiting for running transforms to finish"""
+        executors = list(self._executors.values())
+        self._executors.clear()
+        for executor in executors:
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    def _executor(self, mode: ExecutionMode) -> Optional[Executor]:
+        if mode is ExecutionMode.INLINE:
+            return None
+        executor = self._executors.get(mode)
+        if executor is None:
+            if mode is ExecutionMode.THREAD:
+                executor = ThreadPoolExecutor(self.thread_workers, thread_name_prefix="transform")
+            else:
+                # spawn: forking a process that runs an event loop and threads is unsafe
+                executor = ProcessPoolExecutor(self.process_workers, mp_context=multiprocessing.get_context("spawn"))
+            self._executors[mode] = executor
+        return executor
+
+    async def apply(self, payload: Payload, channel: Optional[str] = None) -> Optional[Payload]:
+        """Run a payload through every applicable stage; None if a stage dropped it"""
+        for stage in self.stages:
+            if not stage.applies_to(channel):
+                continue
+            started = time.perf_counter()
+            try:
+                if stage.mode is ExecutionMode.INLINE:
+                    payload = stage.func(payload, channel)
+                else:
+                    payload = await self._run_pooled(stage, payload, channel)
+            except Exception as e:
+                stage.errors += 1
+                TRANSFORM_MESSAGES.labels(stage.name, "error").inc()
+                logger.error(f"Transform stage '{stage.name}' failed, message dropped: {e}")
+                return None
+            finally:
+                TRANSFORM_DURATION.observe(time.perf_counter() - started)
+            if payload is None:
+                stage.dropped += 1
+                TRANSFORM_MESSAGES.labels(stage.name, "dropped").inc()
+                return None
+            stage.passed += 1
+            TRANSFORM_MESSAGES.labels(stage.name, "passed").inc()
+        return payload
+
+    async def _run_pooled(self, stage: TransformStage, payload: Payload, channel: Optional[str]) -> Optional[Payload]:
+        if self._pending is None:
+            self._pending = asyncio.Semaphore(self.max_pending)
+        async with self._pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor(stage.mode), stage.func, payload, channel)
+
+    async def apply_many(self, payloads: Sequence[Payload], channel: Optional[str] = None) -> List[Optional[Payload]]:
+        """Transform many payloads concurrently, up to ``max_pending`` at once; results keep input order"""
+        if not any(stage.applies_to(channel) for stage in self.stages):
+            return list(payloads)
+        return await asyncio.gather(*(self.apply(payload, channel) for payload in payloads))
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "stages": [stage.describe() for stage in self.stages],
+            "thread_workers": self.thread_workers,
+            "process_workers": self.process_workers,
+            "max_pending": self.max_pending
+        }
+
+
+def load_stages(spec: str) -> List[TransformStage]:
+    """Build stages from ``module:function[@mode]`` entries separated by commas
+
+    For example ``filters:profanity@inline,enrich:geoip@thread``; the mode
+    defaults to ``inline``.
+    """
+    stages = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        target, _, mode = entry.partition("@")
+        module_name, _, func_name = target.partition(":")
+        if not module_name or not func_name:
+            raise ValueError(f"Invalid transform stage '{entry}', expected module:function[@mode]")
+        func = getattr(importlib.import_module(module_name), func_name)
+        stages.append(TransformStage(target, func, ExecutionMode(mode or ExecutionMode.INLINE)))
+    return stages
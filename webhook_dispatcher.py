@@ -0,0 +1,270 @@
+"""
+Asynchronous outbound webhook delivery for the WebSocket Broadcast System
+
+Events are handed to ``WebhookDispatcher.emit``, which only appends to a bounded
+queue and returns immediately, so delivery never blocks the broadcast path. A
+dispatcher task routes queued events to per-subscriber delivery tasks, which
+batch them, POST them over a shared keep-alive connection pool and retry
+failures with exponential backoff. The pool, and httpx itself, are only loaded
+once there is a subscriber, which keeps them out of a cold start.
+"""
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from frames import dumps
+from webhook_events import BROADCAST_STATS, WEBHOOK_EVENTS, notification
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookSubscriber:
+    """One registered URL, with its own pending batch and delivery task"""
+
+    def __init__(self, url: str, events: List[str], batch_size: int, max_pending: int):
+        self.subscription_id = uuid.uuid4().hex
+        self.url = url
+        self.events = set(events)
+        self.batch_size = max(1, batch_size)
+        self.pending: Deque[Dict[str, Any]] = deque(maxlen=max_pending)
+        self.in_flight = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.retries = 0
+        self.last_error: Optional[str] = None
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "subscription_id": self.subscription_id,
+            "url": self.url,
+            "events": sorted(self.events),
+            "batch_size": self.batch_size,
+            "pending": len(self.pending),
+            "in_flight": self.in_flight,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "last_error": self.last_error
+        }
+
+
+class WebhookDispatcher:
+    """Delivers webhook events to registered subscribers"""
+
+    def __init__(
+        self,
+        queue_size: int,
+        batch_window_ms: float,
+        max_retries: int,
+        retry_backoff: float,
+        timeout: float,
+        max_connections: int,
+        stats_interval: float = 0,
+        stats_source: Optional[Callable[[], Dict[str, Any]]] = None
+    ):
+        self.queue_size = queue_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.stats_interval = stats_interval
+        self.stats_source = stats_source
+
+        self.subscribers: Dict[str, WebhookSubscriber] = {}
+        # event name -> subscribers, so emit() is a dict lookup when nobody listens
+        self._by_event: Dict[str, List[WebhookSubscriber]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._started = False
+        self._tasks: List[asyncio.Task] = []
+        self.events_emitted = 0
+        self.events_dropped = 0
+
+    # Registration
+
+    def subscribe(self, url: str, events: List[str], batch_size: int = 1) -> WebhookSubscriber:
+        unknown = set(events) - set(WEBHOOK_EVENTS)
+        if unknown:
+            raise ValueError(f"Unknown webhook events: {', '.join(sorted(unknown))}")
+        subscriber = WebhookSubscriber(url, events, batch_size, max_pending=self.queue_size)
+        self.subscribers[subscriber.subscription_id] = subscriber
+        self._rebuild_index()
+        if self._started:
+            self._open_client()
+            subscriber.task = asyncio.create_task(self._deliver_loop(subscriber))
+        logger.info(f"Webhook subscriber {subscriber.url} registered for {', '.join(sorted(subscriber.events))}")
+        return subscriber
+
+    def unsubscribe(self, subscription_id: str) -> bool:
+        subscriber = self.subscribers.pop(subscription_id, None)
+        if subscriber is None:
+            return False
+        self._rebuild_index()
+        if subscriber.task is not None:
+            subscriber.task.cancel()
+        return True
+
+    def _rebuild_index(self):
+        index: Dict[str, List[WebhookSubscriber]] = {}
+        for subscriber in self.subscribers.values():
+            for event in subscriber.events:
+                index.setdefault(event, []).append(subscriber)
+        self._by_event = index
+
+    def has_subscribers(self, event: str) -> bool:
+        """Cheap check so callers can skip building payloads nobody will receive"""
+        return event in self._by_event
+
+    # Producer side
+
+    def emit(self, event: str, body: Dict[str, Any]):
+        """Queue an event for delivery without blocking; drops it if the queue is full"""
+        if event not in self._by_event or self._queue is None:
+            return
+        try:
+            self._queue.put_nowait((event, body))
+            self.events_emitted += 1
+        except asyncio.QueueFull:
+            self.events_dropped += 1
+
+    # Lifecycle
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._started = True
+        if self.subscribers:
+            self._open_client()
+        self._tasks.append(asyncio.create_task(self._dispatch_loop()))
+        if self.stats_interval > 0 and self.stats_source is not None:
+            self._tasks.append(asyncio.create_task(self._stats_loop()))
+        for subscriber in self.subscribers.values():
+            subscriber.task = asyncio.create_task(self._deliver_loop(subscriber))
+
+    def _open_client(self):
+        """Create the shared connection pool on first need"""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            )
+
+    async def stop(self, drain_timeout: float = 2.0):
+        """Give pending deliveries a moment to finish, then shut down"""
+        deadline = time.monotonic() + drain_timeout
+        while time.monotonic() < deadline and (
+            (self._queue is not None and not self._queue.empty())
+            or any(s.pending or s.in_flight for s in self.subscribers.values())
+        ):
+            await asyncio.sleep(0.05)
+
+        tasks = self._tasks + [s.task for s in self.subscribers.values() if s.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        for subscriber in self.subscribers.values():
+            subscriber.task = None
+        self._started = False
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Delivery
+
+    async def _dispatch_loop(self):
+        """Route queued events to each interested subscriber's pending batch"""
+        while True:
+            event, body = await self._queue.get()
+            for subscriber in self._by_event.get(event, ()):
+                if len(subscriber.pending) == subscriber.pending.maxlen:
+                    subscriber.dropped += 1
+                subscriber.pending.append(body)
+                subscriber.wakeup.set()
+
+    async def _deliver_loop(self, subscriber: WebhookSubscriber):
+        """Send one batch at a time per subscriber, preserving event order"""
+        while True:
+            if not subscriber.pending:
+                subscriber.wakeup.clear()
+                await subscriber.wakeup.wait()
+            if subscriber.batch_size > 1 and len(subscriber.pending) < subscriber.batch_size:
+                # Give the batch a short window to fill up
+                await asyncio.sleep(self.batch_window)
+            batch = [subscriber.pending.popleft() for _ in range(min(subscriber.batch_size, len(subscriber.pending)))]
+            if not batch:
+                continue
+            subscriber.in_flight = len(batch)
+            try:
+                body = dumps(batch if subscriber.batch_size > 1 else batch[0])
+                if await self._post_with_retries(subscriber, body):
+                    subscriber.delivered += len(batch)
+                else:
+                    subscriber.failed += len(batch)
+            except Exception as e:
+                # Whatever goes wrong with one batch, the subscriber keeps receiving later events
+                subscriber.failed += len(batch)
+                subscriber.last_error = f"{type(e).__name__}: {e}"
+                logger.error(f"Webhook delivery to {subscriber.url} failed: {subscriber.last_error}")
+            finally:
+                subscriber.in_flight = 0
+
+    async def _post_with_retries(self, subscriber: WebhookSubscriber, body: bytes) -> bool:
+        for attempt in range(self.max_retries + 1):
+            retryable, error = await self._post(subscriber.url, body)
+            if error is None:
+                return True
+            subscriber.last_error = error
+            if not retryable or attempt == self.max_retries:
+                break
+            subscriber.retries += 1
+            # Exponential backoff with jitter so failing endpoints are not hammered in lockstep
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt) * (0.5 + random.random()))
+        logger.warning(f"Webhook delivery to {subscriber.url} failed: {subscriber.last_error}")
+        return False
+
+    async def _post(self, url: str, body: bytes) -> Tuple[bool, Optional[str]]:
+        """POST a body; returns (retryable, error) with error None on success"""
+        import httpx
+        try:
+            response = await self._client.post(url, content=body, headers={"Content-Type": "application/json"})
+        except httpx.InvalidURL as e:
+            # Not an HTTPError subclass, and retrying cannot fix the URL
+            return False, f"{type(e).__name__}: {e}"
+        except httpx.HTTPError as e:
+            return True, f"{type(e).__name__}: {e}"
+        if response.status_code < 300:
+            return False, None
+        retryable = response.status_code == 429 or response.status_code >= 500
+        return retryable, f"HTTP {response.status_code}"
+
+    async def _stats_loop(self):
+        """Emit ``broadcast-stats`` periodically"""
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            if self.has_subscribers(BROADCAST_STATS):
+                try:
+                    self.emit(BROADCAST_STATS, notification("stats_update", self.stats_source()))
+                except Exception as e:
+                    logger.error(f"Error collecting webhook stats: {e}")
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "queued_events": self._queue.qsize() if self._queue is not None else 0,
+            "events_emitted": self.events_emitted,
+            "events_dropped": self.events_dropped
+        }
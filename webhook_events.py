@@ -0,0 +1,22 @@
+"""
+Webhook event names and notification bodies for the WebSocket Broadcast System
+
+Kept apart from the delivery engine so the connection manager can name events
+without importing ``webhook_dispatcher`` when webhooks are disabled.
+"""
+
+from datetime import datetime
+from typing import Any, Dict
+
+# Event names, as declared in the OpenAPI webhooks (see webhooks.py)
+MESSAGE_BROADCAST = "message-broadcast"
+CLIENT_CONNECTED = "client-connected"
+CLIENT_DISCONNECTED = "client-disconnected"
+SERVER_STATUS = "server-status"
+BROADCAST_STATS = "broadcast-stats"
+WEBHOOK_EVENTS = (MESSAGE_BROADCAST, CLIENT_CONNECTED, CLIENT_DISCONNECTED, SERVER_STATUS, BROADCAST_STATS)
+
+
+def notification(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """A ``WebhookNotification`` body"""
+    return {"event_type": event_type, "data": data, "timestamp": datetime.now()}
@@ -2,9 +2,12 @@
 Webhook Definitions for the WebSocket Broadcast System
 """
 
-from fastapi import FastAPI
+from typing import Any, Dict, List
 
-from models import BroadcastMessage, WebhookNotification
+from fastapi import APIRouter, FastAPI, HTTPException
+
+from models import BroadcastMessage, WebhookNotification, WebhookSubscriptionRequest
+from webhook_dispatcher import WebhookDispatcher
 
 
 def setup_webhooks(app: FastAPI):
@@ -69,4 +72,41 @@ def setup_webhooks(app: FastAPI):
         - data: {"active_connections": int, "total_messages": int, "uptime": int}
         - timestamp: ISO format datetime
         """
-        pass
\ No newline at end of file
+        pass
+
+
+def create_webhook_routes(dispatcher: WebhookDispatcher, allow_registration: bool = False) -> APIRouter:
+    """Create the webhook subscriber routes
+
+    Listing is always available. Registering and removing subscribers at
+    runtime makes the server POST to caller-chosen URLs, so those routes are
+    only added with ``allow_registration``.
+    """
+
+    router = APIRouter(prefix="/webhooks")
+
+    @router.get("/subscriptions", response_model=List[Dict[str, Any]])
+    async def list_subscribers():
+        """List registered subscribers with their delivery counters"""
+        return [subscriber.describe() for subscriber in dispatcher.subscribers.values()]
+
+    if not allow_registration:
+        return router
+
+    @router.post("/subscriptions", response_model=Dict[str, Any], status_code=201)
+    async def register_subscriber(request: WebhookSubscriptionRequest):
+        """Register a URL to receive the given webhook events"""
+        try:
+            subscriber = dispatcher.subscribe(str(request.url), request.events, request.batch_size)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return subscriber.describe()
+
+    @router.delete("/subscriptions/{subscription_id}", response_model=Dict[str, Any])
+    async def remove_subscriber(subscription_id: str):
+        """Stop delivering events to a subscriber"""
+        if not dispatcher.unsubscribe(subscription_id):
+            raise HTTPException(status_code=404, detail="Subscription not found")
+        return {"status": "success", "subscription_id": subscription_id}
+
+    return router
@@ -2,113 +2,273 @@
 WebSocket Routes for the WebSocket Broadcast System
 """
 
-import json
 import logging
-from datetime import datetime
+from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from client_connection import ClientConnection
+from config import settings
 from connection_manager import ConnectionManager
+from frames import JSON, Frame, tick_now
+from inbound import parse_inbound
+from metrics import INBOUND_MESSAGES, OVERSIZED_MESSAGES
+from models import InboundMessage
 
 logger = logging.getLogger(__name__)
 
+Payload = Dict[str, Any]
+
+# Inbound message types counted individually in metrics; anything else is "other"
+KNOWN_MESSAGE_TYPES = frozenset({
+    "broadcast", "chat", "ping", "pong", "subscribe", "unsubscribe", "private", "api_broadcast"
+})
+
 
 def create_websocket_routes(manager: ConnectionManager) -> APIRouter:
     """Create WebSocket routes with the connection manager dependency"""
     
     router = APIRouter()
 
+    async def admit(client: ClientConnection, data: str) -> bool:
+        """Cheap checks on one inbound message, run before it is parsed
+
+        The server also caps frame size in the protocol layer (``ws_max_size``);
+        this catches oversized messages when it runs with another configuration.
+        """
+        if client.closed:
+            return False
+        limit = settings.MAX_MESSAGE_SIZE
+        # The limit is in bytes and a character takes 1 to 4 in UTF-8, so only encode when the length is ambiguous
+        if len(data) > limit or (len(data) * 4 > limit and len(data.encode("utf-8")) > limit):
+            OVERSIZED_MESSAGES.inc()
+            logger.warning(f"Closing connection {client.connection_id}: message over {settings.MAX_MESSAGE_SIZE} bytes")
+            manager.evict([client], reason="message too big", code=1009)
+            return False
+        if manager.rate_limits is None:
+            return True
+        decision = await manager.rate_limits.admit_message(client.connection_id, client.client_id)
+        if decision is None:
+            logger.warning(f"Disconnecting connection {client.connection_id} for exceeding the rate limit")
+            manager.evict([client], reason="rate limit exceeded", code=1008)
+            return False
+        return decision
+
     @router.websocket("/ws")
-    async def websocket_endpoint(websocket: WebSocket):
-        """Main WebSocket endpoint for client connections"""
-        await manager.connect(websocket)
+    async def websocket_endpoint(websocket: WebSocket, encoding: str = JSON, since: Optional[int] = None):
+        """Main WebSocket endpoint for client connections
+
+        Pass ``?encoding=msgpack`` to receive binary MessagePack frames instead of JSON text,
+        and ``?since=<seq>`` to first receive the broadcasts missed after that sequence number.
+        """
+        client = await manager.connect(websocket, encoding=encoding, since=since)
+        if client is None:
+            return
         try:
             while True:
                 # Listen for messages from the client
                 data = await websocket.receive_text()
-                await handle_websocket_message(data, manager)
+                client.touch()
+                if await admit(client, data):
+                    await handle_websocket_message(data, manager, client=client)
                     
         except WebSocketDisconnect:
-            manager.disconnect(websocket)
+            manager.disconnect(client)
         except Exception as e:
             logger.error(f"WebSocket error: {e}")
-            manager.disconnect(websocket)
+            manager.disconnect(client)
 
     @router.websocket("/ws/{client_id}")
-    async def websocket_endpoint_with_id(websocket: WebSocket, client_id: str):
-        """WebSocket endpoint with client ID for identification"""
-        await manager.connect(websocket)
+    async def websocket_endpoint_with_id(
+        websocket: WebSocket,
+        client_id: str,
+        encoding: str = JSON,
+        since: Optional[int] = None
+    ):
+        """WebSocket endpoint with client ID for identification; accepts ``?since=<seq>`` to resume"""
+        client = await manager.connect(websocket, client_id, encoding, since)
+        if client is None:
+            return
         
         # Send personalized welcome message
-        welcome_msg = {
-            "message": f"Welcome {client_id}! You are client #{manager.connection_count}",
-            "sender": "System",
-            "timestamp": datetime.now().isoformat(),
-            "message_type": "welcome"
-        }
-        await websocket.send_text(json.dumps(welcome_msg))
+        welcome_frame = Frame.build(
+            f"Welcome {client_id}! You are client #{manager.connection_count}",
+            message_type="welcome"
+        )
+        await manager.send_personal_message(welcome_frame, client)
         
         try:
             while True:
                 # Listen for messages from the client
                 data = await websocket.receive_text()
-                await handle_websocket_message(data, manager, client_id)
+                client.touch()
+                if await admit(client, data):
+                    await handle_websocket_message(data, manager, client_id, client)
                     
         except WebSocketDisconnect:
-            manager.disconnect(websocket)
+            manager.disconnect(client)
             logger.info(f"Client {client_id} disconnected")
         except Exception as e:
             logger.error(f"WebSocket error for client {client_id}: {e}")
-            manager.disconnect(websocket)
+            manager.disconnect(client)
 
     return router
 
 
-async def handle_websocket_message(data: str, manager: ConnectionManager, client_id: str = None):
+async def handle_websocket_message(
+    data: str,
+    manager: ConnectionManager,
+    client_id: str = None,
+    client: Optional[ClientConnection] = None
+):
     """Handle incoming WebSocket messages"""
     try:
-        message_data = json.loads(data)
+        inbound = parse_inbound(data)
         
-        # Determine sender name
-        sender = client_id if client_id else message_data.get("sender", f"Client-{manager.connection_count}")
+        if inbound is None:
+            # A JSON object with fields of the wrong type
+            INBOUND_MESSAGES.labels("invalid").inc()
+            return
         
-        # Create broadcast message
-        broadcast_msg = {
-            "message": message_data.get("message", data),
-            "sender": sender,
-            "timestamp": datetime.now().isoformat(),
-            "message_type": message_data.get("message_type", "chat")
-        }
+        if isinstance(inbound, str):
+            # Plain text is broadcast as a chat message
+            INBOUND_MESSAGES.labels("text").inc()
+            broadcast_msg = await transform(manager, {
+                "message": inbound,
+                "sender": client_id or f"Client-{manager.connection_count}",
+                "timestamp": tick_now(),
+                "message_type": "chat"
+            })
+            if broadcast_msg is not None:
+                await manager.broadcast(broadcast_msg)
+            return
         
         # Handle different message types
-        msg_type = message_data.get("message_type", "broadcast")
+        msg_type = inbound.message_type or "broadcast"
+        INBOUND_MESSAGES.labels(msg_type if msg_type in KNOWN_MESSAGE_TYPES else "other").inc()
         
         if msg_type == "ping":
-            # Handle ping messages - send pong back
-            pong_msg = {
-                "message": "pong",
-                "sender": "System",
-                "timestamp": datetime.now().isoformat(),
-                "message_type": "pong"
-            }
-            # This would need the specific websocket, so we broadcast it
-            await manager.broadcast(pong_msg)
+            # Handle ping messages - send pong back to the requester only
+            if client is not None:
+                await manager.send_personal_message(Frame.build("pong", message_type="pong"), client)
+        elif msg_type == "pong":
+            # Reply to a server heartbeat; the receive loop already recorded it
+            pass
+        elif msg_type in ("subscribe", "unsubscribe") and client is not None:
+            await handle_subscription(msg_type, inbound, manager, client)
         elif msg_type == "private":
-            # Handle private messages (this is a placeholder for future implementation)
-            logger.info(f"Private message from {sender}: {message_data.get('message')}")
+            await handle_private_message(inbound, manager, client_id, client)
         else:
-            # Regular broadcast message
-            await manager.broadcast(broadcast_msg)
+            # Build the outgoing payload once, straight from the validated fields
+            broadcast_msg = {
+                "message": inbound.message if inbound.message is not None else data,
+                "sender": client_id or inbound.sender or f"Client-{manager.connection_count}",
+                "timestamp": tick_now(),
+                "message_type": inbound.message_type or "chat"
+            }
+            if inbound.channel is not None:
+                broadcast_msg["channel"] = inbound.channel
+            broadcast_msg = await transform(manager, broadcast_msg, inbound.channel)
+            if broadcast_msg is None:
+                # Dropped by a transform stage, e.g. a content filter
+                pass
+            elif inbound.channel is not None:
+                # Channel message - only that channel's subscribers receive it
+                await manager.publish(inbound.channel, broadcast_msg)
+            else:
+                # Regular broadcast message
+                await manager.broadcast(broadcast_msg)
             
-    except json.JSONDecodeError:
-        # If it's not JSON, treat as plain text
-        sender = client_id if client_id else f"Client-{manager.connection_count}"
-        broadcast_msg = {
-            "message": data,
-            "sender": sender,
-            "timestamp": datetime.now().isoformat(),
-            "message_type": "chat"
-        }
-        await manager.broadcast(broadcast_msg)
     except Exception as e:
-        logger.error(f"Error handling WebSocket message: {e}")
\ No newline at end of file
+        logger.error(f"Error handling WebSocket message: {e}")
+
+
+async def transform(manager: ConnectionManager, payload: Payload, channel: Optional[str] = None) -> Optional[Payload]:
+    """Run a payload through the manager's transform stages, if any; None if one dropped it"""
+    if manager.transforms is None:
+        return payload
+    return await manager.transforms.apply(payload, channel)
+
+async def handle_subscription(
+    action: str,
+    message_data: InboundMessage,
+    manager: ConnectionManager,
+    client: ClientConnection
+):
+    """Subscribe or unsubscribe the requesting client and acknowledge only to it
+
+    Accepts either ``{"channel": "room"}`` or ``{"channels": ["a", "b"]}``. A
+    subscribe with ``"since": <seq>`` also replays each channel's missed messages.
+    """
+    channels = message_data.channels or [message_data.channel]
+    channels = [channel for channel in channels if channel]
+    
+    if action == "subscribe":
+        changed = [channel for channel in channels if manager.subscribe(client, channel)]
+    else:
+        changed = [channel for channel in channels if manager.unsubscribe(client, channel)]
+    
+    ack = Frame.encode({
+        "message": f"{action}d: {', '.join(changed) if changed else 'no channels'}",
+        "sender": "System",
+        "timestamp": tick_now(),
+        "message_type": f"{action}d",
+        "channels": changed
+    })
+    since = message_data.since
+    if action == "subscribe" and since is not None and changed:
+        # Replayed frames skip the queue, so the ack goes the same way to arrive first
+        client.prepend([ack])
+        for channel in changed:
+            await manager.replay(client, since, channel)
+    else:
+        await manager.send_personal_message(ack, client)
+
+
+async def handle_private_message(
+    message_data: InboundMessage,
+    manager: ConnectionManager,
+    client_id: Optional[str] = None,
+    client: Optional[ClientConnection] = None
+):
+    """Deliver ``{"message_type": "private", "to": "<id>", "message": ...}`` to one client only
+
+    The sender is identified by its client ID, or its connection ID on ``/ws``, so
+    the recipient can reply; the sender gets a ``private_status`` acknowledgement.
+    """
+    if not message_data.to or message_data.message is None:
+        if client is not None:
+            await manager.send_personal_message(Frame.build(
+                "Private messages need 'to' and 'message' fields", message_type="error"
+            ), client)
+        return
+    
+    sender = client_id or (client.connection_id if client is not None else message_data.sender) or "Anonymous"
+    payload = await transform(manager, {
+        "message": message_data.message,
+        "sender": sender,
+        "timestamp": tick_now(),
+        "message_type": "private",
+        "to": message_data.to
+    })
+    if payload is None:
+        return
+    result = await manager.send_private(message_data.to, payload)
+    if client is None:
+        return
+    if result.delivered:
+        status = "delivered"
+    elif result.relayed:
+        status = "relayed"
+    elif result.stored:
+        status = "stored"
+    else:
+        status = "undeliverable"
+    await manager.send_personal_message(Frame.encode({
+        "message": f"Private message to {message_data.to}: {status}",
+        "sender": "System",
+        "timestamp": tick_now(),
+        "message_type": "private_status",
+        "to": message_data.to,
+        "status": status
+    }), client)